@@ -0,0 +1,30 @@
+"""
+Process roles of Reading_Room.
+
+Every process runs in one of ROLES, read by settings.py from the READING_ROOM_ROLE environment variable, and only
+loads the apps its role needs. The web processes (wsgi.py, asgi.py) load all of them. The background and cron
+commands of create_join_class only need its models and skip allauth, crispy_forms, rest_framework, the admin and
+the URLs of the site, so they start faster. Other management commands, such as migrate, load every app with models.
+"""
+
+ENV = 'READING_ROOM_ROLE'
+ROLES = ('web', 'worker', 'management')
+
+# The commands run by the background workers and cron.
+WORKER_COMMANDS = {
+    'clean_uploads', 'compact_reading_events', 'dedupe_reading_material', 'export_reading_info', 'import_reading_info',
+    'provision_classrooms', 'rebuild_rollups', 'rebuild_search_index', 'render_material_pages', 'run_jobs',
+    'startup_profile',
+}
+# The commands that need the site itself: its templates, static files and URLs.
+WEB_COMMANDS = {'benchmark', 'collectstatic', 'findstatic', 'runserver', 'test'}
+
+
+# This method returns the role of a manage.py invocation from its arguments.
+def for_command(argv):
+    command = argv[1] if len(argv) > 1 else ''
+    if command in WORKER_COMMANDS:
+        return 'worker'
+    if command in WEB_COMMANDS:
+        return 'web'
+    return 'management'
@@ -12,6 +12,8 @@ https://docs.djangoproject.com/en/3.0/ref/settings/
 
 import os
 
+from django.core.exceptions import ImproperlyConfigured
+
 # Build paths inside the project like this: os.path.join(BASE_DIR, ...)
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 
@@ -77,19 +79,35 @@ SITE_ID = 1
 CRISPY_TEMPLATE_PACK = 'bootstrap4'
 
 MIDDLEWARE = [
+    'create_join_class.metrics.MetricsMiddleware',
+    'create_join_class.query_budget.QueryCountMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    # Static files are served before the session, CSRF and auth middleware run.
+    'create_join_class.middleware.AsyncWhiteNoiseMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
-    'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'create_join_class.middleware.CachedAuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
-
-    'whitenoise.middleware.WhiteNoiseMiddleware',
 ]
 
 ROOT_URLCONF = 'Reading_Room.urls'
 
+# The role of this process: 'web', 'worker' or 'management' (see Reading_Room/roles.py). manage.py picks it from
+# the command run, and the WSGI and ASGI applications run as 'web'. Workers only load the apps create_join_class
+# needs and the URLs of create_join_class; management commands skip the apps without models.
+PROCESS_ROLE = os.environ.get('READING_ROOM_ROLE', 'web')
+WORKER_APPS = ['django.contrib.auth', 'django.contrib.contenttypes', 'create_join_class']
+MANAGEMENT_SKIPPED_APPS = ['crispy_forms', 'rest_framework', 'private_storage']
+if PROCESS_ROLE == 'worker':
+    INSTALLED_APPS = [app for app in INSTALLED_APPS if app in WORKER_APPS]
+    ROOT_URLCONF = 'Reading_Room.worker_urls'
+elif PROCESS_ROLE == 'management':
+    INSTALLED_APPS = [app for app in INSTALLED_APPS if app not in MANAGEMENT_SKIPPED_APPS]
+elif PROCESS_ROLE != 'web':
+    raise ImproperlyConfigured('READING_ROOM_ROLE must be web, worker or management, not %r.' % PROCESS_ROLE)
+
 TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
@@ -167,10 +185,105 @@ DATABASES['default'].update(db_from_env)
 
 STATIC_URL = '/static/'
 STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
+# collectstatic names every file after a hash of its content, writes the manifest mapping the names used in the
+# templates to the hashed ones, and writes gzip variants (and brotli ones when the brotli package is installed) for
+# WhiteNoise to serve to browsers accepting them. Hashed files are served as immutable for ten years, so browsers
+# never ask for them again; a changed file gets a new name. Run collectstatic before serving with DEBUG off;
+# until it has run, the templates use the plain names (see Reading_Room.storage).
+STATICFILES_STORAGE = 'Reading_Room.storage.StaticFilesStorage'
+# The pdf viewer needs the pdf.js build, which is not in the repository: download it into the static files with
+# manage.py vendor_pdfjs (see create_join_class.pdfjs). Without it the browser's own viewer is used.
 
 
 PRIVATE_STORAGE_ROOT = os.path.join(BASE_DIR, 'media/private-media/')
-PRIVATE_STORAGE_AUTH_FUNCTION = 'private_storage.permissions.allow_authenticated'
+# Reading materials are only served to the teacher and the students of their classroom.
+PRIVATE_STORAGE_AUTH_FUNCTION = 'create_join_class.permissions.allow_classroom_members'
+# Uploads are hashed while they stream in, so reading materials can be stored by content.
+FILE_UPLOAD_HANDLERS = [
+    'create_join_class.uploads.HashingMemoryFileUploadHandler',
+    'create_join_class.uploads.HashingTemporaryFileUploadHandler',
+]
+# Chunked uploads of reading material: the largest file accepted, the largest chunk per request and where
+# the chunks received so far are kept until the upload is complete.
+READING_MATERIAL_MAX_SIZE = 200 * 1024 * 1024
+UPLOAD_CHUNK_SIZE = 4 * 1024 * 1024
+CHUNKED_UPLOAD_ROOT = os.path.join(BASE_DIR, 'media/upload-parts/')
+# The pages of every reading material are rendered to images by a background job, so the viewer can show a page
+# without downloading the whole file (see create_join_class.page_assets).
+PAGE_ASSET_ROOT = os.path.join(BASE_DIR, 'media/pages/')
+PAGE_IMAGE_WIDTH = 1200
+PRIVATE_STORAGE_SERVER = 'create_join_class.servers.ReadingMaterialServer'
+# Set to 'nginx' (X-Accel-Redirect) or 'apache' (X-Sendfile) when a front server sends the private files.
+# For nginx, PRIVATE_STORAGE_INTERNAL_URL must be an internal location aliased to PRIVATE_STORAGE_ROOT.
+PRIVATE_STORAGE_OFFLOAD = os.environ.get('PRIVATE_STORAGE_OFFLOAD')
+PRIVATE_STORAGE_INTERNAL_URL = '/private-x-accel-redirect/'
+# The classrooms of every user are cached (see create_join_class.memberships). A file based cache is shared by
+# all the worker processes of the server, so a change made in one of them is seen by the others straight away.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'memberships': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.path.join(BASE_DIR, 'cache/memberships/'),
+    },
+    'listings': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.path.join(BASE_DIR, 'cache/listings/'),
+    },
+    'sessions': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.path.join(BASE_DIR, 'cache/sessions/'),
+        # One entry per logged in session and per logged in user.
+        'OPTIONS': {'MAX_ENTRIES': 20000},
+    },
+}
+# Sessions are read from the sessions cache and written to both the cache and the database, and the logged in
+# users are kept in the same cache (see create_join_class.auth_cache), so a request from a logged in user reads
+# neither django_session nor auth_user. Use a local-memory cache instead for a single process.
+SESSION_ENGINE = 'django.contrib.sessions.backends.cached_db'
+SESSION_CACHE_ALIAS = 'sessions'
+AUTH_USER_CACHE = 'sessions'
+AUTH_USER_CACHE_TIMEOUT = 60
+MEMBERSHIP_CACHE = 'memberships'
+MEMBERSHIP_CACHE_TIMEOUT = 300
+# Versions of the classrooms and the rendered material listings (see create_join_class.listing_cache).
+LISTING_CACHE = 'listings'
+# Threads the async reading time views use for database work, which bounds their database connections
+# (see create_join_class.ingest). Serve the project with an ASGI server, e.g. uvicorn Reading_Room.asgi:application,
+# for these views to run without a worker thread per request.
+ASYNC_DB_WORKERS = 8
+# Reading events older than READING_RETENTION_DAYS are compacted into daily summaries and archived under
+# READING_ARCHIVE_ROOT by the compact_reading_events command (see create_join_class.retention).
+READING_RETENTION_DAYS = 180
+READING_ARCHIVE_ROOT = os.path.join(BASE_DIR, 'media/archive/')
+# While DEBUG is on, every response carries X-Query-Count and X-Query-Time headers and the query count of every
+# request is logged (see create_join_class.query_budget).
+QUERY_BUDGET_HEADERS = DEBUG
+# The latency, queries and response size of every request are served in the Prometheus text format at /metrics,
+# to staff users and to requests with the header Authorization: Bearer <METRICS_TOKEN>. Every process writes its
+# metrics to METRICS_ROOT, so any of them serves the metrics of all (see create_join_class.metrics).
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+METRICS_ROOT = os.path.join(BASE_DIR, 'cache/metrics/')
+# A share of the requests is profiled with cProfile and those slower than PROFILE_SLOW_SECONDS are written to
+# PROFILE_ROOT; a request with the header X-Profile: <METRICS_TOKEN> is always profiled and written
+# (see create_join_class.profiling).
+PROFILE_SAMPLE_RATE = 0.0
+PROFILE_SLOW_SECONDS = 0.5
+PROFILE_ROOT = os.path.join(BASE_DIR, 'profiles/')
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'create_join_class.query_budget': {
+            'handlers': ['console'],
+            'level': 'DEBUG' if DEBUG else 'WARNING',
+        },
+    },
+}
 X_FRAME_OPTIONS = 'SAMEORIGIN'
 
 LOGIN_URL = '/login/'
@@ -0,0 +1,13 @@
+from whitenoise.storage import CompressedManifestStaticFilesStorage
+
+
+# This class is the static files storage of the site (see the STATICFILES_STORAGE setting). Once collectstatic has
+# written the manifest it behaves like CompressedManifestStaticFilesStorage: templates get the hashed names and a
+# file missing from the manifest is an error. Without a manifest, as in the tests or before the first collectstatic,
+# templates get the plain names instead of failing with "Missing staticfiles manifest entry".
+class StaticFilesStorage(CompressedManifestStaticFilesStorage):
+
+    def stored_name(self, name):
+        if not self.hashed_files:
+            return name
+        return super().stored_name(name)
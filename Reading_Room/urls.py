@@ -30,6 +30,9 @@ urlpatterns = [
 
     path('', include('create_join_class.urls')),
     path('login/', include('create_join_class.urls')),
+    # Registered here rather than in create_join_class.urls, which is included twice. Without a trailing slash,
+    # the path Prometheus scrapes by default.
+    path('metrics', views.request_metrics, name='request_metrics'),
 
     path('accounts/', include('allauth.urls')),
 
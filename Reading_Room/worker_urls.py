@@ -0,0 +1,10 @@
+"""Reading_Room URL Configuration of the worker processes
+
+Workers only load the apps create_join_class needs (see Reading_Room/roles.py), so they cannot import the URLs of
+allauth, the admin or the API. The URLs of create_join_class are kept for reverse().
+"""
+from django.urls import path, include
+
+urlpatterns = [
+    path('', include('create_join_class.urls')),
+]
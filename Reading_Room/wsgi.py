@@ -12,5 +12,6 @@ import os
 from django.core.wsgi import get_wsgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'Reading_Room.settings')
+os.environ.setdefault('READING_ROOM_ROLE', 'web')
 
 application = get_wsgi_application()
@@ -1,12 +1,39 @@
 from django.contrib import admin
 from .models import *
+from . import deletion
+
+
+# Classrooms and reading materials deleted in the admin are removed in the background, like in the views.
+class ClassRoomAdmin(admin.ModelAdmin):
+
+    def delete_model(self, request, obj):
+        deletion.delete_classroom(obj)
+
+    def delete_queryset(self, request, queryset):
+        for classroom in queryset:
+            deletion.delete_classroom(classroom)
 
 
 class ReadingMaterialAdmin(admin.ModelAdmin):
     # readonly_fields = ('id',)
     readonly_fields = ('id',)
 
+    def delete_model(self, request, obj):
+        deletion.delete_material(obj)
+
+    def delete_queryset(self, request, queryset):
+        for material in queryset:
+            deletion.delete_material(material)
+
 
-admin.site.register(ClassRoom)
+admin.site.register(ClassRoom, ClassRoomAdmin)
 admin.site.register(ReadingMaterial, ReadingMaterialAdmin )
-admin.site.register(ReadingInfo)
\ No newline at end of file
+admin.site.register(ReadingInfo)
+admin.site.register(ReadingEvent)
+admin.site.register(MaterialStudentRollup)
+admin.site.register(MaterialDailyRollup)
+admin.site.register(StoredFile)
+admin.site.register(UploadSession)
+admin.site.register(MaterialPageText)
+admin.site.register(ProcessingJob)
+admin.site.register(PageDwell)
\ No newline at end of file
@@ -0,0 +1,145 @@
+import datetime
+import hashlib
+import time
+import warnings
+
+import numpy as np
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.db import transaction
+
+from . import listing_cache
+from .models import MaterialDailyRollup, MaterialStudentRollup, ReadingMaterial
+
+# The cache holding the reading data versions and the computed statistics. It should be shared by all the worker
+# processes, like the listing cache, so a flush in one process is seen by the dashboards of the others.
+CACHE_ALIAS = getattr(settings, 'ANALYTICS_CACHE', listing_cache.CACHE_ALIAS)
+# How long computed statistics are kept. They are replaced as soon as their data changes version, so this only
+# bounds how long unused statistics take up space.
+TIMEOUT = getattr(settings, 'ANALYTICS_TIMEOUT', 24 * 3600)
+# The percentiles of the reading time of the students who opened a material.
+PERCENTILES = (25, 50, 75, 90)
+# The number of days the moving average of the daily trend covers.
+TREND_WINDOW = 7
+
+
+def _cache():
+    return caches[CACHE_ALIAS]
+
+
+def _key(material_id):
+    return 'reading-version:%d' % material_id
+
+
+# This method gives the reading data of the materials a new version once the running transaction is committed,
+# so the statistics computed from the old data are no longer used. It is called whenever the rollups change; with
+# no material ids every material gets a new version.
+def bump(material_ids=None):
+    if material_ids is None:
+        transaction.on_commit(lambda: _cache().set('reading-generation', _now(), None))
+        return
+    material_ids = set(material_ids)
+    if material_ids:
+        transaction.on_commit(lambda: _cache().set_many({_key(material_id): _now()
+                                                         for material_id in material_ids}, None))
+
+
+def _now():
+    return int(time.time() * 1000000)
+
+
+# This method returns the statistics of a classroom's reading materials for its dashboard. They are cached under
+# the versions of the classroom and of the reading data of its materials, so they are only computed again once
+# reading time was recorded, or materials or students were added or removed.
+def classroom_stats(classroom_id):
+    materials = list(ReadingMaterial.objects.filter(classroom_id=classroom_id).order_by('pk')
+                     .values_list('pk', 'name'))
+    versions = _cache().get_many(['reading-generation'] + [_key(material_id) for material_id, name in materials])
+    version = '%s:%s' % (listing_cache.versions([classroom_id])[classroom_id], sorted(versions.items()))
+    key = 'classroom-stats:%d:%s' % (classroom_id, hashlib.sha1(version.encode()).hexdigest())
+    stats = _cache().get(key)
+    if stats is None:
+        stats = compute(classroom_id, materials)
+        _cache().set(key, stats, TIMEOUT)
+    return stats
+
+
+# This method computes the statistics of a classroom from the rollups. The reading time of every student on every
+# material is loaded with one query into a materials x students matrix, and the daily totals of all materials with
+# another into two arrays, so the work done in Python does not grow with the number of students.
+def compute(classroom_id, materials):
+    students = list(User.objects.filter(student_of_the_class=classroom_id).order_by('pk')
+                    .values_list('pk', 'username'))
+    student_ids = np.array([pk for pk, username in students], dtype=np.int64)
+    material_ids = np.array([pk for pk, name in materials], dtype=np.int64)
+
+    rows = np.array(list(MaterialStudentRollup.objects.filter(material_id__in=material_ids.tolist())
+                         .values_list('material_id', 'student_id', 'seconds')), dtype=np.int64).reshape(-1, 3)
+    seconds = np.zeros((len(material_ids), len(student_ids)), dtype=np.float64)
+    if len(rows) and len(student_ids):
+        # Students who left the classroom are not counted.
+        columns = np.searchsorted(student_ids, rows[:, 1]).clip(max=len(student_ids) - 1)
+        enrolled = student_ids[columns] == rows[:, 1]
+        seconds[np.searchsorted(material_ids, rows[enrolled, 0]), columns[enrolled]] = rows[enrolled, 2]
+
+    class_size = len(student_ids)
+    opened = seconds > 0
+    readers = opened.sum(axis=1)
+    totals = seconds.sum(axis=1)
+    with warnings.catch_warnings():
+        # Materials nobody opened have no percentiles.
+        warnings.simplefilter('ignore', RuntimeWarning)
+        percentiles = np.nanpercentile(np.where(opened, seconds, np.nan), PERCENTILES, axis=1).reshape(
+            len(PERCENTILES), len(material_ids))
+        means = np.where(readers > 0, totals / np.maximum(readers, 1), np.nan)
+
+    per_student = seconds.sum(axis=0)
+    inactive = np.flatnonzero(~opened.any(axis=0))
+    return {
+        'class_size': class_size,
+        'materials': [{
+            'id': int(material_ids[index]),
+            'name': materials[index][1],
+            'readers': int(readers[index]),
+            'unopened': class_size - int(readers[index]),
+            'reach': _percent(readers[index], class_size),
+            'total': int(totals[index]),
+            'mean': _number(means[index]),
+            'per_student': round(float(totals[index]) / class_size, 1) if class_size else 0.0,
+            'percentiles': dict(zip(PERCENTILES, (_number(value) for value in percentiles[:, index]))),
+        } for index in range(len(material_ids))],
+        'total': int(seconds.sum()),
+        'median_per_student': _number(np.median(per_student)) if class_size else None,
+        'inactive_students': [students[index][1] for index in inactive],
+        'trend': _trend(material_ids),
+    }
+
+
+# This method returns the reading time of all the materials per day, with a moving average over TREND_WINDOW days.
+# Days without reading are included, so the average is taken over calendar days.
+def _trend(material_ids):
+    rows = list(MaterialDailyRollup.objects.filter(material_id__in=material_ids.tolist())
+                .values_list('day', 'seconds', 'events'))
+    if not rows:
+        return []
+    days = np.array([day.toordinal() for day, _, _ in rows], dtype=np.int64)
+    first = days.min()
+    seconds = np.bincount(days - first, weights=[row[1] for row in rows])
+    events = np.bincount(days - first, weights=[row[2] for row in rows])
+    window = np.ones(TREND_WINDOW)
+    counts = np.convolve(np.ones(len(seconds)), window)[:len(seconds)]
+    average = np.convolve(seconds, window)[:len(seconds)] / counts
+    percent = (100 * seconds / max(seconds.max(), 1)).astype(np.int64)
+    return [{'day': datetime.date.fromordinal(int(first) + index), 'seconds': int(seconds[index]),
+             'events': int(events[index]), 'average': round(float(average[index]), 1),
+             'percent': int(percent[index])}
+            for index in range(len(seconds))]
+
+
+def _percent(part, whole):
+    return round(100.0 * float(part) / whole, 1) if whole else 0.0
+
+
+def _number(value):
+    return None if np.isnan(value) else round(float(value), 1)
@@ -1,5 +1,14 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate
 
 
 class CreateJoinClassConfig(AppConfig):
     name = 'create_join_class'
+
+    def ready(self):
+        # Connects the signals that keep the cached users, classroom memberships and listings up to date, and the
+        # one removing the files of deleted reading materials.
+        from . import auth_cache, deletion, listing_cache, memberships  # noqa: F401
+        # The full-text index of the reading materials is created after the tables it indexes.
+        from . import search
+        post_migrate.connect(search.install, sender=self)
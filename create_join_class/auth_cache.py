@@ -0,0 +1,75 @@
+from django.conf import settings
+from django.contrib import auth
+from django.contrib.auth.models import AnonymousUser, User
+from django.contrib.auth.signals import user_logged_out
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils.crypto import constant_time_compare
+
+# The cache holding the logged in users, one of settings.CACHES. Like the membership cache any backend works: a
+# file based cache is shared by all the worker processes, so a user changed in one process is dropped for all of
+# them, while with a local-memory cache every process keeps its own copy.
+CACHE_ALIAS = getattr(settings, 'AUTH_USER_CACHE', 'default')
+# How long a user is served from the cache. Users are dropped as soon as they are saved, deleted or log out, so
+# this only bounds how stale a user changed without signals (e.g. with a queryset update) or in another process
+# with a local-memory cache can be.
+TIMEOUT = getattr(settings, 'AUTH_USER_CACHE_TIMEOUT', 60)
+
+
+def _cache():
+    return caches[CACHE_ALIAS]
+
+
+def _key(user_id):
+    return 'auth-user:%s' % user_id
+
+
+# This method returns the user logged in to the session of the request, like django.contrib.auth.get_user, but
+# reads the user from the cache when it can. The session is still checked against the password of the user, so
+# a session is logged out once the password changes. When the user is not cached, or the session does not match
+# the cached user, Django's own lookup is used, which also logs out the session when needed.
+def get_user(request):
+    try:
+        user_id = request.session[auth.SESSION_KEY]
+        backend_path = request.session[auth.BACKEND_SESSION_KEY]
+    except KeyError:
+        return AnonymousUser()
+    if backend_path not in settings.AUTHENTICATION_BACKENDS:
+        return AnonymousUser()
+
+    user = _cache().get(_key(user_id))
+    if user is not None:
+        session_hash = request.session.get(auth.HASH_SESSION_KEY)
+        if session_hash and constant_time_compare(session_hash, user.get_session_auth_hash()):
+            return user
+
+    user = auth.get_user(request)
+    if user.is_authenticated:
+        _cache().set(_key(user_id), user, TIMEOUT)
+    return user
+
+
+# This method drops the cached user once the running transaction is committed, so no other request can cache the
+# old user again before the change is visible.
+def invalidate(user_id):
+    key = _key(user_id)
+    transaction.on_commit(lambda: _cache().delete(key))
+
+
+# A saved user may have a new password, which logs out its other sessions, or may no longer be active.
+@receiver(post_save, sender=User)
+def user_saved(sender, instance, **kwargs):
+    invalidate(instance.pk)
+
+
+@receiver(post_delete, sender=User)
+def user_deleted(sender, instance, **kwargs):
+    invalidate(instance.pk)
+
+
+@receiver(user_logged_out)
+def logged_out(sender, request, user, **kwargs):
+    if user is not None:
+        invalidate(user.pk)
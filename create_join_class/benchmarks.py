@@ -0,0 +1,283 @@
+import json
+import logging
+import platform
+import random
+import shutil
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+import django
+from django.conf import settings
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test import Client
+from django.test.utils import override_settings
+from django.urls import reverse
+from private_storage.storage import private_storage
+
+from . import provisioning, reading_events
+from .models import ClassRoom, ReadingMaterial
+from .query_budget import count_queries
+
+# The metrics compared between two runs, and whether a higher value is better.
+METRICS = {
+    'throughput': True,
+    'p95_ms': False,
+    'queries_per_request': False,
+}
+
+
+# This method runs the with block against a throwaway copy of the database: a test database created with the project's
+# schema (a temporary file for SQLite, a test_ database elsewhere), with the private files in a temporary
+# directory and every cache replaced by an empty local-memory cache. The real data and caches are not touched.
+# It runs with DEBUG off and the per-request query log of query_budget silenced, as in production, so the timings
+# include neither the SQL kept by Django for debugging nor a log line per request.
+@contextmanager
+def isolated_environment(verbosity=0):
+    media = tempfile.mkdtemp(prefix='reading-room-benchmark-')
+    if connection.vendor == 'sqlite':
+        connection.settings_dict.setdefault('TEST', {})['NAME'] = media + '/benchmark.sqlite3'
+    caches = {alias: {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'benchmark-' + alias}
+              for alias in settings.CACHES}
+    old_name = connection.settings_dict['NAME']
+    old_location = private_storage._location
+    query_logger = logging.getLogger('create_join_class.query_budget')
+    old_level = query_logger.level
+    connection.creation.create_test_db(verbosity=verbosity, autoclobber=True, serialize=False)
+    try:
+        with override_settings(DEBUG=False, CACHES=caches, PRIVATE_STORAGE_ROOT=media,
+                               ALLOWED_HOSTS=list(settings.ALLOWED_HOSTS) + ['testserver']):
+            _move_storage(media)
+            query_logger.setLevel(logging.WARNING)
+            yield
+    finally:
+        query_logger.setLevel(old_level)
+        _move_storage(old_location)
+        reading_events.buffer.flush()
+        connection.creation.destroy_test_db(old_name, verbosity=verbosity)
+        shutil.rmtree(media, ignore_errors=True)
+
+
+def _move_storage(location):
+    # The private storage reads its location once; its cached paths are dropped so the new one is used.
+    private_storage._location = location
+    for name in ('base_location', 'location'):
+        private_storage.__dict__.pop(name, None)
+
+
+# This method returns a small valid PDF with the given number of pages, padded with a comment to about size bytes.
+# The number is written on every page, so every generated file is stored separately.
+def pdf_bytes(number, pages=3, size=0):
+    objects = ['<< /Type /Catalog /Pages 2 0 R >>',
+               '<< /Type /Pages /Kids [%s] /Count %d >>' % (' '.join('%d 0 R' % (3 + page * 2)
+                                                                     for page in range(pages)), pages)]
+    for page in range(pages):
+        stream = 'BT /F1 24 Tf 72 720 Td (Benchmark %d page %d) Tj ET' % (number, page + 1)
+        objects.append('<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Contents %d 0 R >>' % (4 + page * 2))
+        objects.append('<< /Length %d >>\nstream\n%s\nendstream' % (len(stream), stream))
+    body = '%PDF-1.4\n'
+    offsets = []
+    for index, obj in enumerate(objects, 1):
+        offsets.append(len(body))
+        body += '%d 0 obj\n%s\nendobj\n' % (index, obj)
+    xref = len(body)
+    body += 'xref\n0 %d\n0000000000 65535 f \n' % (len(objects) + 1)
+    body += ''.join('%010d 00000 n \n' % offset for offset in offsets)
+    body += 'trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n' % (len(objects) + 1, xref)
+    padding = max(size - len(body) - 6, 0)
+    return (body + ('%' + 'x' * 79 + '\n') * (padding // 81) + '%%EOF\n').encode()
+
+
+# This method fills the database with classrooms, students enrolled in them and reading materials, and returns
+# what the scenarios need: the teachers, students and materials of every classroom. The same seed always gives
+# the same data.
+def seed(classrooms, students, pdfs, pdf_size=0, seed_value=0):
+    rng = random.Random(seed_value)
+    usernames = ['benchmark-student-%d' % number for number in range(students)]
+    classes = {}
+    for number in range(classrooms):
+        enrolled = rng.sample(usernames, min(len(usernames), max(1, students * 2 // max(classrooms, 1))))
+        classes[('benchmark-teacher-%d' % number, 'Benchmark %d' % number, 1)] = {
+            'code': None, 'students': set(enrolled)}
+    provisioning.provision(classes, create_missing=True)
+
+    rooms = list(ClassRoom.objects.filter(name__startswith='Benchmark ').select_related('teacher').order_by('pk'))
+    for number in range(pdfs):
+        room = rooms[number % len(rooms)]
+        ReadingMaterial.objects.create(
+            name='Benchmark material %d' % number, classroom=room, uploader=room.teacher,
+            readingFile=SimpleUploadedFile('benchmark-%d.pdf' % number, pdf_bytes(number, size=pdf_size),
+                                           content_type='application/pdf'))
+
+    data = []
+    for room in rooms:
+        materials = list(room.classroom.all())
+        students_of_room = list(room.students.all())
+        if materials and students_of_room:
+            data.append({'classroom': room, 'teacher': room.teacher, 'students': students_of_room,
+                         'materials': materials})
+    return data
+
+
+# Every scenario is a function of (role, rng) returning the (method, path, data, extra headers) of a request; role
+# holds the classroom and materials used by the teacher or student the client is logged in as.
+def _push_reading_info(role, rng):
+    material = rng.choice(role['materials'])
+    return 'post', reverse('push_reading_info', args=[material.pk]), {'seconds': 5}, {}
+
+
+def _push_reading_batch(role, rng):
+    role['sequence'] += 1
+    entries = [[material.pk, 5, role['sequence'] * 10 + index, [[1, 3], [2, 2]]]
+               for index, material in enumerate(role['materials'][:3])]
+    return 'post', reverse('push_reading_batch'), {'session': role['session'], 'entries': json.dumps(entries)}, {}
+
+
+def _joined_materials(role, rng):
+    return 'get', reverse('viewJoinedReadingMaterial', args=[role['classroom'].pk]), None, {}
+
+
+def _created_materials(role, rng):
+    return 'get', reverse('viewCreatedReadingMaterial', args=[role['classroom'].pk]), None, {}
+
+
+def _home(role, rng):
+    return 'get', reverse('home_classroom'), None, {}
+
+
+def _view_reading_info(role, rng):
+    return 'get', reverse('view_reading_info', args=[rng.choice(role['materials']).pk]), None, {}
+
+
+def _serve_pdf(role, rng):
+    return 'get', rng.choice(role['materials']).readingFile.url, None, {}
+
+
+def _serve_pdf_range(role, rng):
+    return 'get', rng.choice(role['materials']).readingFile.url, None, {'HTTP_RANGE': 'bytes=0-65535'}
+
+
+# The scenarios, with whether they run as a student or as the teacher of a classroom.
+SCENARIOS = {
+    'push_reading_info': ('student', _push_reading_info),
+    'push_reading_batch': ('student', _push_reading_batch),
+    'joined_materials': ('student', _joined_materials),
+    'home': ('student', _home),
+    'serve_pdf': ('student', _serve_pdf),
+    'serve_pdf_range': ('student', _serve_pdf_range),
+    'created_materials': ('teacher', _created_materials),
+    'view_reading_info': ('teacher', _view_reading_info),
+}
+
+
+def _percentile(values, percent):
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(round(percent / 100.0 * (len(ordered) - 1))))]
+
+
+# This method sends requests requests of a scenario from concurrency threads, each with its own logged in
+# client, after warmup unmeasured requests per thread. It returns the throughput, the latency percentiles in
+# milliseconds, the errors (responses with a status of 400 or more) and the average number of queries.
+def run_scenario(name, data, requests, concurrency, warmup=5, seed_value=0):
+    role_name, scenario = SCENARIOS[name]
+    workers = []
+    for number in range(concurrency):
+        room = data[number % len(data)]
+        user = room['teacher'] if role_name == 'teacher' else room['students'][number % len(room['students'])]
+        client = Client()
+        client.force_login(user)
+        workers.append((client, {'classroom': room['classroom'], 'materials': room['materials'], 'sequence': 0,
+                                 'session': 'benchmark-%d' % number}, random.Random(seed_value + number)))
+
+    per_worker = [requests // concurrency + (1 if number < requests % concurrency else 0)
+                  for number in range(concurrency)]
+    latencies, queries, errors = [], [], []
+    lock = threading.Lock()
+    start_together = threading.Barrier(concurrency)
+
+    def work(number):
+        client, role, rng = workers[number]
+        try:
+            for _ in range(warmup):
+                _send(client, *scenario(role, rng))
+        except Exception:
+            # Lets the other threads stop instead of waiting for this one forever.
+            start_together.abort()
+            raise
+        start_together.wait()
+        measured = []
+        for _ in range(per_worker[number]):
+            request = scenario(role, rng)
+            with count_queries() as counter:
+                started = time.perf_counter()
+                status = _send(client, *request)
+                elapsed = time.perf_counter() - started
+            measured.append((elapsed, counter.count, status))
+        with lock:
+            for elapsed, count, status in measured:
+                latencies.append(elapsed * 1000)
+                queries.append(count)
+                if status >= 400:
+                    errors.append(status)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(work, range(concurrency)))
+    wall = time.perf_counter() - started
+    return {
+        'requests': len(latencies),
+        'errors': len(errors),
+        'seconds': round(wall, 3),
+        'throughput': round(len(latencies) / wall, 1) if wall else 0.0,
+        'mean_ms': round(sum(latencies) / len(latencies), 2) if latencies else 0.0,
+        'p50_ms': round(_percentile(latencies, 50), 2),
+        'p95_ms': round(_percentile(latencies, 95), 2),
+        'p99_ms': round(_percentile(latencies, 99), 2),
+        'queries_per_request': round(sum(queries) / len(queries), 2) if queries else 0.0,
+    }
+
+
+def _send(client, method, path, data, headers):
+    response = getattr(client, method)(path, data, **headers)
+    # Streamed files are read completely, as a browser would.
+    if response.streaming:
+        for _ in response.streaming_content:
+            pass
+    response.close()
+    return response.status_code
+
+
+# This method returns the environment of a run, stored with its results.
+def environment():
+    return {
+        'database': connection.vendor,
+        'django': django.get_version(),
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+    }
+
+
+# This method compares the results of a run with those of an earlier one. It returns a list of regressions,
+# one message for every scenario metric that got worse by more than threshold (0.1 being 10%).
+def compare(baseline, current, threshold):
+    regressions = []
+    for name, results in current['scenarios'].items():
+        before = baseline.get('scenarios', {}).get(name)
+        if before is None:
+            continue
+        for metric, higher_is_better in METRICS.items():
+            old, new = before[metric], results[metric]
+            if higher_is_better:
+                worse = new < old * (1 - threshold)
+            else:
+                # Small absolute changes of tiny values, e.g. 0.1ms latencies, are not regressions.
+                worse = new > old * (1 + threshold) and new - old > 0.5
+            if worse:
+                regressions.append('%s %s: %s -> %s' % (name, metric, old, new))
+    return regressions
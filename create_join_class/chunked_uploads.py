@@ -0,0 +1,143 @@
+import datetime
+import os
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files import File
+from django.db import transaction
+from django.utils import timezone
+
+from .models import ReadingMaterial, UploadSession, hash_file
+from .validators import validate_file_extension, validate_pdf_header
+
+# Bytes read from the request at a time while a chunk is written to disk.
+READ_SIZE = 64 * 1024
+# How long a completed upload is kept, so the last chunk can be sent again (see complete).
+COMPLETED_KEEP = datetime.timedelta(hours=1)
+# How long the creation of the material may take before another request may try again, for example because the
+# process creating it was killed.
+COMPLETING_TIMEOUT = datetime.timedelta(minutes=10)
+
+
+# This class is raised when a chunk does not start where the previous one ended. The client should continue from
+# the number of bytes received, which it can also ask for with a GET on the upload.
+class OffsetMismatch(Exception):
+    def __init__(self, received):
+        super().__init__('Expected a chunk at offset %d' % received)
+        self.received = received
+
+
+# This class is raised when a chunk arrives while another request is creating the material of the upload. The
+# client should send an empty chunk at the end of the file after retry_after seconds.
+class Completing(Exception):
+    retry_after = 2
+
+    def __init__(self):
+        super().__init__('The upload is being completed.')
+
+
+# This method starts a chunked upload of a reading material for a classroom. The file name and announced size are
+# checked straight away, so a file that is too large is rejected before any of it is sent.
+def start(classroom, uploader, name, filename, size):
+    if not name or len(name) > ReadingMaterial._meta.get_field('name').max_length:
+        raise ValidationError('Please enter a name of at most 100 characters.')
+    validate_file_extension(File(None, name=filename))
+    if size <= 0:
+        raise ValidationError('The file is empty.')
+    if size > settings.READING_MATERIAL_MAX_SIZE:
+        raise ValidationError('The file is larger than %d MB.' % (settings.READING_MATERIAL_MAX_SIZE // (1024 * 1024)))
+
+    os.makedirs(settings.CHUNKED_UPLOAD_ROOT, exist_ok=True)
+    upload = UploadSession.objects.create(classroom=classroom, uploader=uploader, name=name,
+                                          filename=os.path.basename(filename), size=size)
+    open(upload.part_path(), 'wb').close()
+    return upload
+
+
+# This method writes length bytes read from stream to the part file of an upload, starting at offset. The chunk is
+# copied in small pieces, so it is never held in memory as a whole. The first chunk must start with the pdf header;
+# when it does not the upload is discarded. It returns the upload with the new number of bytes received. A chunk
+# sent to a completed upload is ignored, and the completed upload is returned.
+# The request receiving the last byte marks the upload as completing, under the lock of the upload, and is the one
+# expected to call complete(). Chunks arriving in the meantime raise Completing. An empty chunk at the end of the
+# file takes over the completion when it failed or timed out, so a failed complete() can be tried again.
+def write_chunk(upload_id, uploader, stream, offset, length):
+    rejected = None
+    with transaction.atomic():
+        upload = UploadSession.objects.select_for_update().get(pk=upload_id, uploader=uploader)
+        if upload.material_id is not None:
+            return upload
+        now = timezone.now()
+        if upload.completing is not None and now - upload.completing < COMPLETING_TIMEOUT:
+            raise Completing()
+        if offset == upload.received == upload.size and length == 0:
+            upload.completing = now
+            upload.save(update_fields=['completing', 'updated'])
+            return upload
+        if offset != upload.received:
+            raise OffsetMismatch(upload.received)
+        if length <= 0 or length > settings.UPLOAD_CHUNK_SIZE:
+            raise ValidationError('Chunks must hold between 1 and %d bytes.' % settings.UPLOAD_CHUNK_SIZE)
+        if offset + length > upload.size:
+            raise ValidationError('The chunk goes past the size of the file.')
+
+        written = 0
+        with open(upload.part_path(), 'r+b') as part:
+            part.seek(offset)
+            part.truncate()
+            while written < length:
+                data = stream.read(min(READ_SIZE, length - written))
+                if not data:
+                    break
+                if offset == 0 and written == 0:
+                    try:
+                        validate_pdf_header(data)
+                    except ValidationError as error:
+                        rejected = error
+                        break
+                part.write(data)
+                written += len(data)
+            if rejected is None and written != length:
+                part.truncate(offset)
+                raise ValidationError('The chunk was not received completely.')
+
+        if rejected is None:
+            upload.received = offset + written
+            if upload.received == upload.size:
+                upload.completing = now
+            upload.save(update_fields=['received', 'completing', 'updated'])
+
+    if rejected is not None:
+        discard(upload)
+        raise rejected
+    return upload
+
+
+# This method creates the reading material from a completely received upload and removes the received file.
+# The upload is kept with the material it created until the clean_uploads command removes it, after COMPLETED_KEEP.
+# When it fails the upload is no longer completing, so the client can try again straight away.
+def complete(upload):
+    path = upload.part_path()
+    try:
+        with open(path, 'rb') as part:
+            file = File(part, name=upload.filename)
+            file.sha256 = hash_file(file)
+            material = ReadingMaterial(name=upload.name, classroom_id=upload.classroom_id,
+                                       uploader_id=upload.uploader_id)
+            material.readingFile = file
+            with transaction.atomic():
+                material.save()
+                upload.material = material
+                upload.save(update_fields=['material', 'updated'])
+    except BaseException:
+        UploadSession.objects.filter(pk=upload.pk, material=None).update(completing=None)
+        raise
+    os.remove(path)
+    return material
+
+
+def discard(upload):
+    path = upload.part_path()
+    upload.delete()
+    if os.path.exists(path):
+        os.remove(path)
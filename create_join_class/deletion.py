@@ -0,0 +1,145 @@
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import CASCADE
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+from django.utils import timezone
+from private_storage.storage import private_storage
+
+from . import chunked_uploads, page_assets
+from .models import ClassRoom, ProcessingJob, ReadingMaterial, StoredFile, UploadSession
+
+logger = logging.getLogger(__name__)
+
+# Number of rows deleted per transaction, so removing a big classroom never holds its locks for long.
+BATCH_SIZE = getattr(settings, 'DELETION_BATCH_SIZE', 1000)
+# Number of reading materials removed per step of a classroom deletion; their files are deleted after each step.
+MATERIAL_BATCH_SIZE = 50
+# Number of threads deleting the files of removed reading materials.
+FILE_WORKERS = getattr(settings, 'DELETION_FILE_WORKERS', 8)
+
+# The files of the reading materials removed by the running purge, collected so they are deleted in parallel.
+_collected = threading.local()
+
+
+# This method deletes a reading material for the teacher. It is only marked as deleted, which hides it
+# straight away, and a purge_material job removes its reading data, the row and its files later.
+def delete_material(material):
+    with transaction.atomic():
+        material.deleted = timezone.now()
+        material.save(update_fields=['deleted'])
+        ProcessingJob.objects.create(kind='purge_material', target=material.pk)
+
+
+# This method deletes a classroom for the teacher. The classroom and all its reading materials are marked as
+# deleted in two queries, and a purge_classroom job removes them for good later.
+def delete_classroom(classroom):
+    now = timezone.now()
+    with transaction.atomic():
+        classroom.deleted = now
+        classroom.save(update_fields=['deleted'])
+        ReadingMaterial.objects.filter(classroom=classroom).update(deleted=now)
+        ProcessingJob.objects.create(kind='purge_classroom', target=classroom.pk)
+
+
+# This method removes a reading material marked as deleted, with the rows depending on it and its files.
+def purge_material(material_id):
+    _purge_materials([material_id])
+
+
+# This method removes a classroom marked as deleted: its reading materials a few at a time, then its unfinished
+# uploads, its students and the classroom itself.
+def purge_classroom(classroom_id):
+    material_ids = list(ReadingMaterial.all_objects.filter(classroom_id=classroom_id).order_by('pk')
+                        .values_list('pk', flat=True))
+    for start in range(0, len(material_ids), MATERIAL_BATCH_SIZE):
+        _purge_materials(material_ids[start:start + MATERIAL_BATCH_SIZE])
+    for upload in UploadSession.objects.filter(classroom_id=classroom_id):
+        chunked_uploads.discard(upload)
+    _delete_in_batches(ClassRoom.students.through.objects.filter(classroom_id=classroom_id))
+    _delete_dependents(ClassRoom, [classroom_id])
+    ClassRoom.all_objects.filter(pk=classroom_id).delete()
+
+
+def _purge_materials(material_ids):
+    _collected.files = []
+    try:
+        _delete_dependents(ReadingMaterial, material_ids)
+        with transaction.atomic():
+            ReadingMaterial.all_objects.filter(pk__in=material_ids).delete()
+    finally:
+        files, _collected.files = _collected.files, None
+        remove_files(files)
+
+
+# This method deletes the rows of every model depending on objects of model in batches, so the final delete of
+# the objects only has a few rows left to cascade to.
+def _delete_dependents(model, pks):
+    for relation in model._meta.related_objects:
+        if relation.on_delete is CASCADE:
+            _delete_in_batches(relation.related_model._base_manager.filter(**{relation.field.name + '__in': pks}))
+
+
+def _delete_in_batches(queryset):
+    model = queryset.model
+    while True:
+        pks = list(queryset.values_list('pk', flat=True)[:BATCH_SIZE])
+        if not pks:
+            return
+        with transaction.atomic():
+            model._base_manager.filter(pk__in=pks).delete()
+
+
+# This method deletes files of reading materials from the private storage, several at a time, along with their
+# rendered pages. files is a list of (digest, name) pairs; a stored file (with a digest) is kept when the same
+# content was uploaded again meanwhile. A name of None only removes the rendered pages of a digest.
+def remove_files(files):
+    digests = {digest for digest, name in files if digest is not None}
+    stored_again = set(StoredFile.objects.filter(digest__in=digests).values_list('digest', flat=True))
+    files = [(digest, name) for digest, name in files if digest not in stored_again]
+    if not files:
+        return
+    with ThreadPoolExecutor(max_workers=min(FILE_WORKERS, len(files))) as executor:
+        for (digest, name), error in zip(files, executor.map(_remove_file, files)):
+            if error is not None:
+                logger.error('Could not delete %s: %s', name or digest, error)
+
+
+def _remove_file(file):
+    digest, name = file
+    try:
+        if name is not None:
+            private_storage.delete(name)
+        if digest is not None:
+            page_assets.remove(digest)
+    except OSError as error:
+        return error
+    return None
+
+
+# A deleted reading material drops its reference to the stored file and its thumbnail, however it was deleted:
+# by a purge job, along with its classroom or its uploader, or with a queryset. The files are deleted once the
+# transaction is committed, by the running purge when there is one.
+@receiver(post_delete, sender=ReadingMaterial)
+def material_deleted(sender, instance, **kwargs):
+    files = []
+    if instance.thumbnail:
+        files.append((None, instance.thumbnail.name))
+    if instance.blob_id is None:
+        if instance.readingFile:
+            files.append((None, instance.readingFile.name))
+        # The pages of files that are not stored by content are rendered under the id of the material.
+        files.append((page_assets.key(instance), None))
+    elif instance.blob.release(delete_file=False):
+        files.append((instance.blob.digest, instance.blob.name))
+    if not files:
+        return
+    collected = getattr(_collected, 'files', None)
+    if collected is None:
+        transaction.on_commit(lambda: remove_files(files))
+    else:
+        transaction.on_commit(lambda: collected.extend(files))
@@ -0,0 +1,87 @@
+import csv
+import datetime
+import heapq
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from .models import ReadingEvent, ReadingSummary
+
+# Number of reading events fetched from the database at a time while exporting.
+CHUNK_SIZE = 2000
+
+# The session of the rows standing for compacted reading events.
+COMPACTED_SESSION = 'compacted'
+
+FIELDS = ['material_id', 'material', 'student', 'session', 'seconds', 'timestamp']
+FORMATS = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson',
+}
+
+
+# This class lets csv.writer hand back each written line instead of collecting the lines in a buffer.
+class Echo:
+    def write(self, value):
+        return value
+
+
+# This method returns the reading events of a classroom as tuples in the order of FIELDS. The events are read with
+# a server-side cursor in chunks, so memory use does not depend on how many events are exported. start and end are
+# dates and both are included. Compacted events (see retention) are exported as one row per material, student and
+# day, with the session 'compacted' and the start of the day as timestamp.
+def reading_rows(classroom_id, start=None, end=None, material_ids=None):
+    events = ReadingEvent.objects.filter(material__classroom_id=classroom_id)
+    summaries = ReadingSummary.objects.filter(material__classroom_id=classroom_id)
+    if material_ids:
+        events = events.filter(material_id__in=material_ids)
+        summaries = summaries.filter(material_id__in=material_ids)
+    if start is not None:
+        events = events.filter(timestamp__gte=_day_start(start))
+        summaries = summaries.filter(day__gte=start)
+    if end is not None:
+        events = events.filter(timestamp__lt=_day_start(end + datetime.timedelta(days=1)))
+        summaries = summaries.filter(day__lte=end)
+    event_rows = (events.order_by('timestamp')
+                  .values_list('material_id', 'material__name', 'student__username', 'session', 'seconds', 'timestamp')
+                  .iterator(chunk_size=CHUNK_SIZE))
+    summary_rows = ((material_id, name, username, COMPACTED_SESSION, seconds, _day_start(day))
+                    for material_id, name, username, seconds, day in
+                    summaries.order_by('day').values_list('material_id', 'material__name', 'student__username',
+                                                          'seconds', 'day').iterator(chunk_size=CHUNK_SIZE))
+    return heapq.merge(summary_rows, event_rows, key=lambda row: row[-1])
+
+
+# This method turns a YYYY-MM-DD string into a date. Empty values give None and bad values raise ValueError.
+def parse_day(value):
+    if not value:
+        return None
+    day = parse_date(value)
+    if day is None:
+        raise ValueError('Dates must look like YYYY-MM-DD.')
+    return day
+
+
+def _day_start(day):
+    return timezone.make_aware(datetime.datetime.combine(day, datetime.time.min))
+
+
+def csv_lines(rows):
+    writer = csv.writer(Echo())
+    yield writer.writerow(FIELDS)
+    for row in rows:
+        yield writer.writerow(row[:-1] + (row[-1].isoformat(),))
+
+
+def ndjson_lines(rows):
+    for row in rows:
+        yield json.dumps(dict(zip(FIELDS, row)), cls=DjangoJSONEncoder) + '\n'
+
+
+# This method returns the lines of the export in the given format, one of FORMATS.
+def export_lines(export_format, rows):
+    if export_format == 'csv':
+        return csv_lines(rows)
+    return ndjson_lines(rows)
@@ -0,0 +1,66 @@
+import asyncio
+import contextvars
+import functools
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import close_old_connections
+
+from . import reading_events
+
+logger = logging.getLogger(__name__)
+
+# The number of threads the async views run database work in. Each thread keeps at most one database
+# connection, so this also bounds the connections used by the async views of one process.
+DB_WORKERS = getattr(settings, 'ASYNC_DB_WORKERS', 8)
+
+_executor = ThreadPoolExecutor(max_workers=DB_WORKERS, thread_name_prefix='reading-db')
+_flush_lock = threading.Lock()
+
+
+# This method runs a function using the ORM in the database threads and returns its result, without blocking
+# the event loop. Django 3.2 has no async ORM methods, so this is how the async views reach the database.
+async def run_db(func, *args, **kwargs):
+    loop = asyncio.get_running_loop()
+    # The context is copied over, so the queries are counted for the request (see query_budget).
+    context = contextvars.copy_context()
+    return await loop.run_in_executor(_executor, functools.partial(context.run, _call, func, *args, **kwargs))
+
+
+def _call(func, *args, **kwargs):
+    close_old_connections()
+    try:
+        return func(*args, **kwargs)
+    finally:
+        close_old_connections()
+
+
+# These methods queue reading time in the write-behind buffer of reading_events from the event loop. Queuing only
+# touches memory; a full buffer is flushed in a database thread while the view returns, and other updates
+# keep queuing in the meantime. At most one such flush runs at a time.
+def record(material_id, student_id, seconds, session=''):
+    if reading_events.record(material_id, student_id, seconds, session, flush=False):
+        _flush_in_background()
+
+
+def record_many(entries, student_id, session=''):
+    if reading_events.record_many(entries, student_id, session, flush=False):
+        _flush_in_background()
+
+
+def _flush_in_background():
+    # The flush is handed to the executor rather than to the event loop, so it also completes when the view was
+    # run by a short-lived loop, as under WSGI.
+    if _flush_lock.acquire(blocking=False):
+        _executor.submit(_flush)
+
+
+def _flush():
+    try:
+        _call(reading_events.buffer.flush)
+    except Exception:
+        logger.exception('Writing reading events failed')
+    finally:
+        _flush_lock.release()
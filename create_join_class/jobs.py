@@ -0,0 +1,103 @@
+import datetime
+import traceback
+
+from django.db import close_old_connections
+from django.db.models import F
+from django.utils import timezone
+
+from . import deletion, pdf_processing
+from .models import ProcessingJob
+
+# Seconds to wait before trying a failed job again. The delay doubles with every failed attempt.
+RETRY_DELAY = 30
+
+
+def _process_pdf(job):
+    pdf_processing.process_material(job.material)
+
+
+def _render_pages(job):
+    pdf_processing.render_pages(job.material)
+
+
+def _purge_material(job):
+    deletion.purge_material(job.target)
+
+
+def _purge_classroom(job):
+    deletion.purge_classroom(job.target)
+
+
+# The function that does the work for every kind of job.
+HANDLERS = {
+    'process_pdf': _process_pdf,
+    'render_pages': _render_pages,
+    'purge_material': _purge_material,
+    'purge_classroom': _purge_classroom,
+}
+
+
+def enqueue(kind, material=None):
+    return ProcessingJob.objects.create(kind=kind, material=material)
+
+
+# This method marks up to limit pending jobs as running and returns their ids. Every job is claimed with its own
+# conditional update, so two workers never run the same job, whether or not the database supports row locks.
+def claim(limit):
+    now = timezone.now()
+    candidates = (ProcessingJob.objects.filter(status=ProcessingJob.PENDING, run_after__lte=now)
+                  .order_by('run_after', 'id').values_list('pk', flat=True)[:limit])
+    claimed = []
+    for job_id in candidates:
+        if ProcessingJob.objects.filter(pk=job_id, status=ProcessingJob.PENDING).update(
+                status=ProcessingJob.RUNNING, started=now, attempts=F('attempts') + 1, updated=now):
+            claimed.append(job_id)
+    return claimed
+
+
+# This method puts jobs that have been running for longer than timeout back in the queue, for example because the
+# worker running them was killed. Jobs that already used all their attempts are marked as failed instead, so a file
+# crashing the worker is not tried forever. It returns the number of jobs released and the number failed.
+def release_stale(timeout):
+    now = timezone.now()
+    stale = ProcessingJob.objects.filter(status=ProcessingJob.RUNNING, started__lt=now - timeout)
+    failed = stale.filter(attempts__gte=F('max_attempts')).update(
+        status=ProcessingJob.FAILED, last_error='The worker running the job stopped or timed out.', updated=now)
+    released = stale.update(status=ProcessingJob.PENDING, updated=now)
+    return released, failed
+
+
+# This method runs a claimed job and records the outcome. A job that raises is tried again after a delay until
+# it has used all its attempts. It runs in the worker processes of the run_jobs command and returns the id and
+# new status of the job, or 'gone' when the job was deleted after it was claimed, along with its material.
+# Jobs of reading materials marked as deleted are not run: the material and its files are about to be purged.
+def run(job_id):
+    close_old_connections()
+    try:
+        job = ProcessingJob.objects.select_related('material').get(pk=job_id)
+    except ProcessingJob.DoesNotExist:
+        return job_id, 'gone'
+    if job.material is not None and job.material.deleted is not None:
+        job.status = ProcessingJob.DONE
+        job.last_error = 'Skipped: the reading material was deleted.'
+    else:
+        _run_handler(job)
+    # The job is gone if its material was deleted in the meantime; update() then changes nothing.
+    ProcessingJob.objects.filter(pk=job.pk).update(status=job.status, last_error=job.last_error,
+                                                  run_after=job.run_after, updated=timezone.now())
+    return job.pk, job.status
+
+
+def _run_handler(job):
+    try:
+        HANDLERS[job.kind](job)
+    except Exception:
+        job.last_error = traceback.format_exc()
+        if job.attempts >= job.max_attempts:
+            job.status = ProcessingJob.FAILED
+        else:
+            job.status = ProcessingJob.PENDING
+            job.run_after = timezone.now() + datetime.timedelta(seconds=RETRY_DELAY * 2 ** (job.attempts - 1))
+    else:
+        job.status = ProcessingJob.DONE
+        job.last_error = ''
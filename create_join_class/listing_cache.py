@@ -0,0 +1,104 @@
+import hashlib
+import time
+
+from django.conf import settings
+from django.contrib.messages import get_messages
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date
+
+from .models import ClassRoom, ReadingMaterial
+
+# The cache holding the version of every classroom, and the rendered listing fragments (see the {% cache %} tags
+# of the listing templates, which use the same cache).
+CACHE_ALIAS = getattr(settings, 'LISTING_CACHE', 'default')
+# How long a rendered fragment is kept. A fragment is replaced as soon as its classroom changes version, so this
+# only bounds how long unused fragments take up space.
+FRAGMENT_TIMEOUT = getattr(settings, 'LISTING_FRAGMENT_TIMEOUT', 24 * 3600)
+
+
+def _cache():
+    return caches[CACHE_ALIAS]
+
+
+def _key(classroom_id):
+    return 'listing-version:%d' % classroom_id
+
+
+# This method returns the versions of the classrooms as a dict from classroom id to version. A version is the
+# time of the last change of the classroom, its students or its reading materials, in microseconds. Classrooms
+# without a cached version get the current time, so their listings are rendered again once.
+def versions(classroom_ids):
+    keys = {_key(classroom_id): classroom_id for classroom_id in classroom_ids}
+    found = _cache().get_many(list(keys))
+    missing = {key: _now() for key in keys if key not in found}
+    if missing:
+        _cache().set_many(missing, None)
+        found.update(missing)
+    return {keys[key]: version for key, version in found.items()}
+
+
+def _now():
+    return int(time.time() * 1000000)
+
+
+# This method gives the classrooms a new version once the running transaction is committed, so no request can
+# cache the old content under the new version.
+def bump(classroom_ids):
+    classroom_ids = set(classroom_ids)
+    if classroom_ids:
+        transaction.on_commit(lambda: _bump(classroom_ids))
+
+
+def _bump(classroom_ids):
+    current = versions(classroom_ids)
+    _cache().set_many({_key(classroom_id): max(_now(), current[classroom_id] + 1)
+                       for classroom_id in classroom_ids}, None)
+
+
+# This method answers a GET for a listing page from the versions of the classrooms it shows. The page gets an
+# ETag and a Last-Modified date derived from the versions and the user, and a conditional request for an
+# unchanged page gets a 304 without rendering anything. render_page is only called when the page is needed.
+# Pages with messages waiting to be shown are always rendered.
+def conditional_page(request, classroom_versions, render_page):
+    validator = '%d:%s:%s' % (request.user.pk, sorted(classroom_versions.items()),
+                              request.COOKIES.get(settings.CSRF_COOKIE_NAME, ''))
+    etag = '"%s"' % hashlib.sha1(validator.encode()).hexdigest()
+    last_modified = max(classroom_versions.values(), default=0) // 1000000
+    if request.method in ('GET', 'HEAD') and not len(get_messages(request)):
+        response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if response is not None:
+            return response
+
+    response = render_page()
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    # The browser keeps the page but asks every time whether it changed.
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+
+@receiver(post_save, sender=ReadingMaterial)
+@receiver(post_delete, sender=ReadingMaterial)
+def material_changed(sender, instance, **kwargs):
+    bump([instance.classroom_id])
+
+
+@receiver(post_save, sender=ClassRoom)
+@receiver(post_delete, sender=ClassRoom)
+def classroom_changed(sender, instance, **kwargs):
+    bump([instance.pk])
+
+
+@receiver(m2m_changed, sender=ClassRoom.students.through)
+def classroom_students_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if action == 'pre_clear' and reverse:
+        # The classrooms a user leaves with user.student_of_the_class.clear() are not known afterwards.
+        instance._cleared_classrooms = list(instance.student_of_the_class.values_list('pk', flat=True))
+    elif action == 'post_clear' and reverse:
+        bump(getattr(instance, '_cleared_classrooms', []))
+    elif action in ('post_add', 'post_remove', 'post_clear'):
+        bump(pk_set if reverse else [instance.pk])
@@ -0,0 +1,69 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from create_join_class import benchmarks
+
+
+# This command measures the classroom and reading tracking flows. It seeds a throwaway database with synthetic
+# classrooms, students and PDFs, sends requests to the real URLs from several threads and reports throughput,
+# latency percentiles and queries per request. The results can be saved as JSON and compared with an earlier run;
+# the command fails when a scenario got slower than the threshold allows.
+class Command(BaseCommand):
+    help = 'Runs the benchmark suite against a synthetic database'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--classrooms', type=int, default=10)
+        parser.add_argument('--students', type=int, default=200)
+        parser.add_argument('--pdfs', type=int, default=20)
+        parser.add_argument('--pdf-size', type=int, default=256 * 1024, help='Approximate size of every PDF in bytes')
+        parser.add_argument('--requests', type=int, default=500, help='Measured requests per scenario')
+        parser.add_argument('--concurrency', type=int, default=8, help='Threads sending requests')
+        parser.add_argument('--warmup', type=int, default=5, help='Unmeasured requests per thread')
+        parser.add_argument('--scenario', action='append', dest='scenarios', choices=sorted(benchmarks.SCENARIOS),
+                            help='Scenario to run (can be repeated), all by default')
+        parser.add_argument('--seed', type=int, default=0, help='Seed of the synthetic data and requests')
+        parser.add_argument('--output', help='File to write the results to as JSON')
+        parser.add_argument('--compare', help='Results of an earlier run to compare with')
+        parser.add_argument('--threshold', type=float, default=0.2,
+                            help='Relative change counted as a regression, 0.2 meaning 20%%')
+
+    def handle(self, *args, **options):
+        if min(options['classrooms'], options['students'], options['pdfs'], options['requests'],
+               options['concurrency']) < 1:
+            raise CommandError('Classrooms, students, pdfs, requests and concurrency must be at least 1.')
+        baseline = None
+        if options['compare']:
+            try:
+                with open(options['compare']) as baseline_file:
+                    baseline = json.load(baseline_file)
+            except (OSError, ValueError) as error:
+                raise CommandError('Cannot read %s: %s' % (options['compare'], error))
+
+        scenarios = options['scenarios'] or sorted(benchmarks.SCENARIOS)
+        results = {'environment': benchmarks.environment(), 'options': {
+            key: options[key] for key in ('classrooms', 'students', 'pdfs', 'pdf_size', 'requests', 'concurrency',
+                                          'warmup', 'seed')}, 'scenarios': {}}
+        with benchmarks.isolated_environment(verbosity=max(options['verbosity'] - 1, 0)):
+            data = benchmarks.seed(options['classrooms'], options['students'], options['pdfs'],
+                                   options['pdf_size'], options['seed'])
+            if not data:
+                raise CommandError('No classroom got both students and PDFs; use more students or PDFs.')
+            self.stdout.write('%-20s %9s %7s %9s %9s %9s %9s' % ('scenario', 'req/s', 'errors', 'p50 ms', 'p95 ms',
+                                                                  'p99 ms', 'queries'))
+            for name in scenarios:
+                result = benchmarks.run_scenario(name, data, options['requests'], options['concurrency'],
+                                                 options['warmup'], options['seed'])
+                results['scenarios'][name] = result
+                self.stdout.write('%-20s %9.1f %7d %9.2f %9.2f %9.2f %9.2f' % (
+                    name, result['throughput'], result['errors'], result['p50_ms'], result['p95_ms'],
+                    result['p99_ms'], result['queries_per_request']))
+
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                json.dump(results, output, indent=2)
+        if baseline is not None:
+            regressions = benchmarks.compare(baseline, results, options['threshold'])
+            if regressions:
+                raise CommandError('Regressions against %s:\n%s' % (options['compare'], '\n'.join(regressions)))
+            self.stdout.write(self.style.SUCCESS('No regressions against %s' % options['compare']))
@@ -0,0 +1,27 @@
+import datetime
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from create_join_class import chunked_uploads
+from create_join_class.models import UploadSession
+
+
+# This command removes chunked uploads that were abandoned, along with the chunks received for them, and the
+# completed uploads kept for chunks sent again.
+class Command(BaseCommand):
+    help = 'Deletes chunked uploads that have not received a chunk for a while'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--hours', type=int, default=48,
+                            help='Delete uploads without a new chunk for this many hours (default 48)')
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - datetime.timedelta(hours=options['hours'])
+        removed = 0
+        for upload in UploadSession.objects.filter(material__isnull=True, updated__lt=cutoff).iterator():
+            chunked_uploads.discard(upload)
+            removed += 1
+        completed_cutoff = timezone.now() - chunked_uploads.COMPLETED_KEEP
+        completed, _ = UploadSession.objects.filter(material__isnull=False, updated__lt=completed_cutoff).delete()
+        self.stdout.write(self.style.SUCCESS('Removed %d abandoned and %d completed uploads' % (removed, completed)))
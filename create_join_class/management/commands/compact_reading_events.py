@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand
+
+from create_join_class import retention
+
+
+# This command compacts the reading events older than the retention window into daily summaries, archives them to
+# a gzipped NDJSON file and then reclaims the space they took in the database. It is meant to run from cron, for
+# example once a night.
+class Command(BaseCommand):
+    help = 'Compacts old reading events into daily summaries and archives them'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=retention.RETENTION_DAYS,
+                            help='Compact the events older than this many days (default %(default)s)')
+        parser.add_argument('--archive-dir', default=retention.ARCHIVE_ROOT,
+                            help='Directory the compacted events are archived to (default %(default)s)')
+        parser.add_argument('--batch-size', type=int, default=retention.BATCH_SIZE,
+                            help='Number of events compacted per transaction (default %(default)s)')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Only count the events that would be compacted')
+        parser.add_argument('--no-vacuum', action='store_true',
+                            help='Do not reclaim the space of the deleted events afterwards')
+
+    def handle(self, *args, **options):
+        before = retention.cutoff(options['days'])
+        compacted, path = retention.compact(before, options['archive_dir'], options['batch_size'],
+                                            options['dry_run'])
+        if options['dry_run']:
+            self.stdout.write('%d reading events from before %s would be compacted' % (compacted, before.date()))
+            return
+        if compacted:
+            self.stdout.write('Archived %d reading events to %s' % (compacted, path))
+            if not options['no_vacuum'] and retention.reclaim_space():
+                self.stdout.write('Reclaimed the space of the deleted events')
+        self.stdout.write(self.style.SUCCESS('Compacted %d reading events from before %s' % (
+            compacted, before.date())))
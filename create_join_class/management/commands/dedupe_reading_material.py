@@ -0,0 +1,45 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from create_join_class.models import ReadingMaterial, StoredFile, hash_file
+from private_storage.storage import private_storage
+
+
+# This command moves reading materials uploaded before files were stored by content into content-addressed
+# storage. Materials with the same content end up pointing to one stored file and the old copies are deleted.
+class Command(BaseCommand):
+    help = 'Moves existing reading material files into deduplicated, content-addressed storage'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Only report how much space would be reclaimed')
+
+    def handle(self, *args, **options):
+        migrated = missing = 0
+        old_bytes = new_bytes = 0
+        seen = set(StoredFile.objects.values_list('digest', flat=True))
+        for material in ReadingMaterial.objects.filter(blob=None).iterator():
+            name = material.readingFile.name
+            if not name or not private_storage.exists(name):
+                missing += 1
+                continue
+            with private_storage.open(name) as file:
+                digest = hash_file(file)
+                size = file.size
+                old_bytes += size
+                if digest not in seen:
+                    new_bytes += size
+                    seen.add(digest)
+                if not options['dry_run']:
+                    file.sha256 = digest
+                    with transaction.atomic():
+                        material.blob = StoredFile.store(file)
+                        material.readingFile = material.blob.name
+                        material.save(update_fields=['blob', 'readingFile'])
+            if not options['dry_run']:
+                private_storage.delete(name)
+            migrated += 1
+
+        verb = 'Would reclaim' if options['dry_run'] else 'Reclaimed'
+        self.stdout.write(self.style.SUCCESS('%s %d bytes from %d reading materials (%d files missing)'
+                                             % (verb, old_bytes - new_bytes, migrated, missing)))
@@ -0,0 +1,39 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from create_join_class import exports
+from create_join_class.models import ClassRoom
+
+
+# This command writes the reading events of a classroom as CSV or NDJSON, streaming them from the database
+# in chunks like the export_reading_info view does.
+class Command(BaseCommand):
+    help = 'Exports the reading events of all reading materials in a classroom'
+
+    def add_arguments(self, parser):
+        parser.add_argument('classroom', type=int, help='Id of the classroom to export')
+        parser.add_argument('--format', choices=sorted(exports.FORMATS), default='csv')
+        parser.add_argument('--start', help='First day to export (YYYY-MM-DD)')
+        parser.add_argument('--end', help='Last day to export (YYYY-MM-DD)')
+        parser.add_argument('--material', type=int, action='append', dest='materials',
+                            help='Only export this reading material (can be repeated)')
+        parser.add_argument('--output', help='File to write to instead of standard output')
+
+    def handle(self, *args, **options):
+        if not ClassRoom.objects.filter(pk=options['classroom']).exists():
+            raise CommandError('No classroom with id %d' % options['classroom'])
+        try:
+            start = exports.parse_day(options['start'])
+            end = exports.parse_day(options['end'])
+        except ValueError as error:
+            raise CommandError(error)
+
+        rows = exports.reading_rows(options['classroom'], start, end, options['materials'])
+        output = open(options['output'], 'w', newline='') if options['output'] else sys.stdout
+        try:
+            for line in exports.export_lines(options['format'], rows):
+                output.write(line)
+        finally:
+            if options['output']:
+                output.close()
@@ -0,0 +1,55 @@
+from collections import defaultdict
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from create_join_class import rollups
+from create_join_class.models import ReadingEvent, ReadingInfo
+
+# The session of the imported reading events. Their sequence number is the id of their material, so every student
+# and material is imported once: a second run skips them, and ignore_conflicts drops them if another run inserted
+# them in the meantime. Imported events that were compacted (see retention) no longer carry their session.
+LEGACY_SESSION = 'legacy'
+
+
+# This command moves the reading time kept in the JSON field of every ReadingInfo object into reading events,
+# one event per student and material, so the totals derived from reading events include the older data. Running
+# it again only imports the students and materials that were not imported yet.
+class Command(BaseCommand):
+    help = 'Imports the reading time stored in ReadingInfo JSON fields as reading events'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--delete', action='store_true',
+                            help='Delete the ReadingInfo objects once their reading time is imported')
+
+    def handle(self, *args, **options):
+        users = dict(User.objects.values_list('username', 'id'))
+        # (material id, student id) -> seconds, added up over the ReadingInfo objects of a material.
+        totals = defaultdict(int)
+        skipped = 0
+        for info in ReadingInfo.objects.exclude(material_info=None).iterator():
+            for username, seconds in info.material_info.items():
+                try:
+                    seconds = int(float(seconds))
+                except (TypeError, ValueError, OverflowError):
+                    seconds = 0
+                if username not in users or seconds <= 0:
+                    skipped += 1
+                    continue
+                totals[(info.material_id_id, users[username])] += seconds
+
+        with transaction.atomic():
+            imported = set(ReadingEvent.objects.filter(session=LEGACY_SESSION)
+                           .values_list('material_id', 'student_id'))
+            events = [ReadingEvent(material_id=material_id, student_id=student_id, session=LEGACY_SESSION,
+                                   sequence=material_id, seconds=seconds)
+                      for (material_id, student_id), seconds in totals.items()
+                      if (material_id, student_id) not in imported]
+            ReadingEvent.objects.bulk_create(events, batch_size=500, ignore_conflicts=True)
+            rollups.apply(events)
+            if options['delete']:
+                ReadingInfo.objects.all().delete()
+
+        self.stdout.write(self.style.SUCCESS('Imported %d reading events, skipped %d entries and %d already imported'
+                                             % (len(events), skipped, len(totals) - len(events))))
@@ -0,0 +1,43 @@
+import os
+
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+
+from create_join_class import provisioning
+
+
+# This command creates classrooms and enrolls their students from a CSV or JSON roster, like the
+# provision_classrooms view does. The classes it creates are listed with their class codes.
+class Command(BaseCommand):
+    help = 'Creates classrooms and enrolls students in bulk from a CSV or JSON roster'
+
+    def add_arguments(self, parser):
+        parser.add_argument('roster', help='CSV or JSON roster file (see provisioning.parse_roster)')
+        parser.add_argument('--format', choices=['csv', 'json'],
+                            help='Format of the roster, by default taken from the file extension')
+        parser.add_argument('--create-users', action='store_true',
+                            help='Create accounts without a usable password for unknown usernames')
+
+    def handle(self, *args, **options):
+        roster_format = options['format'] or os.path.splitext(options['roster'])[1].lstrip('.').lower()
+        try:
+            with open(options['roster'], encoding='utf-8-sig') as roster:
+                classes = provisioning.parse_roster(roster.read(), roster_format)
+        except OSError as error:
+            raise CommandError(error)
+        except ValidationError as error:
+            raise CommandError(error.messages[0])
+
+        result = provisioning.provision(classes, create_missing=options['create_users'])
+        for classroom in result['classes']:
+            self.stdout.write('%s.%d %s %s' % (classroom['name'], classroom['section'], classroom['teacher'],
+                                                classroom['classCode']))
+        for conflict in result['code_conflicts']:
+            self.stderr.write('Skipped %s.%d %s: class code %s is taken by a %s' % (
+                conflict['name'], conflict['section'], conflict['teacher'], conflict['classCode'], conflict['reason']))
+        if result['unknown_users']:
+            self.stderr.write('Skipped unknown users: %s' % ', '.join(result['unknown_users']))
+        self.stdout.write(self.style.SUCCESS(
+            'Created %d classes (%d existed) and %d enrollments (%d existed)' % (
+                result['classes_created'], result['classes_existing'], result['enrollments_created'],
+                result['enrollments_existing'])))
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from create_join_class import rollups
+
+
+# This command recomputes the reading time rollups from the reading events and their daily summaries, for example
+# after reading events were imported or deleted outside of the write-behind buffer.
+class Command(BaseCommand):
+    help = 'Rebuilds the per student and per day reading time rollups from the reading events'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--material', type=int, action='append', dest='materials',
+                            help='Only rebuild the rollups of this reading material (can be repeated)')
+
+    def handle(self, *args, **options):
+        students, days = rollups.rebuild(options['materials'])
+        self.stdout.write(self.style.SUCCESS('Wrote %d student rollups and %d daily rollups' % (students, days)))
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from create_join_class import search
+
+
+# This command creates the full-text index of the reading materials when it is missing and, on SQLite, fills
+# it again from the extracted page texts. The index is otherwise kept up to date as pages are extracted and
+# reading materials deleted.
+class Command(BaseCommand):
+    help = 'Creates or rebuilds the full-text search index of the reading materials'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default='default', help='Database to index (default %(default)s)')
+
+    def handle(self, *args, **options):
+        search.rebuild(options['database'])
+        self.stdout.write(self.style.SUCCESS('Rebuilt the search index'))
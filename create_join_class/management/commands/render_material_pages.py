@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from create_join_class import page_assets
+from create_join_class.models import ProcessingJob, ReadingMaterial
+
+
+# This command queues a render_pages job for every reading material whose pages are not rendered yet, for example
+# the materials uploaded before pages were rendered. The jobs are run by the run_jobs command.
+class Command(BaseCommand):
+    help = 'Queues the rendering of the pages of reading materials that have no rendered pages yet'
+
+    def handle(self, *args, **options):
+        queued = set(ProcessingJob.objects.filter(kind='render_pages', status__in=[
+            ProcessingJob.PENDING, ProcessingJob.RUNNING]).values_list('material_id', flat=True))
+        jobs = [ProcessingJob(kind='render_pages', material=material)
+                for material in ReadingMaterial.objects.select_related('blob').iterator()
+                if material.pk not in queued and page_assets.manifest(page_assets.key(material)) is None]
+        ProcessingJob.objects.bulk_create(jobs, batch_size=500)
+        self.stdout.write(self.style.SUCCESS('Queued %d render_pages jobs' % len(jobs)))
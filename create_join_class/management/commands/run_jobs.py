@@ -0,0 +1,80 @@
+import datetime
+import logging
+import multiprocessing
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from create_join_class import jobs, worker
+
+logger = logging.getLogger(__name__)
+
+
+# This command is the worker for background jobs. It claims pending jobs from the database and runs them in a pool
+# of processes, so slow work such as rendering pdf thumbnails never runs inside a request.
+class Command(BaseCommand):
+    help = 'Runs pending background jobs, such as processing uploaded pdf files'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=os.cpu_count() or 1,
+                            help='Number of worker processes (default: number of CPUs)')
+        parser.add_argument('--once', action='store_true',
+                            help='Exit once there are no more jobs to run instead of waiting for new ones')
+        parser.add_argument('--sleep', type=float, default=2,
+                            help='Seconds to wait between looking for new jobs (default 2)')
+        parser.add_argument('--stale-minutes', type=int, default=30,
+                            help='Run jobs again that have been running for this many minutes (default 30)')
+
+    def handle(self, *args, **options):
+        processes = options['processes']
+        stale = datetime.timedelta(minutes=options['stale_minutes'])
+        pool = self._pool(processes)
+        # The running futures and the ids of their jobs.
+        running = {}
+        try:
+            while True:
+                released, failed = jobs.release_stale(stale)
+                if released or failed:
+                    self.stdout.write('Released %d stale jobs, %d failed for good' % (released, failed))
+                free = processes - len(running)
+                if free:
+                    running.update((pool.submit(worker.run, job_id), job_id) for job_id in jobs.claim(free))
+                if not running:
+                    if options['once']:
+                        break
+                    connections.close_all()
+                    time.sleep(options['sleep'])
+                    continue
+                done, _ = wait(running, timeout=options['sleep'], return_when=FIRST_COMPLETED)
+                broken = False
+                for future in done:
+                    job_id = running.pop(future)
+                    try:
+                        job_id, status = future.result()
+                    except BrokenProcessPool:
+                        # A worker process died, for example in a crash of PyMuPDF. Its job stays running until it
+                        # is released as stale, which counts it as an attempt.
+                        broken = True
+                        logger.exception('Job %d: the worker process died', job_id)
+                    except Exception:
+                        logger.exception('Job %d: could not be run', job_id)
+                    else:
+                        self.stdout.write('Job %d: %s' % (job_id, status))
+                if broken:
+                    # Every other future of a broken pool fails too, and no job can be submitted to it.
+                    for job_id in running.values():
+                        logger.error('Job %d: the worker process died', job_id)
+                    running.clear()
+                    pool.shutdown(wait=False)
+                    pool = self._pool(processes)
+        finally:
+            pool.shutdown()
+
+    def _pool(self, processes):
+        # Workers are spawned rather than forked so they do not share the database connections of this process.
+        context = multiprocessing.get_context('spawn')
+        return ProcessPoolExecutor(max_workers=processes, mp_context=context, initializer=worker.init)
@@ -0,0 +1,66 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from create_join_class import startup
+
+
+# This command measures how long the web, worker and management processes take to start, split into the import
+# of the settings and django.setup(), with the import time of the slowest packages and modules. The results can be
+# saved as JSON and compared with an earlier run, to follow the start time from one change to the next.
+class Command(BaseCommand):
+    help = 'Measures the start time of every process role, by phase and by imported module'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--role', action='append', dest='roles', choices=startup.ROLES,
+                            help='Role to measure (can be repeated), all by default')
+        parser.add_argument('--repeat', type=int, default=5, help='Processes started per role')
+        parser.add_argument('--top', type=int, default=15, help='Packages and modules listed per role')
+        parser.add_argument('--output', help='File to write the results to as JSON')
+        parser.add_argument('--compare', help='Results of an earlier run to compare with')
+
+    def handle(self, *args, **options):
+        if options['repeat'] < 1:
+            raise CommandError('Repeat must be at least 1.')
+        baseline = {}
+        if options['compare']:
+            try:
+                with open(options['compare']) as baseline_file:
+                    baseline = {result['role']: result for result in json.load(baseline_file)['roles']}
+            except (OSError, ValueError, KeyError) as error:
+                raise CommandError('Cannot read %s: %s' % (options['compare'], error))
+
+        results = []
+        for role in options['roles'] or startup.ROLES:
+            try:
+                results.append(startup.measure(role, options['repeat'], options['top']))
+            except RuntimeError as error:
+                raise CommandError(str(error))
+
+        for result in results:
+            self.stdout.write('\n%s: %d apps, %d ms to start' % (result['role'], len(result['apps']),
+                                                                 result['total_ms']))
+            self.stdout.write('  %-30s %9.1f ms' % ('settings', result['settings_ms']))
+            self.stdout.write('  %-30s %9.1f ms' % ('django.setup()', result['setup_ms']))
+            self.stdout.write('  imports by package (%.1f ms in all):' % result['import_ms'])
+            for package in result['packages']:
+                self.stdout.write('    %-28s %9.1f ms' % (package['name'], package['ms']))
+            self.stdout.write('  slowest modules imported at start, with their imports:')
+            for module in result['top_level']:
+                self.stdout.write('    %-28s %9.1f ms' % (module['name'], module['ms']))
+
+        self.stdout.write('\n%-12s %6s %12s %12s %12s %10s' % ('role', 'apps', 'settings ms', 'setup ms',
+                                                               'total ms', 'change'))
+        for result in results:
+            before = baseline.get(result['role'])
+            change = ''
+            if before:
+                change = '%+.1f%%' % (100.0 * (result['total_ms'] - before['total_ms']) / before['total_ms'])
+            self.stdout.write('%-12s %6d %12.1f %12.1f %12.1f %10s' % (
+                result['role'], len(result['apps']), result['settings_ms'], result['setup_ms'], result['total_ms'],
+                change))
+
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                json.dump({'roles': results}, output, indent=2)
+            self.stdout.write(self.style.SUCCESS('Results written to %s' % options['output']))
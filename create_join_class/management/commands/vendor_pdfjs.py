@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from create_join_class import pdfjs
+
+
+# This command downloads the pdf.js build used by the pdf viewer into the static files of create_join_class. Run it
+# once when pdfjs.VERSION changes and commit the files; the viewer does not load pdf.js from a CDN.
+class Command(BaseCommand):
+    help = 'Downloads the pdf.js files of the pdf viewer into the static files'
+
+    def handle(self, *args, **options):
+        try:
+            downloaded = pdfjs.download()
+        except OSError as error:
+            raise CommandError('Could not download pdf.js %s: %s' % (pdfjs.VERSION, error))
+        for path, digest in downloaded:
+            self.stdout.write('%s  sha384 %s' % (path, digest))
+        self.stdout.write(self.style.SUCCESS('Downloaded pdf.js %s' % pdfjs.VERSION))
@@ -0,0 +1,96 @@
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from .models import ClassRoom
+
+# The cache holding the classrooms of every user, one of settings.CACHES. Any cache backend works, including the
+# local-memory and file based ones. With local-memory caches every process keeps its own copy, so entries are also
+# dropped after TIMEOUT seconds in case another process changed them.
+CACHE_ALIAS = getattr(settings, 'MEMBERSHIP_CACHE', 'default')
+TIMEOUT = getattr(settings, 'MEMBERSHIP_CACHE_TIMEOUT', 300)
+SUMMARY_FIELDS = ('id', 'name', 'section', 'classCode')
+
+
+def _cache():
+    return caches[CACHE_ALIAS]
+
+
+def _key(user_id):
+    return 'memberships:%d' % user_id
+
+
+# This method returns the classrooms a user created and joined as {'created': [...], 'joined': [...]}, every
+# classroom being a dict with its id, name, section and classCode. They are read from the database only when
+# they are not cached yet.
+def get(user_id):
+    memberships = _cache().get(_key(user_id))
+    if memberships is None:
+        memberships = {
+            'created': list(ClassRoom.objects.filter(teacher_id=user_id).order_by('id').values(*SUMMARY_FIELDS)),
+            'joined': list(ClassRoom.objects.filter(students=user_id).order_by('id').values(*SUMMARY_FIELDS)),
+        }
+        _cache().set(_key(user_id), memberships, TIMEOUT)
+    return memberships
+
+
+# This method returns the summary of a classroom the user created, or None if the user is not its teacher.
+def created_classroom(user_id, classroom_id):
+    return _find(get(user_id)['created'], classroom_id)
+
+
+# This method returns the summary of a classroom the user joined, or None if the user is not one of its students.
+def joined_classroom(user_id, classroom_id):
+    return _find(get(user_id)['joined'], classroom_id)
+
+
+def _find(classrooms, classroom_id):
+    for classroom in classrooms:
+        if classroom['id'] == int(classroom_id):
+            return classroom
+    return None
+
+
+# This method drops the cached classrooms of the users once the running transaction is committed, so no other
+# request can cache the old memberships again before the change is visible.
+def invalidate(user_ids):
+    keys = [_key(user_id) for user_id in set(user_ids)]
+    if keys:
+        transaction.on_commit(lambda: _cache().delete_many(keys))
+
+
+def _classroom_users(classroom):
+    return [classroom.teacher_id] + list(classroom.students.values_list('pk', flat=True))
+
+
+@receiver(post_save, sender=ClassRoom)
+def classroom_saved(sender, instance, created, **kwargs):
+    # A new classroom has no students yet, a renamed one is shown in the lists of all its members.
+    invalidate([instance.teacher_id] if created else _classroom_users(instance))
+
+
+@receiver(pre_delete, sender=ClassRoom)
+def classroom_deleting(sender, instance, **kwargs):
+    # The students are no longer known once the classroom is deleted.
+    instance._members = _classroom_users(instance)
+
+
+@receiver(post_delete, sender=ClassRoom)
+def classroom_deleted(sender, instance, **kwargs):
+    invalidate(getattr(instance, '_members', [instance.teacher_id]))
+
+
+@receiver(m2m_changed, sender=ClassRoom.students.through)
+def students_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if reverse:
+        # user.student_of_the_class was changed; only that user's classrooms change.
+        if action in ('post_add', 'post_remove', 'post_clear'):
+            invalidate([instance.pk])
+    elif action == 'pre_clear':
+        instance._cleared_students = list(instance.students.values_list('pk', flat=True))
+    elif action == 'post_clear':
+        invalidate(getattr(instance, '_cleared_students', []))
+    elif action in ('post_add', 'post_remove'):
+        invalidate(pk_set)
@@ -0,0 +1,266 @@
+import asyncio
+import atexit
+import bisect
+import glob
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+
+from django.conf import settings
+
+from . import profiling
+
+logger = logging.getLogger(__name__)
+
+# The directory every worker process writes its metrics to, so the /metrics view of any process reports the
+# requests of all of them. With None every process only reports its own requests.
+ROOT = getattr(settings, 'METRICS_ROOT', None)
+# How often in seconds a process writes its metrics to ROOT. It is done by a timer thread, off the request path,
+# from the first request of the process until it exits.
+FLUSH_INTERVAL = getattr(settings, 'METRICS_FLUSH_INTERVAL', 5)
+# Every running process rewrites its file every FLUSH_INTERVAL seconds, so the files not written for this many
+# seconds are of processes that are gone. They are left out and removed.
+STALE_SECONDS = 60
+# The upper bounds in seconds of the buckets of the request latency histograms.
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+PREFIX = 'readingroom_'
+# The route of requests that matched no URL pattern, such as static files and 404s.
+UNMATCHED = '<unmatched>'
+
+# The values kept per route and method, followed by one count per bucket and one for slower requests.
+COUNT, SECONDS, QUERIES, QUERY_SECONDS, BYTES = range(5)
+_FIELDS = 5
+
+_lock = threading.Lock()
+# (route, method) -> [count, seconds, queries, query seconds, bytes, bucket counts...]
+_routes = {}
+# (route, method, status) -> count
+_statuses = {}
+_in_flight = 0
+# The file of this process in ROOT, named after its pid and a random id, so a process reusing the pid of a gone one
+# never takes over its counters.
+_name = None
+_timer = None
+
+
+def started():
+    global _in_flight
+    with _lock:
+        _in_flight += 1
+
+
+def finished():
+    global _in_flight
+    with _lock:
+        _in_flight -= 1
+
+
+# This method records a handled request. It only updates a few numbers under a lock, so it can stay on for every
+# request; the metrics are written to ROOT by the timer thread started by the first request.
+def observe(route, method, status, seconds, queries, query_seconds, size):
+    with _lock:
+        values = _routes.get((route, method))
+        if values is None:
+            values = _routes[(route, method)] = [0] * (_FIELDS + len(BUCKETS) + 1)
+        values[COUNT] += 1
+        values[SECONDS] += seconds
+        values[QUERIES] += queries
+        values[QUERY_SECONDS] += query_seconds
+        values[BYTES] += size
+        values[_FIELDS + bisect.bisect_left(BUCKETS, seconds)] += 1
+        _statuses[(route, method, status)] = _statuses.get((route, method, status), 0) + 1
+        if ROOT is not None and _timer is None:
+            _schedule()
+
+
+# This method starts the timer writing the metrics after FLUSH_INTERVAL seconds. It is called with the lock held.
+def _schedule():
+    global _timer
+    _timer = threading.Timer(FLUSH_INTERVAL, _flush_from_timer)
+    _timer.daemon = True
+    _timer.start()
+
+
+def _flush_from_timer():
+    try:
+        flush()
+    except Exception:
+        logger.exception('Could not write the metrics to %s', ROOT)
+    finally:
+        with _lock:
+            _schedule()
+
+
+# A forked process gets neither the timer thread nor the file of its parent.
+def _forked():
+    global _lock, _routes, _statuses, _in_flight, _name, _timer
+    _lock = threading.Lock()
+    _routes, _statuses, _in_flight, _name, _timer = {}, {}, 0, None, None
+
+
+# The last requests of an exiting process are written too.
+def _flush_at_exit():
+    if _timer is not None:
+        flush()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_forked)
+atexit.register(_flush_at_exit)
+
+
+def snapshot():
+    with _lock:
+        return {
+            'routes': [[route, method, list(values)] for (route, method), values in _routes.items()],
+            'statuses': [[route, method, status, count] for (route, method, status), count in _statuses.items()],
+            'in_flight': _in_flight,
+            'time': time.time(),
+        }
+
+
+# This method writes the metrics of this process to ROOT, under a temporary name renamed once written, so the
+# metrics view never reads half a file.
+def flush():
+    global _name
+    if _name is None:
+        _name = '%d-%s.json' % (os.getpid(), uuid.uuid4().hex)
+    os.makedirs(ROOT, exist_ok=True)
+    path = os.path.join(ROOT, _name)
+    temporary = path + '.tmp'
+    with open(temporary, 'w') as file:
+        json.dump(snapshot(), file)
+    os.replace(temporary, path)
+
+
+# This method returns the metrics of all the processes, in the Prometheus text format.
+def render():
+    if ROOT is None:
+        snapshots = [snapshot()]
+    else:
+        flush()
+        snapshots = []
+        for path in glob.glob(os.path.join(ROOT, '*.json')):
+            try:
+                with open(path) as file:
+                    process = json.load(file)
+            except (OSError, ValueError):
+                continue
+            if time.time() - process['time'] >= STALE_SECONDS:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+                continue
+            snapshots.append(process)
+
+    routes = {}
+    statuses = {}
+    in_flight = 0
+    for process in snapshots:
+        for route, method, values in process['routes']:
+            totals = routes.setdefault((route, method), [0] * len(values))
+            for index, value in enumerate(values):
+                totals[index] += value
+        for route, method, status, count in process['statuses']:
+            statuses[(route, method, status)] = statuses.get((route, method, status), 0) + count
+        in_flight += process['in_flight']
+
+    lines = []
+    _family(lines, 'requests_total', 'counter', 'Requests handled, by route, method and status code.',
+            [(_labels(route=route, method=method, status=status), count)
+             for (route, method, status), count in sorted(statuses.items())])
+    lines.append('# HELP %srequest_duration_seconds Time taken to handle requests, by route and method.' % PREFIX)
+    lines.append('# TYPE %srequest_duration_seconds histogram' % PREFIX)
+    for (route, method), values in sorted(routes.items()):
+        cumulative = 0
+        for bound, count in zip(BUCKETS + ('+Inf',), values[_FIELDS:]):
+            cumulative += count
+            lines.append('%srequest_duration_seconds_bucket%s %d' % (
+                PREFIX, _labels(route=route, method=method, le=bound), cumulative))
+        lines.append('%srequest_duration_seconds_sum%s %r' % (PREFIX, _labels(route=route, method=method),
+                                                              float(values[SECONDS])))
+        lines.append('%srequest_duration_seconds_count%s %d' % (PREFIX, _labels(route=route, method=method),
+                                                                values[COUNT]))
+    for name, index, help_text in [
+        ('db_queries_total', QUERIES, 'Database queries run, by route and method.'),
+        ('db_query_seconds_total', QUERY_SECONDS, 'Time spent in database queries, by route and method.'),
+        ('response_bytes_total', BYTES, 'Size of the response bodies sent, by route and method.'),
+    ]:
+        _family(lines, name, 'counter', help_text, [(_labels(route=route, method=method), values[index])
+                                                    for (route, method), values in sorted(routes.items())])
+    _family(lines, 'requests_in_flight', 'gauge', 'Requests being handled.', [('', in_flight)])
+    return '\n'.join(lines) + '\n'
+
+
+def _family(lines, name, kind, help_text, samples):
+    lines.append('# HELP %s%s %s' % (PREFIX, name, help_text))
+    lines.append('# TYPE %s%s %s' % (PREFIX, name, kind))
+    for labels, value in samples:
+        lines.append('%s%s%s %s' % (PREFIX, name, labels, value if isinstance(value, int) else repr(float(value))))
+
+
+def _labels(**labels):
+    return '{%s}' % ','.join('%s="%s"' % (name, str(value).replace('\\', r'\\').replace('"', r'\"')
+                                          .replace('\n', r'\n')) for name, value in labels.items())
+
+
+# This class is the middleware recording the metrics of every request: its latency, its database queries (counted
+# by the QueryCountMiddleware, which has to come after it), the size of its response and the requests in flight.
+# It also runs the sampling profiler (see create_join_class.profiling). It works in sync and async middleware chains.
+class MetricsMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if asyncio.iscoroutinefunction(get_response):
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+        started()
+        start = time.perf_counter()
+        sample = profiling.start(request)
+        try:
+            response = self.get_response(request)
+        except BaseException:
+            if sample is not None:
+                profiling.cancel(sample)
+            raise
+        finally:
+            finished()
+        return self._record(request, response, start, sample)
+
+    async def __acall__(self, request):
+        started()
+        start = time.perf_counter()
+        sample = profiling.start(request)
+        try:
+            response = await self.get_response(request)
+        except BaseException:
+            if sample is not None:
+                profiling.cancel(sample)
+            raise
+        finally:
+            finished()
+        return self._record(request, response, start, sample)
+
+    def _record(self, request, response, start, sample):
+        seconds = time.perf_counter() - start
+        route = getattr(request.resolver_match, 'route', None) or UNMATCHED
+        if sample is not None:
+            profiling.stop(sample, request, response, route, seconds)
+        counter = getattr(request, 'query_counter', None)
+        if response.streaming:
+            # Streamed files carry their size; other streams are not counted.
+            size = int(response.get('Content-Length') or 0)
+        else:
+            size = len(response.content)
+        observe(route, request.method, response.status_code, seconds, counter.count if counter else 0,
+                counter.seconds if counter else 0.0, size)
+        return response
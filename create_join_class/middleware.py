@@ -0,0 +1,40 @@
+import asyncio
+
+from django.contrib.auth.middleware import AuthenticationMiddleware
+from django.utils.functional import SimpleLazyObject
+from whitenoise.middleware import WhiteNoiseMiddleware
+
+from . import auth_cache
+
+
+# This class is WhiteNoise's middleware made usable in an async middleware chain. A sync-only middleware makes
+# Django run every view below it in a thread, which would defeat the async reading time views. Static files are
+# still served by WhiteNoise; any other request goes on to the async handler.
+class AsyncWhiteNoiseMiddleware(WhiteNoiseMiddleware):
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response=None):
+        super().__init__(get_response)
+        if asyncio.iscoroutinefunction(get_response):
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+        return super().__call__(request)
+
+    async def __acall__(self, request):
+        # WhiteNoise returns the static file response, or what get_response returns, here a coroutine.
+        response = super().__call__(request)
+        if asyncio.iscoroutine(response):
+            response = await response
+        return response
+
+
+# This class is Django's AuthenticationMiddleware with the logged in user read from the auth cache (see
+# create_join_class.auth_cache), so a request from a logged in user makes no query to load the user.
+class CachedAuthenticationMiddleware(AuthenticationMiddleware):
+    def process_request(self, request):
+        super().process_request(request)
+        request.user = SimpleLazyObject(lambda: auth_cache.get_user(request))
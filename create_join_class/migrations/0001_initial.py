@@ -0,0 +1,49 @@
+# Generated by Django 3.2.25 on 2026-10-17 03:17
+
+import create_join_class.validators
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import private_storage.fields
+import private_storage.storage.files
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ClassRoom',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100)),
+                ('section', models.IntegerField()),
+                ('classCode', models.CharField(blank=True, max_length=6, null=True, unique=True)),
+                ('students', models.ManyToManyField(blank=True, related_name='student_of_the_class', to=settings.AUTH_USER_MODEL)),
+                ('teacher', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='teacher_of_the_class', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ReadingMaterial',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100)),
+                ('readingFile', private_storage.fields.PrivateFileField(storage=private_storage.storage.files.PrivateFileSystemStorage(), upload_to='uploads/ReadingMaterial/', validators=[create_join_class.validators.validate_file_extension])),
+                ('classroom', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='classroom', to='create_join_class.classroom')),
+                ('uploader', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='uploader', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ReadingInfo',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('material_info', models.JSONField(null=True)),
+                ('material_id', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='create_join_class.readingmaterial')),
+            ],
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 3.2.25 on 2026-10-17 03:17
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('create_join_class', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReadingEvent',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('session', models.CharField(blank=True, max_length=32)),
+                ('seconds', models.PositiveIntegerField()),
+                ('timestamp', models.DateTimeField(default=django.utils.timezone.now)),
+                ('material', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='reading_events', to='create_join_class.readingmaterial')),
+                ('student', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='reading_events', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='readingevent',
+            index=models.Index(fields=['material', 'student'], name='create_join_materia_4b3896_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='readingevent',
+            index=models.Index(fields=['material', 'timestamp'], name='create_join_materia_0e6bce_idx'),
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 3.2.25 on 2026-10-17 03:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('create_join_class', '0002_reading_events'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='readingevent',
+            name='sequence',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddConstraint(
+            model_name='readingevent',
+            constraint=models.UniqueConstraint(fields=('student', 'session', 'sequence'), name='unique_reading_event_sequence'),
+        ),
+    ]
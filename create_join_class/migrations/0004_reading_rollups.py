@@ -0,0 +1,44 @@
+# Generated by Django 3.2.25 on 2026-10-17 03:17
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('create_join_class', '0003_reading_event_sequence'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MaterialStudentRollup',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('seconds', models.PositiveIntegerField(default=0)),
+                ('last_read', models.DateTimeField(null=True)),
+                ('material', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='student_rollups', to='create_join_class.readingmaterial')),
+                ('student', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='reading_rollups', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='MaterialDailyRollup',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('seconds', models.PositiveIntegerField(default=0)),
+                ('events', models.PositiveIntegerField(default=0)),
+                ('material', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_rollups', to='create_join_class.readingmaterial')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='materialstudentrollup',
+            constraint=models.UniqueConstraint(fields=('material', 'student'), name='unique_material_student_rollup'),
+        ),
+        migrations.AddConstraint(
+            model_name='materialdailyrollup',
+            constraint=models.UniqueConstraint(fields=('material', 'day'), name='unique_material_daily_rollup'),
+        ),
+    ]
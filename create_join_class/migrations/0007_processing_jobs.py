@@ -0,0 +1,60 @@
+# Generated by Django 3.2.25 on 2026-10-17 03:17
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+import private_storage.fields
+import private_storage.storage.files
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('create_join_class', '0006_upload_sessions'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='readingmaterial',
+            name='page_count',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='readingmaterial',
+            name='thumbnail',
+            field=private_storage.fields.PrivateFileField(blank=True, null=True, storage=private_storage.storage.files.PrivateFileSystemStorage(), upload_to='thumbnails/'),
+        ),
+        migrations.CreateModel(
+            name='ProcessingJob',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(max_length=30)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('running', 'Running'), ('done', 'Done'), ('failed', 'Failed')], default='pending', max_length=10)),
+                ('attempts', models.PositiveIntegerField(default=0)),
+                ('max_attempts', models.PositiveIntegerField(default=5)),
+                ('last_error', models.TextField(blank=True)),
+                ('run_after', models.DateTimeField(default=django.utils.timezone.now)),
+                ('started', models.DateTimeField(blank=True, null=True)),
+                ('created', models.DateTimeField(auto_now_add=True)),
+                ('updated', models.DateTimeField(auto_now=True)),
+                ('material', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='jobs', to='create_join_class.readingmaterial')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='MaterialPageText',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('page', models.PositiveIntegerField()),
+                ('text', models.TextField(blank=True)),
+                ('material', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='page_texts', to='create_join_class.readingmaterial')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='processingjob',
+            index=models.Index(fields=['status', 'run_after'], name='create_join_status_23cff6_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='materialpagetext',
+            constraint=models.UniqueConstraint(fields=('material', 'page'), name='unique_material_page_text'),
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 3.2.25 on 2026-10-17 03:17
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('create_join_class', '0007_processing_jobs'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PageDwell',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('seconds', models.BinaryField(default=bytes)),
+                ('updated', models.DateTimeField(auto_now=True)),
+                ('material', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='page_dwells', to='create_join_class.readingmaterial')),
+                ('student', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='page_dwells', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='pagedwell',
+            constraint=models.UniqueConstraint(fields=('material', 'student'), name='unique_material_student_page_dwell'),
+        ),
+    ]
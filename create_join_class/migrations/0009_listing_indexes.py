@@ -0,0 +1,17 @@
+# Generated by Django 3.2.25 on 2026-10-17 03:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('create_join_class', '0008_page_dwell'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='readingmaterial',
+            index=models.Index(fields=['classroom', 'uploader'], name='create_join_classro_afb234_idx'),
+        ),
+    ]
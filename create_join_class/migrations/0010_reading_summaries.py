@@ -0,0 +1,36 @@
+# Generated by Django 3.2.25 on 2026-10-17 03:18
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('create_join_class', '0009_listing_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReadingSummary',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('seconds', models.PositiveIntegerField(default=0)),
+                ('events', models.PositiveIntegerField(default=0)),
+                ('last_read', models.DateTimeField(null=True)),
+                ('material', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='reading_summaries', to='create_join_class.readingmaterial')),
+                ('student', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='reading_summaries', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='readingsummary',
+            index=models.Index(fields=['material', 'day'], name='create_join_materia_3e85f2_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='readingsummary',
+            constraint=models.UniqueConstraint(fields=('material', 'student', 'day'), name='unique_reading_summary'),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 3.2.25 on 2026-10-17 03:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('create_join_class', '0010_reading_summaries'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='classroom',
+            name='deleted',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='processingjob',
+            name='target',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='readingmaterial',
+            name='deleted',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
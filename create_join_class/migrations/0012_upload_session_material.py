@@ -0,0 +1,19 @@
+# Generated by Django 3.2.25 on 2026-10-17 03:18
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('create_join_class', '0011_soft_delete'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='uploadsession',
+            name='material',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='create_join_class.readingmaterial'),
+        ),
+    ]
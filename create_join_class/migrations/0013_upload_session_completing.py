@@ -0,0 +1,18 @@
+# Generated by Django 3.2.25 on 2026-10-17 03:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('create_join_class', '0012_upload_session_material'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='uploadsession',
+            name='completing',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
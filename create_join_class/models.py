@@ -1,13 +1,28 @@
-from django.db import models
+import hashlib
+import os
+import uuid
+
+from django.db import models, transaction
+from django.db.models import F
 from django.contrib.auth.models import User
+from django.utils import timezone
+from . import page_assets
 from .validators import validate_file_extension, validate_image_extension
 from private_storage.fields import PrivateFileField
+from private_storage.storage import private_storage
 from django.conf import settings
 from django.core.files.storage import FileSystemStorage
-from django.db.models.signals import pre_delete
+from django.db.models.signals import post_save, pre_delete
 from django.dispatch.dispatcher import receiver
 
 
+# This manager leaves out the rows marked as deleted. They stay in the table until the background job removing
+# them has run (see deletion); all_objects still includes them.
+class ActiveManager(models.Manager):
+    def get_queryset(self):
+        return super().get_queryset().filter(deleted=None)
+
+
 # This class is for all classrooms that are going to be created. Each classroom has a name, section, code,
 # one teacher and zero to many students.
 class ClassRoom(models.Model):
@@ -16,11 +31,76 @@ class ClassRoom(models.Model):
     classCode = models.CharField(max_length=6, null=True, blank=True, unique=True)
     teacher = models.ForeignKey(User, on_delete=models.CASCADE, related_name='teacher_of_the_class')
     students = models.ManyToManyField(User, blank=True, related_name='student_of_the_class')
+    # When the classroom was deleted, until a background job removes it for good.
+    deleted = models.DateTimeField(null=True, blank=True)
+
+    objects = ActiveManager()
+    all_objects = models.Manager()
 
     def __str__(self):
         return self.name + '.' + str(self.section) + ' ID:' + str(self.id)
 
 
+# This class is for every distinct file uploaded as reading material. Files are stored once under the SHA-256
+# digest of their content, so the same PDF uploaded to several classrooms takes up disk space once and is served
+# with the same ETag. Each stored file counts the reading materials pointing to it and is removed with the last one.
+class StoredFile(models.Model):
+    digest = models.CharField(max_length=64, unique=True)
+    name = models.CharField(max_length=255)
+    size = models.PositiveBigIntegerField()
+    references = models.PositiveIntegerField(default=0)
+
+    BLOB_DIR = 'uploads/blobs/'
+
+    def __str__(self):
+        return self.digest
+
+    @classmethod
+    def blob_name(cls, digest, extension):
+        return cls.BLOB_DIR + digest[:2] + '/' + digest + extension
+
+    # This method stores the content of an uploaded or opened file, unless a file with the same content is
+    # already stored, and adds a reference to it. The digest computed by the upload handlers is used when present.
+    @classmethod
+    def store(cls, file):
+        digest = getattr(file, 'sha256', None) or hash_file(file)
+        extension = os.path.splitext(file.name)[1].lower()
+        with transaction.atomic():
+            blob, created = cls.objects.get_or_create(
+                digest=digest, defaults={'name': cls.blob_name(digest, extension), 'size': file.size})
+            if not private_storage.exists(blob.name):
+                file.seek(0)
+                private_storage.save(blob.name, file)
+            cls.objects.filter(pk=blob.pk).update(references=F('references') + 1)
+        blob.refresh_from_db()
+        return blob
+
+    # This method drops a reference to the stored file. When it was the last one, the row and, once the
+    # transaction is committed, the file on disk are removed. It returns True if the file was removed. With
+    # delete_file False the file is left on disk for the caller to remove with delete_file().
+    def release(self, delete_file=True):
+        with transaction.atomic():
+            StoredFile.objects.filter(pk=self.pk).update(references=F('references') - 1)
+            deleted, _ = StoredFile.objects.filter(pk=self.pk, references=0).delete()
+            if deleted and delete_file:
+                transaction.on_commit(self.delete_file)
+        return bool(deleted)
+
+    def delete_file(self):
+        # The same content may have been uploaded again in the meantime.
+        if not StoredFile.objects.filter(digest=self.digest).exists():
+            private_storage.delete(self.name)
+            page_assets.remove(self.digest)
+
+
+def hash_file(file):
+    hasher = hashlib.sha256()
+    file.seek(0)
+    for chunk in file.chunks():
+        hasher.update(chunk)
+    return hasher.hexdigest()
+
+
 # This class is for all the reading materials that any teacher is going to upload. Each reading material object
 # has a name, file along with which classroom it belongs to and who uploaded the reading material.
 class ReadingMaterial(models.Model):
@@ -28,13 +108,136 @@ class ReadingMaterial(models.Model):
     classroom = models.ForeignKey(ClassRoom, on_delete=models.CASCADE, related_name='classroom')
     readingFile = PrivateFileField(upload_to='uploads/ReadingMaterial/', validators=[validate_file_extension])
     uploader = models.ForeignKey(User, on_delete=models.CASCADE, related_name='uploader')
+    blob = models.ForeignKey(StoredFile, on_delete=models.PROTECT, null=True, blank=True, related_name='materials')
+    # Filled in by the process_pdf background job (see pdf_processing).
+    page_count = models.PositiveIntegerField(null=True, blank=True)
+    thumbnail = PrivateFileField(upload_to='thumbnails/', null=True, blank=True)
+    # When the material was deleted, until a background job removes it for good.
+    deleted = models.DateTimeField(null=True, blank=True)
+
+    objects = ActiveManager()
+    all_objects = models.Manager()
+
+    class Meta:
+        # The teacher's material listing filters on both columns.
+        indexes = [
+            models.Index(fields=['classroom', 'uploader']),
+        ]
 
     def __str__(self):
         return self.name
 
-    def delete(self, *args, **kwargs):
-        self.readingFile.delete()  # delete instance path
-        super().delete(*args, **kwargs)  # Call the "real" delete() method.
+    def save(self, *args, **kwargs):
+        # A newly uploaded file is stored by content instead of under uploads/ReadingMaterial/.
+        replaced = None
+        if self.readingFile and not self.readingFile._committed:
+            replaced = self.blob
+            self.blob = StoredFile.store(self.readingFile.file)
+            self.readingFile = self.blob.name
+        super().save(*args, **kwargs)
+        if replaced is not None:
+            replaced.release()
+
+    # The files of a deleted reading material are removed by deletion.material_deleted, which also runs when the
+    # material is deleted along with its classroom or by a queryset.
+
+
+# This class is for a reading material that is being uploaded in chunks. The chunks received so far are kept in a
+# part file on disk (see chunked_uploads), so an interrupted upload can continue from the last received byte.
+# The reading material is created once all the bytes are in.
+class UploadSession(models.Model):
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    classroom = models.ForeignKey(ClassRoom, on_delete=models.CASCADE, related_name='upload_sessions')
+    uploader = models.ForeignKey(User, on_delete=models.CASCADE, related_name='upload_sessions')
+    name = models.CharField(max_length=100)
+    filename = models.CharField(max_length=255)
+    size = models.PositiveBigIntegerField()
+    received = models.PositiveBigIntegerField(default=0)
+    # The reading material created once the upload was complete. The completed upload is kept for a while, so a
+    # last chunk sent again because its response was lost gets the same answer.
+    material = models.ForeignKey(ReadingMaterial, null=True, blank=True, on_delete=models.SET_NULL, related_name='+')
+    # When the request that received the last byte started creating the material. Until the material exists, other
+    # requests are told to wait (see chunked_uploads.write_chunk).
+    completing = models.DateTimeField(null=True, blank=True)
+    created = models.DateTimeField(auto_now_add=True)
+    updated = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return self.filename + ' ' + str(self.received) + '/' + str(self.size)
+
+    def part_path(self):
+        return os.path.join(settings.CHUNKED_UPLOAD_ROOT, self.id.hex + '.part')
+
+
+# This class holds how long one student has looked at each page of a reading material. Instead of one row per
+# page view, the time is kept as a packed array of little-endian uint32 seconds indexed by page number - 1
+# (see page_dwell), so 300 pages take 1.2 kB per student and the times of a whole class load with one query.
+class PageDwell(models.Model):
+    material = models.ForeignKey(ReadingMaterial, on_delete=models.CASCADE, related_name='page_dwells')
+    student = models.ForeignKey(User, on_delete=models.CASCADE, related_name='page_dwells')
+    seconds = models.BinaryField(default=bytes)
+    updated = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['material', 'student'], name='unique_material_student_page_dwell'),
+        ]
+
+    def __str__(self):
+        return str(self.material_id) + ' ' + str(self.student_id) + ': ' + str(len(self.seconds) // 4) + ' pages'
+
+
+# This class is for the text of one page of a reading material, as extracted by the process_pdf job.
+class MaterialPageText(models.Model):
+    material = models.ForeignKey(ReadingMaterial, on_delete=models.CASCADE, related_name='page_texts')
+    page = models.PositiveIntegerField()
+    text = models.TextField(blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['material', 'page'], name='unique_material_page_text'),
+        ]
+
+    def __str__(self):
+        return str(self.material_id) + ' page ' + str(self.page)
+
+
+# This class is for work that is done in the background by the run_jobs command instead of during a request,
+# such as processing an uploaded pdf. A failed job is tried again later, up to max_attempts times.
+class ProcessingJob(models.Model):
+    PENDING = 'pending'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUSES = [
+        (PENDING, 'Pending'),
+        (RUNNING, 'Running'),
+        (DONE, 'Done'),
+        (FAILED, 'Failed'),
+    ]
+
+    kind = models.CharField(max_length=30)
+    material = models.ForeignKey(ReadingMaterial, on_delete=models.CASCADE, null=True, blank=True,
+                                 related_name='jobs')
+    # The id of the classroom or reading material a deletion job removes. It is not a foreign key, so the job is
+    # kept when the object is gone.
+    target = models.PositiveIntegerField(null=True, blank=True)
+    status = models.CharField(max_length=10, choices=STATUSES, default=PENDING)
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=5)
+    last_error = models.TextField(blank=True)
+    run_after = models.DateTimeField(default=timezone.now)
+    started = models.DateTimeField(null=True, blank=True)
+    created = models.DateTimeField(auto_now_add=True)
+    updated = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'run_after']),
+        ]
+
+    def __str__(self):
+        return self.kind + ' ' + str(self.material_id) + ': ' + self.status
 
 
 # This class is for the reading info of all the reading materials created. Each reading info object will contain
@@ -48,4 +251,91 @@ class ReadingInfo(models.Model):
         return str(self.material_id)
 
 
+# This class is for every reading time update sent by a student's viewer. Rows are only ever appended, so
+# concurrent students never contend for the same row. Each reading event holds the material, the student,
+# the viewer session that sent it, the seconds read since the previous update and when it was received.
+# Batched updates also carry the sequence number the viewer gave the entry, so a resent batch is not counted
+# twice. Per-material totals are derived from these rows (see reading_events.material_totals).
+class ReadingEvent(models.Model):
+    material = models.ForeignKey(ReadingMaterial, on_delete=models.CASCADE, related_name='reading_events')
+    student = models.ForeignKey(User, on_delete=models.CASCADE, related_name='reading_events')
+    session = models.CharField(max_length=32, blank=True)
+    sequence = models.PositiveIntegerField(null=True, blank=True)
+    seconds = models.PositiveIntegerField()
+    timestamp = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['material', 'student']),
+            models.Index(fields=['material', 'timestamp']),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['student', 'session', 'sequence'], name='unique_reading_event_sequence'),
+        ]
+
+    def __str__(self):
+        return str(self.material_id) + ' ' + str(self.student_id) + ': ' + str(self.seconds) + 's'
+
+
+# This class holds the total reading time of one student on one reading material. It is kept up to date as reading
+# events are written (see rollups.apply), so the report of a material never has to add up the raw events.
+class MaterialStudentRollup(models.Model):
+    material = models.ForeignKey(ReadingMaterial, on_delete=models.CASCADE, related_name='student_rollups')
+    student = models.ForeignKey(User, on_delete=models.CASCADE, related_name='reading_rollups')
+    seconds = models.PositiveIntegerField(default=0)
+    last_read = models.DateTimeField(null=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['material', 'student'], name='unique_material_student_rollup'),
+        ]
+
+    def __str__(self):
+        return str(self.material_id) + ' ' + str(self.student_id) + ': ' + str(self.seconds) + 's'
+
+
+# This class holds the reading time all students spent on one reading material on one day.
+class MaterialDailyRollup(models.Model):
+    material = models.ForeignKey(ReadingMaterial, on_delete=models.CASCADE, related_name='daily_rollups')
+    day = models.DateField()
+    seconds = models.PositiveIntegerField(default=0)
+    events = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['material', 'day'], name='unique_material_daily_rollup'),
+        ]
+
+    def __str__(self):
+        return str(self.material_id) + ' ' + str(self.day) + ': ' + str(self.seconds) + 's'
+
+
+# This class holds the reading time of one student on one reading material on one day, for days whose reading
+# events were compacted (see retention). The raw events of those days are kept in compressed archive files.
+class ReadingSummary(models.Model):
+    material = models.ForeignKey(ReadingMaterial, on_delete=models.CASCADE, related_name='reading_summaries')
+    student = models.ForeignKey(User, on_delete=models.CASCADE, related_name='reading_summaries')
+    day = models.DateField()
+    seconds = models.PositiveIntegerField(default=0)
+    events = models.PositiveIntegerField(default=0)
+    last_read = models.DateTimeField(null=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['material', 'student', 'day'], name='unique_reading_summary'),
+        ]
+        indexes = [
+            models.Index(fields=['material', 'day']),
+        ]
+
+    def __str__(self):
+        return str(self.material_id) + ' ' + str(self.student_id) + ' ' + str(self.day) + ': ' + str(self.seconds) + 's'
+
 
+# A newly created reading material is processed in the background: its page count, thumbnail and text are
+# extracted and its pages rendered by the run_jobs command, so the upload request returns straight away.
+@receiver(post_save, sender=ReadingMaterial)
+def queue_pdf_processing(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        ProcessingJob.objects.bulk_create([ProcessingJob(kind='process_pdf', material=instance),
+                                           ProcessingJob(kind='render_pages', material=instance)])
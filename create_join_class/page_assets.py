@@ -0,0 +1,60 @@
+import json
+import os
+import shutil
+
+from django.conf import settings
+
+# The directory the rendered pages of the reading materials are kept in, one directory per stored file.
+ROOT = getattr(settings, 'PAGE_ASSET_ROOT', os.path.join(settings.BASE_DIR, 'media/pages/'))
+# The width in pixels pages are rendered at; the height follows from the page size.
+IMAGE_WIDTH = getattr(settings, 'PAGE_IMAGE_WIDTH', 1200)
+IMAGE_QUALITY = getattr(settings, 'PAGE_IMAGE_QUALITY', 80)
+CONTENT_TYPE = 'image/jpeg'
+
+
+# This method returns the name the rendered pages of a reading material are kept under. Pages are rendered once per
+# stored file, so reading materials with the same content share them, and a replaced file gets new pages under a
+# new key. The key is part of the page URLs, which lets browsers keep the pages for good.
+def key(material):
+    if material.blob_id is not None:
+        return material.blob.digest
+    return 'material-%d' % material.pk
+
+
+def _directory(asset_key):
+    return os.path.join(ROOT, asset_key[:2], asset_key)
+
+
+def page_path(asset_key, page):
+    return os.path.join(_directory(asset_key), '%d.jpg' % page)
+
+
+# These methods write a rendered page and, once all pages are written, the manifest listing their sizes. Files are
+# written under a temporary name and renamed, so a page is never served half written.
+def write_page(asset_key, page, data):
+    _write(page_path(asset_key, page), data)
+
+
+def write_manifest(asset_key, sizes):
+    _write(os.path.join(_directory(asset_key), 'manifest.json'), json.dumps({'sizes': sizes}).encode())
+
+
+def _write(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temporary = '%s.%d.tmp' % (path, os.getpid())
+    with open(temporary, 'wb') as file:
+        file.write(data)
+    os.replace(temporary, path)
+
+
+# This method returns the [width, height] of every rendered page, or None when the pages are not rendered yet.
+def manifest(asset_key):
+    try:
+        with open(os.path.join(_directory(asset_key), 'manifest.json')) as file:
+            return json.load(file)['sizes']
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+def remove(asset_key):
+    shutil.rmtree(_directory(asset_key), ignore_errors=True)
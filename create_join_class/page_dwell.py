@@ -0,0 +1,69 @@
+from collections import defaultdict
+
+import numpy as np
+from django.conf import settings
+from django.utils import timezone
+
+from .models import PageDwell
+from .rollups import increment_rows
+
+# Page times are stored as little-endian uint32 seconds, whatever the byte order of the server.
+DTYPE = np.dtype('<u4')
+# The highest page number a viewer may report time for.
+MAX_PAGES = getattr(settings, 'PAGE_DWELL_MAX_PAGES', 5000)
+
+
+def unpack(data, pages=0):
+    array = np.frombuffer(bytes(data), dtype=DTYPE)
+    if len(array) < pages:
+        array = np.concatenate([array, np.zeros(pages - len(array), dtype=DTYPE)])
+    return array
+
+
+def pack(array):
+    return np.minimum(array, np.iinfo(DTYPE).max).astype(DTYPE).tobytes()
+
+
+# This method adds the page times carried by newly written reading events (event.pages, a list of [page, seconds]
+# pairs) to the page dwell rows of their students. The pairs of each student are summed with one bincount and
+# added to the stored array in one vectorized operation, and all rows are saved with one bulk update.
+def merge(events):
+    pairs = defaultdict(list)
+    for event in events:
+        if getattr(event, 'pages', None):
+            pairs[(event.material_id, event.student_id)].extend(event.pages)
+
+    deltas = {}
+    for key, key_pairs in pairs.items():
+        pages, seconds = np.asarray(key_pairs, dtype=np.int64).T
+        deltas[key] = np.bincount(pages - 1, weights=seconds).astype(np.uint64)
+    increment_rows(PageDwell, 'student_id', deltas, ['seconds', 'updated'], _add_page_times)
+
+
+def _add_page_times(row, delta):
+    current = unpack(row.seconds, len(delta)).astype(np.uint64)
+    current[:len(delta)] += delta
+    row.seconds = pack(current)
+    row.updated = timezone.now()
+
+
+# This method returns the total seconds and the number of students for every page of a material, as two arrays
+# indexed by page number - 1. All page dwell rows of the material are loaded with one query and summed as a matrix.
+def heatmap(material_id, pages=0):
+    rows = [bytes(data) for data in PageDwell.objects.filter(material_id=material_id).values_list('seconds',
+                                                                                                  flat=True)]
+    width = max([pages] + [len(data) // DTYPE.itemsize for data in rows])
+    if not rows or not width:
+        return np.zeros(width, dtype=np.uint64), np.zeros(width, dtype=np.int64)
+    matrix = np.frombuffer(b''.join(data.ljust(width * DTYPE.itemsize, b'\0') for data in rows),
+                           dtype=DTYPE).reshape(len(rows), width)
+    return matrix.sum(axis=0, dtype=np.uint64), np.count_nonzero(matrix, axis=0)
+
+
+# This method returns the heatmap of a material as a list of pages for the reading info page.
+def heatmap_rows(material):
+    seconds, readers = heatmap(material.pk, material.page_count or 0)
+    most = int(seconds.max()) if len(seconds) else 0
+    return [{'page': page + 1, 'seconds': int(seconds[page]), 'readers': int(readers[page]),
+             'percent': 100 * int(seconds[page]) // most if most else 0}
+            for page in range(len(seconds))]
@@ -0,0 +1,73 @@
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.core.files.base import ContentFile
+from django.db import transaction
+
+from . import page_assets
+from .models import MaterialPageText
+
+# PyMuPDF is only needed by the process running the background jobs.
+try:
+    import pymupdf as fitz
+except ImportError:
+    try:
+        import fitz
+    except ImportError:
+        fitz = None
+
+THUMBNAIL_WIDTH = getattr(settings, 'THUMBNAIL_WIDTH', 200)
+
+
+def open_document(material):
+    if fitz is None:
+        raise ImproperlyConfigured('Processing pdf files needs PyMuPDF. Install it with "pip install PyMuPDF".')
+    return fitz.open(material.readingFile.path)
+
+
+# This method is the process_pdf job. It stores the page count, a thumbnail of the first page and the text of
+# every page of a reading material. Running it again replaces what an earlier run stored.
+def process_material(material):
+    document = open_document(material)
+    try:
+        page_count = document.page_count
+        pages = [MaterialPageText(material=material, page=number + 1, text=page.get_text().replace('\x00', ''))
+                 for number, page in enumerate(document)]
+        thumbnail = render_thumbnail(document[0]) if page_count else None
+    finally:
+        document.close()
+
+    with transaction.atomic():
+        MaterialPageText.objects.filter(material=material).delete()
+        MaterialPageText.objects.bulk_create(pages, batch_size=500)
+        if thumbnail is not None:
+            if material.thumbnail:
+                material.thumbnail.delete(save=False)
+            material.thumbnail.save('%d.png' % material.pk, ContentFile(thumbnail), save=False)
+        material.page_count = page_count
+        material.save(update_fields=['page_count', 'thumbnail'])
+
+
+# This method returns a PNG of the page, THUMBNAIL_WIDTH pixels wide.
+def render_thumbnail(page):
+    zoom = THUMBNAIL_WIDTH / page.rect.width
+    return page.get_pixmap(matrix=fitz.Matrix(zoom, zoom)).tobytes('png')
+
+
+# This method is the render_pages job. It renders every page of a reading material to a JPEG image, one page at
+# a time, so the viewer can show the first page without downloading the whole file (see page_assets). Reading
+# materials with the same content are only rendered once.
+def render_pages(material):
+    asset_key = page_assets.key(material)
+    if page_assets.manifest(asset_key) is not None:
+        return
+    document = open_document(material)
+    try:
+        sizes = []
+        for number, page in enumerate(document, 1):
+            zoom = page_assets.IMAGE_WIDTH / page.rect.width
+            pixmap = page.get_pixmap(matrix=fitz.Matrix(zoom, zoom))
+            page_assets.write_page(asset_key, number, pixmap.tobytes('jpg', jpg_quality=page_assets.IMAGE_QUALITY))
+            sizes.append([pixmap.width, pixmap.height])
+    finally:
+        document.close()
+    page_assets.write_manifest(asset_key, sizes)
@@ -0,0 +1,39 @@
+import hashlib
+import os
+import urllib.request
+
+from django.contrib.staticfiles import finders
+
+# The pdf.js build the pdf viewer uses (see static/create_join_class/js/page_viewer.js). It is served with the
+# other static files rather than from a CDN, so no script from another site runs on pages holding the CSRF token.
+VERSION = '2.10.377'
+SCRIPT = 'create_join_class/js/pdfjs/pdf.min.js'
+WORKER = 'create_join_class/js/pdfjs/pdf.worker.min.js'
+DOWNLOAD_URL = 'https://cdn.jsdelivr.net/npm/pdfjs-dist@%s/build/%s'
+
+_vendored = None
+
+
+# This method returns whether the pdf.js files are in the static files. Without them the viewer shows the pdf
+# with the browser's own viewer instead.
+def vendored():
+    global _vendored
+    if _vendored is None:
+        _vendored = all(finders.find(path) for path in (SCRIPT, WORKER))
+    return _vendored
+
+
+# This method downloads the pdf.js files of VERSION into the static files of create_join_class, to be committed
+# with them. It returns the path and the sha384 digest of every file, to check against the published build.
+def download():
+    static_root = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static')
+    downloaded = []
+    for path in (SCRIPT, WORKER):
+        with urllib.request.urlopen(DOWNLOAD_URL % (VERSION, os.path.basename(path)), timeout=60) as response:
+            data = response.read()
+        target = os.path.join(static_root, path)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        with open(target, 'wb') as file:
+            file.write(data)
+        downloaded.append((target, hashlib.sha384(data).hexdigest()))
+    return downloaded
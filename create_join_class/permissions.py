@@ -0,0 +1,21 @@
+from django.db.models import Q
+
+from . import memberships
+from .models import ReadingMaterial
+
+
+# This method is the private_storage permission check of the site (see the PRIVATE_STORAGE_AUTH_FUNCTION setting).
+# A private file is served to the teacher and the students of a classroom with a reading material stored in it,
+# either its PDF or its thumbnail. Files are stored by content, so one file may belong to materials of several
+# classrooms; being in any of them is enough. Files of no material, such as the ones of deleted materials, are not
+# served to anyone.
+def allow_classroom_members(private_file):
+    user = private_file.request.user
+    if not user.is_authenticated:
+        return False
+    classroom_ids = set(ReadingMaterial.objects.filter(
+        Q(readingFile=private_file.relative_name) | Q(thumbnail=private_file.relative_name)
+    ).values_list('classroom_id', flat=True))
+    return any(memberships.created_classroom(user.id, classroom_id) is not None
+               or memberships.joined_classroom(user.id, classroom_id) is not None
+               for classroom_id in classroom_ids)
@@ -0,0 +1,69 @@
+import cProfile
+import os
+import random
+import re
+import threading
+
+from django.conf import settings
+from django.utils import timezone
+from django.utils.crypto import constant_time_compare
+
+# The directory the profiles are written to, one cProfile stats file per profiled request. They can be read with
+# pstats, or turned into a flame graph with snakeviz or flameprof.
+ROOT = getattr(settings, 'PROFILE_ROOT', os.path.join(settings.BASE_DIR, 'profiles/'))
+# The share of requests profiled, from 0 (none, the default) to 1 (all of them).
+SAMPLE_RATE = getattr(settings, 'PROFILE_SAMPLE_RATE', 0.0)
+# Sampled requests are only written when they took at least this many seconds.
+SLOW_SECONDS = getattr(settings, 'PROFILE_SLOW_SECONDS', 0.5)
+# A request sent with the header X-Profile: <METRICS_TOKEN> is always profiled and written, whatever its time.
+TOKEN = getattr(settings, 'METRICS_TOKEN', None)
+
+# The profile running in this thread. Only one request is profiled at a time per thread: in an async process all
+# the requests share the event loop thread, and the profile of a request would count the others too.
+_running = threading.local()
+
+
+def requested(request):
+    token = request.META.get('HTTP_X_PROFILE')
+    return bool(TOKEN and token and constant_time_compare(token, TOKEN))
+
+
+# This method starts profiling a request when it was requested or is sampled. It returns what stop needs, or
+# None when the request is not profiled. Async requests are profiled on the event loop thread, so code they run in
+# other threads, such as database queries, shows up as time spent waiting.
+def start(request):
+    forced = requested(request)
+    if not forced and (SAMPLE_RATE <= 0 or random.random() >= SAMPLE_RATE):
+        return None
+    if getattr(_running, 'profile', None) is not None:
+        return None
+    profile = cProfile.Profile()
+    try:
+        profile.enable()
+    except ValueError:
+        # Another profiler is already running.
+        return None
+    _running.profile = profile
+    return profile, forced
+
+
+# This method stops the profile of a request and writes it to ROOT when it was requested or the request was slow.
+# A requested profile is named in the X-Profile-File header of the response.
+def stop(sample, request, response, route, seconds):
+    profile, forced = sample
+    cancel(sample)
+    if not forced and seconds < SLOW_SECONDS:
+        return None
+    name = '%s-%s-%s-%dms.prof' % (timezone.now().strftime('%Y%m%dT%H%M%S%f'), request.method,
+                                   re.sub(r'\W+', '_', route).strip('_') or 'root', seconds * 1000)
+    os.makedirs(ROOT, exist_ok=True)
+    profile.dump_stats(os.path.join(ROOT, name))
+    if forced:
+        response['X-Profile-File'] = name
+    return name
+
+
+# This method stops the profile of a request without writing it, when the request failed.
+def cancel(sample):
+    sample[0].disable()
+    _running.profile = None
@@ -0,0 +1,178 @@
+import csv
+import io
+import json
+import secrets
+
+from django.contrib.auth.models import User
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError, transaction
+
+from . import listing_cache, memberships
+from .models import ClassRoom
+
+# The most values put in one IN (...) lookup, below the variable limit of every supported database.
+LOOKUP_BATCH = 500
+# The number of rows written by one INSERT.
+INSERT_BATCH = 1000
+# How many times a provisioning is retried when a class code was taken by another request in the meantime.
+CODE_RETRIES = 3
+
+
+# This method returns count class codes that are neither in use nor repeated. Codes are drawn in batches and
+# checked against the database with one query per batch.
+def allocate_codes(count):
+    codes = set()
+    while len(codes) < count:
+        candidates = {secrets.token_hex(3).upper() for _ in range(count - len(codes))} - codes
+        for chunk in _chunks(candidates, LOOKUP_BATCH):
+            candidates -= set(ClassRoom.all_objects.filter(classCode__in=chunk).values_list('classCode', flat=True))
+        codes |= candidates
+    return list(codes)
+
+
+# This method reads a roster. A CSV roster has a header and one row per enrollment, with the columns name,
+# section, teacher (a username), student (a username, may be empty) and optionally classCode. A JSON roster is
+# a list of classes, each an object with name, section, teacher, students (a list of usernames) and optionally
+# classCode. Rows of the same class are merged. It returns a dict from (teacher, name, section) to
+# {'code': ..., 'students': set of usernames}.
+def parse_roster(data, roster_format):
+    try:
+        if roster_format == 'csv':
+            rows = [dict(row, students=[row.get('student')]) for row in csv.DictReader(io.StringIO(data))]
+        elif roster_format == 'json':
+            rows = json.loads(data)
+        else:
+            raise ValidationError('Unsupported roster format.')
+        classes = {}
+        for row in rows:
+            key = (row['teacher'].strip(), row['name'].strip(), int(row['section']))
+            spec = classes.setdefault(key, {'code': None, 'students': set()})
+            spec['code'] = (row.get('classCode') or '').strip().upper() or spec['code']
+            spec['students'].update(username.strip() for username in row.get('students') or []
+                                    if username and username.strip())
+    except (KeyError, TypeError, ValueError, AttributeError) as error:
+        raise ValidationError('Bad roster: %s' % error)
+    if any(not teacher or not name for teacher, name, _ in classes):
+        raise ValidationError('Bad roster: every class needs a name and a teacher.')
+    codes = [spec['code'] for spec in classes.values() if spec['code']]
+    if len(codes) != len(set(codes)) or any(len(code) > 6 for code in codes):
+        raise ValidationError('Bad roster: class codes must be unique and at most 6 characters long.')
+    return classes
+
+
+def _chunks(values, size):
+    values = list(values)
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+
+def _user_ids(usernames, create_missing):
+    ids = {}
+    for chunk in _chunks(usernames, LOOKUP_BATCH):
+        ids.update(User.objects.filter(username__in=chunk).values_list('username', 'id'))
+    missing = set(usernames) - set(ids)
+    if create_missing and missing:
+        # The new accounts have no usable password; their owners set one with a password reset.
+        users = [User(username=username) for username in missing]
+        for user in users:
+            user.set_unusable_password()
+        User.objects.bulk_create(users, batch_size=INSERT_BATCH)
+        for chunk in _chunks(missing, LOOKUP_BATCH):
+            ids.update(User.objects.filter(username__in=chunk).values_list('username', 'id'))
+        missing = set()
+    return ids, missing
+
+
+# This method creates the classrooms of a parsed roster and enrolls their students, all in one transaction.
+# A class that already exists (same class code, or same teacher, name and section) gets the new students only.
+# Classrooms and enrollments are inserted with bulk_create, so the number of queries grows with the number of
+# batches rather than with the number of rows. Classes of unknown teachers and unknown students are skipped
+# unless create_missing is set, in which case their accounts are created. Classes whose code belongs to a deleted
+# classroom or to another teacher are skipped and reported as code conflicts.
+def provision(classes, create_missing=False):
+    for attempt in range(CODE_RETRIES):
+        try:
+            with transaction.atomic():
+                return _provision(classes, create_missing)
+        except IntegrityError:
+            # A class code was taken by a classroom created at the same time; try again with new codes.
+            if attempt == CODE_RETRIES - 1:
+                raise
+
+
+def _provision(classes, create_missing):
+    usernames = {teacher for teacher, _, _ in classes}
+    for spec in classes.values():
+        usernames |= spec['students']
+    user_ids, unknown = _user_ids(usernames, create_missing)
+    classes = {key: spec for key, spec in classes.items() if key[0] in user_ids}
+
+    # Classes already in the database, found by their code or by teacher, name and section. Codes are looked up
+    # among the deleted classrooms too, since they keep their code. A code of a deleted classroom or of another
+    # teacher's classroom is a conflict: its class is skipped and reported, rather than failing on the unique code
+    # or enrolling the students into someone else's class.
+    by_code = {}
+    for chunk in _chunks([spec['code'] for spec in classes.values() if spec['code']], LOOKUP_BATCH):
+        by_code.update((code, (pk, teacher_id, deleted)) for code, pk, teacher_id, deleted in (
+            ClassRoom.all_objects.filter(classCode__in=chunk).values_list('classCode', 'pk', 'teacher_id', 'deleted')))
+    conflicts = []
+    for (teacher, name, section), spec in list(classes.items()):
+        if spec['code'] not in by_code:
+            continue
+        pk, teacher_id, deleted = by_code[spec['code']]
+        if deleted is None and teacher_id == user_ids[teacher]:
+            continue
+        conflicts.append({'name': name, 'section': section, 'teacher': teacher, 'classCode': spec['code'],
+                          'reason': 'deleted classroom' if deleted is not None else 'classroom of another teacher'})
+        del classes[(teacher, name, section)]
+    by_name = {}
+    for chunk in _chunks({user_ids[teacher] for teacher, _, _ in classes}, LOOKUP_BATCH):
+        for teacher_id, name, section, pk in (ClassRoom.objects.filter(teacher_id__in=chunk)
+                                              .values_list('teacher_id', 'name', 'section', 'pk')):
+            by_name.setdefault((teacher_id, name, section), pk)
+    existing = {}
+    for (teacher, name, section), spec in classes.items():
+        pk = by_code[spec['code']][0] if spec['code'] in by_code else by_name.get((user_ids[teacher], name, section))
+        if pk is not None:
+            existing[(teacher, name, section)] = pk
+
+    new_keys = [key for key in classes if key not in existing]
+    codes = iter(allocate_codes(len([key for key in new_keys if not classes[key]['code']])))
+    new_classrooms = [ClassRoom(name=name, section=section, teacher_id=user_ids[teacher],
+                                classCode=classes[(teacher, name, section)]['code'] or next(codes))
+                      for teacher, name, section in new_keys]
+    ClassRoom.objects.bulk_create(new_classrooms, batch_size=INSERT_BATCH)
+    # Not every database returns the ids of bulk inserted rows, so they are read back by their unique code.
+    created = {}
+    for chunk in _chunks([classroom.classCode for classroom in new_classrooms], LOOKUP_BATCH):
+        created.update(ClassRoom.objects.filter(classCode__in=chunk).values_list('classCode', 'pk'))
+    classroom_ids = dict(existing)
+    for key, classroom in zip(new_keys, new_classrooms):
+        classroom_ids[key] = created[classroom.classCode]
+
+    Enrollment = ClassRoom.students.through
+    pairs = {(classroom_ids[key], user_ids[username])
+             for key, spec in classes.items() for username in spec['students']
+             if username in user_ids and username != key[0]}
+    enrolled = set()
+    for chunk in _chunks({classroom_id for classroom_id, _ in pairs}, LOOKUP_BATCH):
+        enrolled.update(Enrollment.objects.filter(classroom_id__in=chunk).values_list('classroom_id', 'user_id'))
+    new_pairs = pairs - enrolled
+    Enrollment.objects.bulk_create([Enrollment(classroom_id=classroom_id, user_id=user_id)
+                                    for classroom_id, user_id in new_pairs],
+                                   batch_size=INSERT_BATCH, ignore_conflicts=True)
+
+    # bulk_create sends no signals, so the cached memberships and listings are updated here.
+    memberships.invalidate({user_id for _, user_id in new_pairs} | {classroom.teacher_id
+                                                                    for classroom in new_classrooms})
+    listing_cache.bump({classroom_id for classroom_id, _ in new_pairs})
+    return {
+        'classes_created': len(new_classrooms),
+        'classes_existing': len(classes) - len(new_classrooms),
+        'enrollments_created': len(new_pairs),
+        'enrollments_existing': len(pairs) - len(new_pairs),
+        'unknown_users': sorted(unknown),
+        'code_conflicts': conflicts,
+        'classes': [{'name': name, 'section': section, 'teacher': teacher, 'classCode': classroom.classCode}
+                    for (teacher, name, section), classroom in zip(new_keys, new_classrooms)],
+    }
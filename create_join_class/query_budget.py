@@ -0,0 +1,149 @@
+import asyncio
+import functools
+import logging
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+
+logger = logging.getLogger(__name__)
+
+# Whether every response gets the X-Query-Count and X-Query-Time headers.
+QUERY_HEADERS = getattr(settings, 'QUERY_BUDGET_HEADERS', settings.DEBUG)
+
+
+# This class counts and times the database queries run while it is the current counter. It works with DEBUG off,
+# since it wraps the execution of the queries instead of reading connection.queries. Counters can be nested;
+# a query is counted by the current counter and all the counters around it. The SQL of the queries is only kept
+# by counters made with keep_statements, such as the ones of assert_max_queries and of requests while DEBUG is on.
+class QueryCounter:
+
+    def __init__(self, parent=None, keep_statements=False):
+        self.parent = parent
+        self.count = 0
+        self.seconds = 0.0
+        self.statements = [] if keep_statements else None
+
+    def record(self, sql, seconds):
+        self.seconds += seconds
+        self.count += 1
+        if self.statements is not None:
+            self.statements.append(sql)
+
+
+# The counter of the running request or with block. It is a context variable rather than a wrapper installed on
+# one connection, so queries are counted in whatever thread runs them: sync_to_async and ingest.run_db carry the
+# context over to their threads, which each have their own connection.
+_current_counter = ContextVar('query_counter', default=None)
+
+
+def _count_query(execute, sql, params, many, context):
+    counter = _current_counter.get()
+    if counter is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        elapsed = time.perf_counter() - start
+        while counter is not None:
+            counter.record(sql, elapsed)
+            counter = counter.parent
+
+
+def _install(connection, **kwargs):
+    if _count_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_count_query)
+
+
+connection_created.connect(_install)
+
+
+@contextmanager
+def count_queries(keep_statements=False):
+    # Connections opened before this module was imported did not get the wrapper yet.
+    for connection in connections.all():
+        _install(connection)
+    counter = QueryCounter(_current_counter.get(), keep_statements)
+    token = _current_counter.set(counter)
+    try:
+        yield counter
+    finally:
+        _current_counter.reset(token)
+
+
+# This method is for tests. It fails when the code inside the with block runs more than limit queries and lists
+# the queries that were run, for example:
+#     with assert_max_queries(5):
+#         client.get(url)
+@contextmanager
+def assert_max_queries(limit):
+    with count_queries(keep_statements=True) as counter:
+        yield counter
+    if counter.count > limit:
+        raise AssertionError('%d queries run, at most %d expected%s' % (counter.count, limit, _listing(counter)))
+
+
+def _listing(counter):
+    if not counter.statements:
+        return ''
+    return ':\n' + '\n'.join('%d. %s' % (number, sql) for number, sql in enumerate(counter.statements, 1))
+
+
+# This decorator sets the most queries a view should need, with cold caches. The view still runs when it needs
+# more, but the QueryCountMiddleware logs a warning.
+def query_budget(limit):
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(request, *args, **kwargs):
+            request.query_budget = limit
+            return view(request, *args, **kwargs)
+        wrapper.query_budget = limit
+        return wrapper
+    return decorator
+
+
+# This class is the middleware counting the queries of every request. The count and the time spent in the
+# database are added to the response as headers (see QUERY_HEADERS) and logged at debug level, along with a warning
+# when a view decorated with query_budget goes over its budget, listing the queries while DEBUG is on. Queries run
+# while a streaming response is sent are not counted. It works in sync and async middleware chains.
+class QueryCountMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if asyncio.iscoroutinefunction(get_response):
+            # Marks the middleware as a coroutine function, like Django's MiddlewareMixin does.
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+        start = time.perf_counter()
+        with count_queries(settings.DEBUG) as counter:
+            response = self.get_response(request)
+        return self._report(request, response, counter, time.perf_counter() - start)
+
+    async def __acall__(self, request):
+        start = time.perf_counter()
+        with count_queries(settings.DEBUG) as counter:
+            response = await self.get_response(request)
+        return self._report(request, response, counter, time.perf_counter() - start)
+
+    def _report(self, request, response, counter, elapsed):
+        # The counter is kept for the MetricsMiddleware.
+        request.query_counter = counter
+        if QUERY_HEADERS:
+            response['X-Query-Count'] = str(counter.count)
+            response['X-Query-Time'] = '%.1fms' % (counter.seconds * 1000)
+        logger.debug('%s %s: %d queries in %.1fms (%.1fms total)', request.method, request.path, counter.count,
+                     counter.seconds * 1000, elapsed * 1000)
+        budget = getattr(request, 'query_budget', None)
+        if budget is not None and counter.count > budget:
+            logger.warning('%s %s ran %d queries, over its budget of %d%s', request.method, request.path,
+                           counter.count, budget, _listing(counter))
+        return response
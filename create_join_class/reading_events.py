@@ -0,0 +1,150 @@
+import atexit
+import threading
+
+from django.conf import settings
+from django.db import connection, transaction
+
+from . import page_dwell, rollups
+from .models import ReadingEvent
+
+# A flush is triggered when this many reading events are waiting in the buffer, or when the oldest waiting
+# event is older than the flush interval (in seconds). A buffer size of 1 writes every event straight away.
+BUFFER_SIZE = getattr(settings, 'READING_EVENT_BUFFER_SIZE', 200)
+FLUSH_INTERVAL = getattr(settings, 'READING_EVENT_FLUSH_INTERVAL', 5)
+
+
+# This class is the write-behind buffer for reading events. Updates from the pdf viewers are collected in memory
+# and written with one bulk insert per batch, so the cost of a reading time update does not depend on how many
+# students are reading the same material.
+class ReadingEventBuffer:
+
+    def __init__(self, size=BUFFER_SIZE, interval=FLUSH_INTERVAL):
+        self.size = size
+        self.interval = interval
+        self._events = []
+        self._lock = threading.Lock()
+        self._timer = None
+
+    def add(self, material_id, student_id, seconds, session='', flush=True):
+        return self.add_many([ReadingEvent(material_id=material_id, student_id=student_id, seconds=seconds,
+                                           session=session)], flush)
+
+    # This method queues several events at once. They are always written by the same flush, so they are
+    # committed in the same transaction. When the buffer is full it is flushed right away, unless flush is False;
+    # the caller then gets True back and is expected to flush it soon, as the async views do (see ingest).
+    def add_many(self, events, flush=True):
+        with self._lock:
+            self._events.extend(events)
+            full = len(self._events) >= self.size
+            if not full and self._timer is None:
+                self._timer = threading.Timer(self.interval, self._flush_from_timer)
+                self._timer.daemon = True
+                self._timer.start()
+        if full and flush:
+            self.flush()
+        return full
+
+    # This method writes all buffered events to the database in one transaction and returns how many were written.
+    def flush(self):
+        with self._lock:
+            events, self._events = self._events, []
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+        events = _coalesce(_drop_resent(events))
+        if events:
+            with transaction.atomic():
+                ReadingEvent.objects.bulk_create(events, batch_size=max(self.size, 500), ignore_conflicts=True)
+                events = _inserted(events)
+                rollups.apply(events)
+                page_dwell.merge(events)
+        return len(events)
+
+    def _flush_from_timer(self):
+        try:
+            self.flush()
+        finally:
+            # The timer runs in its own thread, which gets its own database connection.
+            connection.close()
+
+    def __len__(self):
+        return len(self._events)
+
+
+buffer = ReadingEventBuffer()
+atexit.register(buffer.flush)
+
+
+# This method queues seconds read by a student on a material.
+def record(material_id, student_id, seconds, session='', flush=True):
+    return buffer.add(material_id, student_id, seconds, session, flush)
+
+
+# This method queues a batch of (material id, seconds, sequence number, pages) entries sent by one viewer session.
+# pages is None or a list of [page, seconds] pairs, which are merged into the page dwell of the student.
+def record_many(entries, student_id, session='', flush=True):
+    events = []
+    for material_id, seconds, sequence, pages in entries:
+        event = ReadingEvent(material_id=material_id, student_id=student_id, seconds=seconds,
+                             session=session, sequence=sequence)
+        event.pages = pages
+        events.append(event)
+    return buffer.add_many(events, flush)
+
+
+# This method merges the unnumbered events of the same student, material and viewer session waiting in one flush
+# into a single event, so frequent single updates do not add a row each. Numbered events are kept as they are,
+# since their sequence numbers are needed to recognise resent entries.
+def _coalesce(events):
+    kept = []
+    merged = {}
+    for event in events:
+        if event.sequence is not None:
+            kept.append(event)
+            continue
+        key = (event.material_id, event.student_id, event.session, event.timestamp.date())
+        if key in merged:
+            merged[key].seconds += event.seconds
+            merged[key].timestamp = max(merged[key].timestamp, event.timestamp)
+        else:
+            merged[key] = event
+            kept.append(event)
+    return kept
+
+
+# This method removes the entries a viewer sent again after a failed request, both within the batch and those
+# already written, so they are not inserted twice. Another process may be writing the same entries meanwhile,
+# so the events actually inserted are told apart again after the insert (see _inserted).
+def _drop_resent(events):
+    sequenced = [event for event in events if event.sequence is not None]
+    if not sequenced:
+        return events
+    seen = set(ReadingEvent.objects.filter(session__in={event.session for event in sequenced},
+                                           student_id__in={event.student_id for event in sequenced},
+                                           sequence__isnull=False)
+               .values_list('student_id', 'session', 'sequence'))
+    kept = []
+    for event in events:
+        if event.sequence is not None:
+            key = (event.student_id, event.session, event.sequence)
+            if key in seen:
+                continue
+            seen.add(key)
+        kept.append(event)
+    return kept
+
+
+# This method returns the events of a flush that were inserted, leaving out the numbered events whose sequence
+# number was written by another process flushing the same resent entries at the same time. Both copies of an entry
+# come from different requests, so the row inserted by this flush is the one with the timestamp of its own event.
+# Only those events are added to the rollups and page dwell.
+def _inserted(events):
+    sequenced = [event for event in events if event.sequence is not None]
+    if not sequenced:
+        return events
+    stored = set(ReadingEvent.objects.filter(session__in={event.session for event in sequenced},
+                                             student_id__in={event.student_id for event in sequenced},
+                                             sequence__in={event.sequence for event in sequenced})
+                 .values_list('student_id', 'session', 'sequence', 'timestamp'))
+    return [event for event in events if event.sequence is None
+            or (event.student_id, event.session, event.sequence, event.timestamp) in stored]
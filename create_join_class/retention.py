@@ -0,0 +1,103 @@
+import datetime
+import gzip
+import json
+import os
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from . import rollups
+from .models import ReadingEvent, ReadingSummary
+
+# Reading events older than this many days are compacted into daily summaries.
+RETENTION_DAYS = getattr(settings, 'READING_RETENTION_DAYS', 180)
+# The directory the compacted reading events are archived to, one gzipped NDJSON file per run.
+ARCHIVE_ROOT = getattr(settings, 'READING_ARCHIVE_ROOT', os.path.join(settings.BASE_DIR, 'media/archive/'))
+# Number of reading events compacted per transaction.
+BATCH_SIZE = 5000
+
+ARCHIVE_FIELDS = ['id', 'material_id', 'student_id', 'session', 'sequence', 'seconds', 'timestamp']
+
+
+# This method returns the time before which reading events are compacted: the start of the local day days ago,
+# so a day is always compacted as a whole.
+def cutoff(days=RETENTION_DAYS, now=None):
+    day = timezone.localtime(now).date() - datetime.timedelta(days=days)
+    return timezone.make_aware(datetime.datetime.combine(day, datetime.time.min))
+
+
+# This method moves the reading events older than before into ReadingSummary rows, one per material, student and
+# day, and deletes them. Every event is first written to a gzipped NDJSON file in archive_dir, and a batch is only
+# deleted once it is on disk. The totals of the reports and rollups do not change, since they add up the summaries
+# along with the events. It returns the number of events compacted and the path of the archive (None when there
+# was nothing to compact). With dry_run nothing is written or deleted, and only the count is returned.
+def compact(before, archive_dir=ARCHIVE_ROOT, batch_size=BATCH_SIZE, dry_run=False):
+    events = ReadingEvent.objects.filter(timestamp__lt=before)
+    if dry_run:
+        return events.count(), None
+
+    os.makedirs(archive_dir, exist_ok=True)
+    path = os.path.join(archive_dir, 'reading-events-%s-%s.ndjson.gz' % (
+        before.strftime('%Y%m%d'), timezone.now().strftime('%Y%m%dT%H%M%S%f')))
+    compacted = 0
+    last_pk = 0
+    with gzip.open(path, 'wt', encoding='utf-8') as archive:
+        while True:
+            batch = list(events.filter(pk__gt=last_pk).order_by('pk')[:batch_size])
+            if not batch:
+                break
+            for event in batch:
+                archive.write(json.dumps({field: getattr(event, field) for field in ARCHIVE_FIELDS},
+                                         cls=DjangoJSONEncoder) + '\n')
+            # The batch has to be on disk before its events are deleted.
+            archive.flush()
+            with transaction.atomic():
+                summarize(batch)
+                ReadingEvent.objects.filter(pk__in=[event.pk for event in batch]).delete()
+            compacted += len(batch)
+            last_pk = batch[-1].pk
+    if not compacted:
+        os.remove(path)
+        return 0, None
+    return compacted, path
+
+
+# This method adds reading events to the daily summaries, creating the missing ones.
+def summarize(events):
+    days = defaultdict(lambda: {'seconds': 0, 'events': 0, 'last_read': None})
+    for event in events:
+        day = days[(event.material_id, (event.student_id, timezone.localtime(event.timestamp).date()))]
+        day['seconds'] += event.seconds
+        day['events'] += 1
+        if day['last_read'] is None or event.timestamp > day['last_read']:
+            day['last_read'] = event.timestamp
+    rollups.increment_rows(ReadingSummary, ('student_id', 'day'), days, ['seconds', 'events', 'last_read'],
+                           _add_summary)
+
+
+def _add_summary(row, values):
+    row.seconds = F('seconds') + values['seconds']
+    row.events = F('events') + values['events']
+    if row.last_read is None or values['last_read'] > row.last_read:
+        row.last_read = values['last_read']
+
+
+# This method gives the space of the deleted reading events back to the database where that needs a command:
+# SQLite only shrinks its file with VACUUM, PostgreSQL reuses the space after VACUUM and MySQL after OPTIMIZE
+# TABLE. None of them can run inside a transaction. It returns False for other databases.
+def reclaim_space():
+    table = connection.ops.quote_name(ReadingEvent._meta.db_table)
+    statements = {
+        'sqlite': 'VACUUM',
+        'postgresql': 'VACUUM ANALYZE %s' % table,
+        'mysql': 'OPTIMIZE TABLE %s' % table,
+    }
+    if connection.vendor not in statements:
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute(statements[connection.vendor])
+    return True
@@ -0,0 +1,156 @@
+from collections import defaultdict
+from itertools import islice
+
+from django.db import transaction
+from django.db.models import Count, F, Max, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from . import analytics
+from .models import MaterialDailyRollup, MaterialStudentRollup, ReadingEvent, ReadingSummary
+
+BATCH_SIZE = 1000
+
+
+# This method adds newly written reading events to the rollups. Missing rollup rows are created empty first and
+# every row is then incremented inside the database, so flushes running at the same time in several workers all
+# add up. It takes a handful of queries per call, however many events are passed in.
+def apply(events):
+    students = defaultdict(lambda: {'seconds': 0, 'last_read': None})
+    days = defaultdict(lambda: {'seconds': 0, 'events': 0})
+    for event in events:
+        student = students[(event.material_id, event.student_id)]
+        student['seconds'] += event.seconds
+        if student['last_read'] is None or event.timestamp > student['last_read']:
+            student['last_read'] = event.timestamp
+        day = days[(event.material_id, timezone.localtime(event.timestamp).date())]
+        day['seconds'] += event.seconds
+        day['events'] += 1
+
+    increment_rows(MaterialStudentRollup, 'student_id', students, ['seconds', 'last_read'], _add_student_time)
+    increment_rows(MaterialDailyRollup, 'day', days, ['seconds', 'events'], _add_daily_time)
+    analytics.bump({material_id for material_id, student_id in students})
+
+
+def _add_student_time(row, values):
+    row.seconds = F('seconds') + values['seconds']
+    row.last_read = values['last_read']
+
+
+def _add_daily_time(row, values):
+    row.seconds = F('seconds') + values['seconds']
+    row.events = F('events') + values['events']
+
+
+# This method applies update to the row of model for every (material id, key) in deltas, creating missing rows
+# first, and saves fields of all the rows with one bulk update. key_field may also be a tuple of fields, the keys
+# then being tuples of their values.
+def increment_rows(model, key_field, deltas, fields, update):
+    if not deltas:
+        return
+    key_fields = key_field if isinstance(key_field, tuple) else (key_field,)
+    existing = _fetch(model, key_fields, deltas)
+    missing = [key for key in deltas if key not in existing]
+    if missing:
+        model.objects.bulk_create([model(material_id=material_id, **dict(zip(key_fields, _values(key_fields, key))))
+                                   for material_id, key in missing], ignore_conflicts=True)
+        existing = _fetch(model, key_fields, deltas)
+    for key, values in deltas.items():
+        update(existing[key], values)
+    model.objects.bulk_update(existing.values(), fields, batch_size=BATCH_SIZE)
+
+
+def _values(key_fields, key):
+    return key if len(key_fields) > 1 else (key,)
+
+
+def _fetch(model, key_fields, deltas):
+    material_ids = {material_id for material_id, key in deltas}
+    lookups = {field + '__in': {_values(key_fields, key)[index] for material_id, key in deltas}
+               for index, field in enumerate(key_fields)}
+    rows = model.objects.filter(material_id__in=material_ids, **lookups)
+    found = {}
+    for row in rows:
+        values = tuple(getattr(row, field) for field in key_fields)
+        key = (row.material_id, values if len(key_fields) > 1 else values[0])
+        if key in deltas:
+            found[key] = row
+    return found
+
+
+# This method recomputes the rollups from the reading events and the summaries of compacted events, for the given
+# materials or for all of them. It returns the number of student and daily rollup rows written.
+def rebuild(material_ids=None):
+    events = ReadingEvent.objects.all()
+    summaries = ReadingSummary.objects.all()
+    student_rollups = MaterialStudentRollup.objects.all()
+    daily_rollups = MaterialDailyRollup.objects.all()
+    if material_ids is not None:
+        events = events.filter(material_id__in=material_ids)
+        summaries = summaries.filter(material_id__in=material_ids)
+        student_rollups = student_rollups.filter(material_id__in=material_ids)
+        daily_rollups = daily_rollups.filter(material_id__in=material_ids)
+
+    per_student = _merge_totals(
+        events.values('material_id', 'student_id').annotate(total=Sum('seconds'), last=Max('timestamp'),
+                                                            count=Count('id')).order_by(),
+        summaries.values('material_id', 'student_id').annotate(total=Sum('seconds'), last=Max('last_read'),
+                                                               count=Sum('events')).order_by(),
+        ('material_id', 'student_id'))
+    per_day = _merge_totals(
+        events.annotate(day=TruncDate('timestamp')).values('material_id', 'day')
+        .annotate(total=Sum('seconds'), last=Max('timestamp'), count=Count('id')).order_by(),
+        summaries.values('material_id', 'day').annotate(total=Sum('seconds'), last=Max('last_read'),
+                                                        count=Sum('events')).order_by(),
+        ('material_id', 'day'))
+
+    with transaction.atomic():
+        student_rollups.delete()
+        daily_rollups.delete()
+        students = _bulk_create(MaterialStudentRollup, (
+            MaterialStudentRollup(material_id=material_id, student_id=student_id, seconds=row['total'],
+                                  last_read=row['last'])
+            for (material_id, student_id), row in per_student.items()))
+        days = _bulk_create(MaterialDailyRollup, (
+            MaterialDailyRollup(material_id=material_id, day=day, seconds=row['total'], events=row['count'])
+            for (material_id, day), row in per_day.items()))
+        analytics.bump(material_ids)
+    return students, days
+
+
+# This method adds up grouped totals of the reading events and of the summaries by the values of key_fields.
+def _merge_totals(event_rows, summary_rows, key_fields):
+    merged = {}
+    for rows in (event_rows, summary_rows):
+        for row in rows.iterator():
+            key = tuple(row[field] for field in key_fields)
+            total = merged.setdefault(key, {'total': 0, 'count': 0, 'last': None})
+            total['total'] += row['total']
+            total['count'] += row['count']
+            if row['last'] is not None and (total['last'] is None or row['last'] > total['last']):
+                total['last'] = row['last']
+    return merged
+
+
+def _bulk_create(model, rows):
+    written = 0
+    while True:
+        batch = list(islice(rows, BATCH_SIZE))
+        if not batch:
+            return written
+        model.objects.bulk_create(batch)
+        written += len(batch)
+
+
+# This method returns the total reading time of every student that read the material, with the name of the
+# student as key and the time spent on the material as the value, like ReadingInfo.material_info used to.
+def material_totals(material_id):
+    rows = (MaterialStudentRollup.objects.filter(material_id=material_id)
+            .values_list('student__username', 'seconds')
+            .order_by('student__username'))
+    return dict(rows)
+
+
+# This method returns the reading time spent on the material per day, oldest day first.
+def material_days(material_id):
+    return MaterialDailyRollup.objects.filter(material_id=material_id).order_by('day')
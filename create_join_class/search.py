@@ -0,0 +1,161 @@
+import re
+
+from django.conf import settings
+from django.db import connections
+from django.urls import reverse
+from django.utils.html import escape
+
+from . import memberships
+from .models import MaterialPageText, ReadingMaterial
+
+# The most hits a search returns.
+MAX_RESULTS = 50
+# About how many words a snippet has.
+SNIPPET_WORDS = 12
+# The PostgreSQL text search configuration, which decides the stemming and stop words.
+SEARCH_CONFIG = getattr(settings, 'SEARCH_CONFIG', 'english')
+# The SQLite FTS5 table indexing the text of MaterialPageText. It holds no copy of the text: it is an external
+# content table kept up to date by triggers on the page text table.
+FTS_TABLE = 'create_join_class_materialpagetext_fts'
+
+# The snippets are marked with these characters by the database, and only turned into <mark> tags once the
+# text around them is escaped.
+_START = '\x02'
+_STOP = '\x03'
+
+
+def _tables(connection):
+    quote = connection.ops.quote_name
+    return quote(FTS_TABLE), quote(MaterialPageText._meta.db_table), quote(ReadingMaterial._meta.db_table)
+
+
+# This method creates the full-text index of the page texts where the database supports one. It is run after
+# every migrate (see apps.py) and does nothing when the index exists, or when the page text table does not exist
+# (yet), as after migrating the app back to zero. On SQLite it is an FTS5 table with triggers updating it whenever
+# page texts are written or deleted; on PostgreSQL it is a GIN index on the tsvector of the text. Other databases
+# are searched without an index.
+def install(using='default', **kwargs):
+    connection = connections[using]
+    if MaterialPageText._meta.db_table not in connection.introspection.table_names():
+        return
+    fts, pages, _ = _tables(connection)
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            cursor.execute("SELECT 1 FROM sqlite_master WHERE name = %s", [FTS_TABLE])
+            created = cursor.fetchone() is None
+            cursor.execute("CREATE VIRTUAL TABLE IF NOT EXISTS %s USING fts5(text, content=%s, content_rowid='id', "
+                           "tokenize='porter unicode61')" % (fts, pages))
+            for name, event, body in [
+                ('insert', 'INSERT', "INSERT INTO {fts}(rowid, text) VALUES (new.id, new.text);"),
+                ('delete', 'DELETE', "INSERT INTO {fts}({fts}, rowid, text) VALUES ('delete', old.id, old.text);"),
+                ('update', 'UPDATE', "INSERT INTO {fts}({fts}, rowid, text) VALUES ('delete', old.id, old.text); "
+                                     "INSERT INTO {fts}(rowid, text) VALUES (new.id, new.text);"),
+            ]:
+                cursor.execute('CREATE TRIGGER IF NOT EXISTS %s AFTER %s ON %s BEGIN %s END' % (
+                    connection.ops.quote_name(FTS_TABLE + '_' + name), event, pages, body.format(fts=fts)))
+            if created:
+                # Pages extracted before the index existed.
+                cursor.execute("INSERT INTO %s(%s) VALUES ('rebuild')" % (fts, fts))
+        elif connection.vendor == 'postgresql':
+            cursor.execute("CREATE INDEX IF NOT EXISTS %s ON %s USING gin (to_tsvector(%%s::regconfig, text))" % (
+                connection.ops.quote_name(MaterialPageText._meta.db_table + '_search'), pages), [SEARCH_CONFIG])
+
+
+# This method rebuilds the SQLite index from the page texts, for example after they were changed with the
+# triggers missing. The PostgreSQL index is always up to date and is only created when missing.
+def rebuild(using='default'):
+    connection = connections[using]
+    install(using)
+    if connection.vendor == 'sqlite':
+        fts = _tables(connection)[0]
+        with connection.cursor() as cursor:
+            cursor.execute("INSERT INTO %s(%s) VALUES ('rebuild')" % (fts, fts))
+
+
+# This method searches the text of the reading materials in the classrooms the user created or joined, or in
+# one of them. It returns up to limit hits, best first, each with the material, the page number, a score (higher
+# is better) and an HTML snippet of the page with the matched words in <mark> tags.
+def search(user_id, query, classroom_id=None, limit=MAX_RESULTS):
+    classrooms = memberships.get(user_id)
+    classroom_ids = {classroom['id'] for classroom in classrooms['created'] + classrooms['joined']}
+    if classroom_id is not None:
+        classroom_ids &= {classroom_id}
+    words = re.findall(r'\w+', query)
+    if not classroom_ids or not words:
+        return []
+
+    connection = connections['default']
+    if connection.vendor == 'sqlite':
+        rows = _search_sqlite(connection, words, classroom_ids, limit)
+    elif connection.vendor == 'postgresql':
+        rows = _search_postgresql(connection, query, classroom_ids, limit)
+    else:
+        rows = _search_unindexed(words, classroom_ids, limit)
+
+    materials = ReadingMaterial.objects.filter(pk__in={row[0] for row in rows}).select_related('classroom').in_bulk()
+    hits = []
+    for material_id, page, score, snippet in rows:
+        material = materials.get(material_id)
+        if material is None:
+            continue
+        hits.append({
+            'material_id': material_id,
+            'name': material.name,
+            'classroom': '%s.%d' % (material.classroom.name, material.classroom.section),
+            'page': page,
+            'score': round(score, 4),
+            'snippet': escape(snippet).replace(_START, '<mark>').replace(_STOP, '</mark>'),
+            'url': reverse('viewPDF', args=[material.readingFile.url, material_id]) + '#page=%d' % page,
+        })
+    return hits
+
+
+def _search_sqlite(connection, words, classroom_ids, limit):
+    fts, pages, materials = _tables(connection)
+    # Every word is quoted, so the words typed are never read as FTS5 operators; the last one also matches as
+    # a prefix, for searching while typing.
+    match = ' '.join('"%s"' % word for word in words) + '*'
+    with connection.cursor() as cursor:
+        cursor.execute(
+            # FTS5 functions take the table name, not an alias.
+            'SELECT p.material_id, p.page, -bm25({fts}), snippet({fts}, 0, %s, %s, %s, %s) '
+            'FROM {fts} JOIN {pages} p ON p.id = {fts}.rowid JOIN {materials} m ON m.id = p.material_id '
+            'WHERE {fts} MATCH %s AND m.classroom_id IN ({ids}) AND m.deleted IS NULL '
+            'ORDER BY bm25({fts}) LIMIT %s'.format(fts=fts, pages=pages, materials=materials,
+                                                   ids=', '.join(['%s'] * len(classroom_ids))),
+            [_START, _STOP, '…', SNIPPET_WORDS, match] + sorted(classroom_ids) + [limit])
+        return cursor.fetchall()
+
+
+def _search_postgresql(connection, query, classroom_ids, limit):
+    _, pages, materials = _tables(connection)
+    with connection.cursor() as cursor:
+        # The snippets are only made for the hits returned.
+        cursor.execute(
+            'SELECT material_id, page, score, ts_headline(%%s::regconfig, text, query, %%s) FROM ('
+            'SELECT p.material_id, p.page, p.text, q.query, ts_rank(to_tsvector(%%s::regconfig, p.text), q.query) '
+            'AS score FROM %s p JOIN %s m ON m.id = p.material_id, '
+            'websearch_to_tsquery(%%s::regconfig, %%s) AS q(query) '
+            'WHERE to_tsvector(%%s::regconfig, p.text) @@ q.query AND m.classroom_id = ANY(%%s) '
+            'AND m.deleted IS NULL ORDER BY score DESC LIMIT %%s) hits ORDER BY score DESC' % (pages, materials),
+            [SEARCH_CONFIG, 'StartSel=%s, StopSel=%s, MaxWords=%d, MinWords=%d' % (
+                _START, _STOP, SNIPPET_WORDS, SNIPPET_WORDS // 2),
+             SEARCH_CONFIG, SEARCH_CONFIG, query, SEARCH_CONFIG, sorted(classroom_ids), limit])
+        return cursor.fetchall()
+
+
+def _search_unindexed(words, classroom_ids, limit):
+    pages = MaterialPageText.objects.filter(material__classroom_id__in=classroom_ids, material__deleted=None)
+    for word in words:
+        pages = pages.filter(text__icontains=word)
+    return [(material_id, page, 0.0, _snippet(text, words))
+            for material_id, page, text in pages.order_by('material_id', 'page')
+            .values_list('material_id', 'page', 'text')[:limit]]
+
+
+def _snippet(text, words):
+    found = re.search('|'.join(re.escape(word) for word in words), text, re.IGNORECASE)
+    start = found.start() if found else 0
+    around = text[max(start - 60, 0):start + 120]
+    return re.sub('(%s)' % '|'.join(re.escape(word) for word in words), _START + r'\1' + _STOP, around,
+                  flags=re.IGNORECASE)
@@ -0,0 +1,142 @@
+import os
+import re
+
+from django.conf import settings
+from django.http import FileResponse, HttpResponse, HttpResponseNotModified, StreamingHttpResponse
+from django.utils.http import http_date, parse_etags
+from private_storage.servers import ApacheXSendfileServer, NginxXAccelRedirectServer
+
+from . import page_assets
+from .models import StoredFile
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+CHUNK_SIZE = 64 * 1024
+
+# The front servers the transfer can be handed to, selected with the PRIVATE_STORAGE_OFFLOAD setting.
+OFFLOAD_SERVERS = {
+    'nginx': NginxXAccelRedirectServer,
+    'apache': ApacheXSendfileServer,
+}
+
+
+# This class is the private_storage server for reading materials (see the PRIVATE_STORAGE_SERVER setting).
+# private_storage has already checked the permissions when serve() is called. A request whose If-None-Match
+# matches the ETag of the file gets a 304. Otherwise the transfer is handed to nginx with X-Accel-Redirect
+# or to Apache with X-Sendfile when PRIVATE_STORAGE_OFFLOAD is set, so no worker is kept busy while the file
+# is sent. Without a front server the file is sent from Python, with support for single byte Range requests.
+class ReadingMaterialServer:
+
+    @staticmethod
+    def serve(private_file):
+        etag = file_etag(private_file)
+        if etag_matches(private_file.request.META.get('HTTP_IF_NONE_MATCH'), etag):
+            response = HttpResponseNotModified()
+        else:
+            offload = OFFLOAD_SERVERS.get(getattr(settings, 'PRIVATE_STORAGE_OFFLOAD', None))
+            if offload is not None:
+                response = offload.serve(private_file)
+            else:
+                response = serve_range(private_file, etag)
+        response['ETag'] = etag
+        # Browsers may keep the file, but have to revalidate it so the permission check still happens.
+        response['Cache-Control'] = 'private, no-cache'
+        if response.has_header('Expires'):
+            del response['Expires']
+        return response
+
+
+def file_etag(private_file):
+    # Files stored by content are named after their digest, so identical files share one ETag.
+    if private_file.relative_name.startswith(StoredFile.BLOB_DIR):
+        return '"%s"' % os.path.splitext(os.path.basename(private_file.relative_name))[0]
+    modified = int(private_file.modified_time.timestamp() * 1000000)
+    return '"%x-%x"' % (modified, private_file.size)
+
+
+def etag_matches(header, etag):
+    if not header:
+        return False
+    etags = [tag[2:] if tag.startswith('W/') else tag for tag in parse_etags(header)]
+    return '*' in etags or etag in etags
+
+
+# This method returns the (first, last) byte positions asked for by a Range header, or None when the whole
+# file should be sent instead, which is what happens for malformed and multiple ranges. It raises ValueError
+# when the range cannot be satisfied.
+def parse_range(header, size):
+    match = RANGE_RE.match(header.strip())
+    if not match:
+        return None
+    first, last = match.groups()
+    if not first:
+        if not last:
+            return None
+        suffix = int(last)
+        if suffix == 0 or size == 0:
+            raise ValueError('Unsatisfiable range')
+        return max(size - suffix, 0), size - 1
+    start = int(first)
+    if last and int(last) < start:
+        return None
+    if start >= size:
+        raise ValueError('Unsatisfiable range')
+    end = min(int(last), size - 1) if last else size - 1
+    return start, end
+
+
+# This method sends the file from Python, or the part of it asked for by a Range header.
+def serve_range(private_file, etag):
+    request = private_file.request
+    size = private_file.size
+    byte_range = None
+    if_range = request.META.get('HTTP_IF_RANGE')
+    if 'HTTP_RANGE' in request.META and (not if_range or if_range == etag):
+        try:
+            byte_range = parse_range(request.META['HTTP_RANGE'], size)
+        except ValueError:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = 'bytes */%d' % size
+            return response
+
+    if byte_range is None:
+        start, end, status = 0, size - 1, 200
+    else:
+        (start, end), status = byte_range, 206
+    length = end - start + 1
+
+    if request.method == 'HEAD':
+        response = HttpResponse(status=status)
+    elif status == 200:
+        # FileResponse lets the WSGI server use wsgi.file_wrapper, e.g. sendfile(), for the whole file.
+        response = FileResponse(private_file.open())
+    else:
+        response = StreamingHttpResponse(_read(private_file, start, length), status=status)
+        response['Content-Range'] = 'bytes %d-%d/%d' % (start, end, size)
+    response['Content-Type'] = private_file.content_type
+    response['Content-Length'] = length
+    response['Accept-Ranges'] = 'bytes'
+    response['Last-Modified'] = http_date(private_file.modified_time.timestamp())
+    return response
+
+
+def _read(private_file, start, length):
+    with private_file.open() as file:
+        file.seek(start)
+        while length > 0:
+            chunk = file.read(min(CHUNK_SIZE, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+
+
+# This method sends a rendered page of a reading material (see page_assets). The URL of a page changes whenever
+# its content could, so browsers may keep it for a year without asking again.
+def serve_page(request, path, etag):
+    if etag_matches(request.META.get('HTTP_IF_NONE_MATCH'), etag):
+        response = HttpResponseNotModified()
+    else:
+        response = FileResponse(open(path, 'rb'), content_type=page_assets.CONTENT_TYPE)
+    response['ETag'] = etag
+    response['Cache-Control'] = 'private, max-age=31536000, immutable'
+    return response
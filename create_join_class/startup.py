@@ -0,0 +1,73 @@
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+from collections import defaultdict
+
+from django.conf import settings
+
+ROLES = ('web', 'worker', 'management')
+
+# The script timing the start of a process in a fresh interpreter: the import of the settings, then django.setup(),
+# which imports the installed apps and their models and runs their ready() methods.
+_SCRIPT = '''
+import json, time
+start = time.perf_counter()
+import django
+from django.conf import settings
+settings.INSTALLED_APPS
+loaded = time.perf_counter()
+django.setup()
+ready = time.perf_counter()
+print(json.dumps({'settings_ms': (loaded - start) * 1000, 'setup_ms': (ready - loaded) * 1000,
+                  'apps': list(settings.INSTALLED_APPS)}))
+'''
+
+# A line written by python -X importtime: the time spent in the module itself and with its own imports, in us.
+_IMPORT_TIME = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$')
+
+
+def _run(role, import_time):
+    env = dict(os.environ, READING_ROOM_ROLE=role)
+    command = [sys.executable] + (['-X', 'importtime'] if import_time else []) + ['-c', _SCRIPT]
+    process = subprocess.run(command, cwd=settings.BASE_DIR, env=env, capture_output=True, text=True)
+    if process.returncode != 0:
+        raise RuntimeError('The %s process did not start:\n%s' % (role, process.stderr.strip()))
+    return json.loads(process.stdout.strip().splitlines()[-1]), process.stderr
+
+
+# This method measures how long a process of the role takes to start. Fresh interpreters are started repeat times
+# and the median of their times is kept, then one more is started with python -X importtime, whose import times are
+# added up per top level package, e.g. all the modules of django or allauth. The slowest packages are kept, along
+# with the slowest modules imported by the start itself and the time of their own imports. Import times are inflated
+# a little by -X importtime, so they are only compared with each other.
+def measure(role, repeat=5, top=15):
+    runs = [_run(role, False)[0] for _ in range(repeat)]
+    result, log = _run(role, True)
+
+    packages = defaultdict(int)
+    modules = []
+    for line in log.splitlines():
+        found = _IMPORT_TIME.match(line)
+        if found is None:
+            continue
+        own, cumulative, indent, name = int(found.group(1)), int(found.group(2)), found.group(3), found.group(4)
+        packages[name.split('.')[0]] += own
+        if len(indent) == 1:
+            # Modules imported by the script itself, rather than by other modules.
+            modules.append((name, cumulative))
+
+    return {
+        'role': role,
+        'apps': result['apps'],
+        'settings_ms': round(statistics.median(run['settings_ms'] for run in runs), 1),
+        'setup_ms': round(statistics.median(run['setup_ms'] for run in runs), 1),
+        'total_ms': round(statistics.median(run['settings_ms'] + run['setup_ms'] for run in runs), 1),
+        'import_ms': round(sum(packages.values()) / 1000, 1),
+        'packages': [{'name': name, 'ms': round(us / 1000, 1)}
+                     for name, us in sorted(packages.items(), key=lambda item: -item[1])[:top]],
+        'top_level': [{'name': name, 'ms': round(us / 1000, 1)}
+                      for name, us in sorted(modules, key=lambda item: -item[1])[:top]],
+    }
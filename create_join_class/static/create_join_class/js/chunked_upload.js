@@ -0,0 +1,154 @@
+// Sends the reading material upload form through the chunked upload API, so a large file whose upload is
+// interrupted continues where it stopped instead of starting over. The id of an unfinished upload is kept in
+// localStorage per file; submitting the form again with the same file resumes it. Browsers without fetch or
+// Blob.slice submit the form as a normal multipart POST.
+var ChunkedUpload = {
+
+	startUrl: null,
+	chunkUrl: null,
+	csrfToken: null,
+	progress: null,
+	chunkSize: 4 * 1024 * 1024,
+	retries: 5,
+	retryDelayMs: 2000,
+	uploadIdPlaceholder: "00000000-0000-0000-0000-000000000000",
+
+	// options: form, startUrl, chunkUrl (with uploadIdPlaceholder for the upload id), csrfToken and progress,
+	// the element that shows how much has been sent.
+	initialize: function (options) {
+		if (!window.fetch || !window.Blob || !Blob.prototype.slice) {
+			return;
+		}
+		ChunkedUpload.startUrl = options.startUrl;
+		ChunkedUpload.chunkUrl = options.chunkUrl;
+		ChunkedUpload.csrfToken = options.csrfToken;
+		ChunkedUpload.progress = options.progress;
+
+		options.form.addEventListener("submit", function (event) {
+			var file = options.form.querySelector("input[type=file]").files[0];
+			var name = options.form.querySelector("input[name=name]").value;
+			if (!file) {
+				return;
+			}
+			event.preventDefault();
+			ChunkedUpload.upload(file, name)
+				.then(function (result) {
+					localStorage.removeItem(ChunkedUpload.storageKey(file));
+					window.location = result.redirect;
+				})
+				.catch(function (error) {
+					ChunkedUpload.show(error.message);
+				});
+		});
+	},
+
+	storageKey: function (file) {
+		return "chunked-upload:" + file.name + ":" + file.size + ":" + file.lastModified;
+	},
+
+	urlFor: function (uploadId) {
+		return ChunkedUpload.chunkUrl.replace(ChunkedUpload.uploadIdPlaceholder, uploadId);
+	},
+
+	show: function (text) {
+		if (ChunkedUpload.progress) {
+			ChunkedUpload.progress.textContent = text;
+		}
+	},
+
+	// Resolves with the JSON body of the response, its status code and its Retry-After header in milliseconds.
+	request: function (url, options) {
+		options.headers = options.headers || {};
+		options.headers["X-CSRFToken"] = ChunkedUpload.csrfToken;
+		options.credentials = "same-origin";
+		return fetch(url, options).then(function (response) {
+			return response.json().then(function (data) {
+				var retryAfter = parseInt(response.headers.get("Retry-After"), 10);
+				return {status: response.status, data: data,
+					retryAfterMs: retryAfter >= 0 ? retryAfter * 1000 : ChunkedUpload.retryDelayMs};
+			});
+		});
+	},
+
+	wait: function (ms) {
+		return new Promise(function (resolve) {
+			setTimeout(resolve, ms);
+		});
+	},
+
+	upload: function (file, name) {
+		return ChunkedUpload.begin(file, name).then(function (upload) {
+			return ChunkedUpload.send(file, upload.uploadId, upload.received, ChunkedUpload.retries);
+		});
+	},
+
+	// Continues the unfinished upload of this file if the server still has it, or starts a new one.
+	begin: function (file, name) {
+		var key = ChunkedUpload.storageKey(file);
+		var uploadId = localStorage.getItem(key);
+		if (uploadId) {
+			return ChunkedUpload.request(ChunkedUpload.urlFor(uploadId), {method: "GET"}).then(function (result) {
+				if (result.status === 200) {
+					ChunkedUpload.chunkSize = result.data.chunk_size;
+					return {uploadId: uploadId, received: result.data.received};
+				}
+				localStorage.removeItem(key);
+				return ChunkedUpload.begin(file, name);
+			});
+		}
+
+		var data = new FormData();
+		data.append("name", name);
+		data.append("filename", file.name);
+		data.append("size", file.size);
+		return ChunkedUpload.request(ChunkedUpload.startUrl, {method: "POST", body: data}).then(function (result) {
+			if (result.status !== 200) {
+				throw new Error(result.data.error);
+			}
+			localStorage.setItem(key, result.data.upload_id);
+			ChunkedUpload.chunkSize = result.data.chunk_size;
+			return {uploadId: result.data.upload_id, received: 0};
+		});
+	},
+
+	send: function (file, uploadId, offset, retries) {
+		var chunk = file.slice(offset, offset + ChunkedUpload.chunkSize);
+		var url = ChunkedUpload.urlFor(uploadId) + "?offset=" + offset;
+		var options = {method: "POST", body: chunk, headers: {"Content-Type": "application/octet-stream"}};
+		var retry = function () {
+			if (retries <= 0) {
+				throw new Error("The upload was interrupted. Submit the form again to continue it.");
+			}
+			ChunkedUpload.show("Connection lost, retrying...");
+			return ChunkedUpload.wait(ChunkedUpload.retryDelayMs).then(function () {
+				return ChunkedUpload.send(file, uploadId, offset, retries - 1);
+			});
+		};
+		return ChunkedUpload.request(url, options).then(function (result) {
+			if (result.status === 409) {
+				// The server has a different number of bytes than we thought: continue from there.
+				return ChunkedUpload.send(file, uploadId, result.data.received, retries);
+			}
+			if (result.status === 202) {
+				// Every byte is in and the material is being created: ask for it again with an empty chunk.
+				ChunkedUpload.show("Processing the file...");
+				return ChunkedUpload.wait(result.retryAfterMs).then(function () {
+					return ChunkedUpload.send(file, uploadId, file.size, retries);
+				});
+			}
+			if (result.status >= 500) {
+				// Retried like a lost connection; the server keeps what it received.
+				return retry();
+			}
+			if (result.status !== 200) {
+				localStorage.removeItem(ChunkedUpload.storageKey(file));
+				throw new Error(result.data.error);
+			}
+			ChunkedUpload.show("Uploaded " + Math.floor(100 * result.data.received / file.size) + "%");
+			if (result.data.redirect) {
+				return result.data;
+			}
+			return ChunkedUpload.send(file, uploadId, result.data.received, ChunkedUpload.retries);
+		}, retry);
+	}
+};
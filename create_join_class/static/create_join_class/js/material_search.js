@@ -0,0 +1,67 @@
+// Searches the text of the reading materials from a search box and lists the hits below it, each with its page
+// number and a snippet. A search is sent a moment after the user stops typing, and answers to older searches
+// that arrive late are ignored.
+var MaterialSearch = {
+
+	delayMs: 250,
+	timer: null,
+	latest: 0,
+
+	// options: url (of the search view), classroomId (to search one classroom, or null), input (the search box)
+	// and results, the element the hits are listed in.
+	initialize: function (options) {
+		if (!window.fetch) {
+			return;
+		}
+		options.input.addEventListener("input", function () {
+			clearTimeout(MaterialSearch.timer);
+			MaterialSearch.timer = setTimeout(function () {
+				MaterialSearch.search(options);
+			}, MaterialSearch.delayMs);
+		});
+	},
+
+	search: function (options) {
+		var query = options.input.value.trim();
+		var number = ++MaterialSearch.latest;
+		if (!query) {
+			options.results.innerHTML = "";
+			return;
+		}
+		var url = options.url + "?q=" + encodeURIComponent(query);
+		if (options.classroomId) {
+			url += "&classroom=" + options.classroomId;
+		}
+		fetch(url, {credentials: "same-origin", headers: {"Accept": "application/json"}})
+			.then(function (response) {
+				return response.json();
+			})
+			.then(function (data) {
+				if (number === MaterialSearch.latest) {
+					MaterialSearch.show(options.results, data.results);
+				}
+			});
+	},
+
+	show: function (element, results) {
+		element.innerHTML = "";
+		if (!results.length) {
+			element.textContent = "No matches found.";
+			return;
+		}
+		results.forEach(function (hit) {
+			var item = document.createElement("a");
+			item.className = "list-group-item list-group-item-action";
+			item.href = hit.url;
+			item.target = "_blank";
+			var title = document.createElement("strong");
+			title.textContent = hit.name + " (" + hit.classroom + "), page " + hit.page;
+			var snippet = document.createElement("div");
+			// The snippet is escaped by the server, apart from the <mark> tags around the matched words.
+			snippet.innerHTML = hit.snippet;
+			item.appendChild(title);
+			item.appendChild(snippet);
+			element.appendChild(item);
+		});
+	}
+};
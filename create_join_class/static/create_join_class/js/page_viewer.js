@@ -0,0 +1,84 @@
+// Shows a reading material page by page with pdf.js instead of the browser's pdf plugin, so the reading tracker can
+// tell which pages are on screen. Only the byte ranges of the pages that are scrolled to are downloaded, and pages
+// are rendered as they come into view. When pdf.js is not available or cannot open the file, the fallback (a
+// <template> holding the <object> viewer) is added to the page instead; it is not added before, so the browser
+// does not download the whole file next to the ranges pdf.js asks for.
+var PageViewer = {
+
+	// options: url, workerSrc, container (a scrollable element), fallback and onReady, called with the container
+	// once an element with a data-page attribute exists for every page.
+	initialize: function (options) {
+		if (!window.pdfjsLib || !window.IntersectionObserver) {
+			PageViewer.showFallback(options.fallback);
+			return;
+		}
+		pdfjsLib.GlobalWorkerOptions.workerSrc = options.workerSrc;
+		pdfjsLib.getDocument({url: options.url, disableAutoFetch: true, disableStream: true}).promise
+			.then(function (pdf) {
+				options.container.style.display = "";
+				for (var number = 1; number <= pdf.numPages; number++) {
+					var page = document.createElement("div");
+					page.setAttribute("data-page", number);
+					page.className = "border mb-2";
+					page.style.minHeight = options.container.clientHeight + "px";
+					options.container.appendChild(page);
+				}
+
+				var observer = new IntersectionObserver(function (changes) {
+					changes.forEach(function (change) {
+						if (change.isIntersecting) {
+							observer.unobserve(change.target);
+							PageViewer.render(pdf, change.target);
+						}
+					});
+				}, {root: options.container, rootMargin: "200px"});
+				options.container.querySelectorAll("[data-page]").forEach(function (page) {
+					observer.observe(page);
+				});
+				PageViewer.showLinkedPage(options.container);
+
+				if (options.onReady) {
+					options.onReady(options.container);
+				}
+			})
+			.catch(function () {
+				options.container.style.display = "none";
+				PageViewer.showFallback(options.fallback);
+			});
+	},
+
+	showFallback: function (fallback) {
+		if (!fallback || fallback.getAttribute("data-shown")) {
+			return;
+		}
+		fallback.setAttribute("data-shown", "true");
+		// Browsers without <template> show its content as it is.
+		if (fallback.content) {
+			fallback.parentNode.insertBefore(fallback.content.cloneNode(true), fallback);
+		}
+	},
+
+	// Links from the search results open the material at the page of the hit, e.g. #page=12. This is also used by
+	// the viewer of rendered pages, whose page elements are part of the html.
+	showLinkedPage: function (container) {
+		var linked = /^#page=(\d+)$/.exec(window.location.hash);
+		var target = linked && container.querySelector("[data-page='" + linked[1] + "']");
+		if (target) {
+			container.scrollTop = target.offsetTop - container.offsetTop;
+		}
+	},
+
+	render: function (pdf, element) {
+		pdf.getPage(parseInt(element.getAttribute("data-page"), 10)).then(function (page) {
+			var scale = element.clientWidth / page.getViewport({scale: 1}).width * (window.devicePixelRatio || 1);
+			var viewport = page.getViewport({scale: scale});
+			var canvas = document.createElement("canvas");
+			canvas.width = viewport.width;
+			canvas.height = viewport.height;
+			canvas.style.width = "100%";
+			element.style.minHeight = "";
+			element.appendChild(canvas);
+			page.render({canvasContext: canvas.getContext("2d"), viewport: viewport});
+		});
+	}
+};
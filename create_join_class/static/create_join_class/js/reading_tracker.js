@@ -0,0 +1,145 @@
+// Sends the time TimeMe records on each reading material to push_reading_batch. Ticks are coalesced per material
+// and sent together every flushIntervalSeconds; whatever is left is sent with navigator.sendBeacon when the viewer
+// is hidden or closed. Every entry gets a sequence number, so entries resent after a failed request are only
+// counted once by the server. When the viewer shows the pages itself, the time each page is visible is sent along
+// (see trackPages).
+var ReadingTracker = {
+
+	url: null,
+	csrfToken: null,
+	session: Math.random().toString(36).substring(2, 14),
+	flushIntervalSeconds: 30,
+	maxEntriesPerBatch: 100,
+	sequence: 0,
+	sentSeconds: {},
+	pageSeconds: {},
+	unsent: [],
+
+	// options: url, csrfToken, materialIds and optionally flushIntervalSeconds.
+	initialize: function (options) {
+		ReadingTracker.url = options.url;
+		ReadingTracker.csrfToken = options.csrfToken;
+		ReadingTracker.flushIntervalSeconds = options.flushIntervalSeconds || ReadingTracker.flushIntervalSeconds;
+		options.materialIds.forEach(function (materialId) {
+			ReadingTracker.sentSeconds[materialId] = 0;
+		});
+		TimeMe.initialize({currentPageName: ReadingTracker.pageName(options.materialIds[0]), idleTimeoutInSeconds: 60});
+
+		setInterval(function () {
+			ReadingTracker.flush(false);
+		}, ReadingTracker.flushIntervalSeconds * 1000);
+		document.addEventListener("visibilitychange", function () {
+			if (document.visibilityState === "hidden") {
+				ReadingTracker.flush(true);
+			}
+		});
+		window.addEventListener("pagehide", function () {
+			ReadingTracker.flush(true);
+		});
+	},
+
+	// Counts the seconds every page of a material is visible while the student is active. The pages are the
+	// elements of container with a data-page attribute holding the page number. A page is visible while at least
+	// half of it, or enough of it to fill half of the container, is on screen.
+	trackPages: function (materialId, container) {
+		if (!window.IntersectionObserver) {
+			return;
+		}
+		var visible = {};
+		var observer = new IntersectionObserver(function (changes) {
+			changes.forEach(function (change) {
+				var page = change.target.getAttribute("data-page");
+				var bounds = change.rootBounds;
+				if (change.isIntersecting && (change.intersectionRatio >= 0.5 ||
+					(bounds && change.intersectionRect.height >= bounds.height / 2))) {
+					visible[page] = true;
+				} else {
+					delete visible[page];
+				}
+			});
+		}, {root: container, threshold: [0, 0.25, 0.5, 0.75, 1]});
+		container.querySelectorAll("[data-page]").forEach(function (page) {
+			observer.observe(page);
+		});
+
+		ReadingTracker.pageSeconds[materialId] = {};
+		setInterval(function () {
+			if (document.visibilityState !== "visible" || TimeMe.idle) {
+				return;
+			}
+			var seconds = ReadingTracker.pageSeconds[materialId];
+			Object.keys(visible).forEach(function (page) {
+				seconds[page] = (seconds[page] || 0) + 1;
+			});
+		}, 1000);
+	},
+
+	pageName: function (materialId) {
+		return "material-" + materialId;
+	},
+
+	// Turns the time read since the previous call into [material_id, delta_seconds, client_seq] entries, followed
+	// by [page, seconds] pairs when the pages are tracked.
+	collect: function () {
+		Object.keys(ReadingTracker.sentSeconds).forEach(function (materialId) {
+			var seconds = Math.floor(TimeMe.getTimeOnPageInSeconds(ReadingTracker.pageName(materialId)));
+			var delta = seconds - ReadingTracker.sentSeconds[materialId];
+			if (delta > 0) {
+				ReadingTracker.sentSeconds[materialId] = seconds;
+				var entry = [parseInt(materialId, 10), delta, ReadingTracker.sequence++];
+				var pages = ReadingTracker.pageSeconds[materialId];
+				if (pages && Object.keys(pages).length > 0) {
+					entry.push(Object.keys(pages).map(function (page) {
+						return [parseInt(page, 10), pages[page]];
+					}));
+					ReadingTracker.pageSeconds[materialId] = {};
+				}
+				ReadingTracker.unsent.push(entry);
+			}
+		});
+		return ReadingTracker.unsent.slice(0, ReadingTracker.maxEntriesPerBatch);
+	},
+
+	acknowledge: function (entries) {
+		var sent = entries.map(function (entry) {
+			return entry[2];
+		});
+		ReadingTracker.unsent = ReadingTracker.unsent.filter(function (entry) {
+			return sent.indexOf(entry[2]) === -1;
+		});
+	},
+
+	flush: function (unloading) {
+		var entries = ReadingTracker.collect();
+		if (entries.length === 0) {
+			return;
+		}
+		var data = new FormData();
+		data.append("session", ReadingTracker.session);
+		data.append("entries", JSON.stringify(entries));
+		data.append("csrfmiddlewaretoken", ReadingTracker.csrfToken);
+
+		if (unloading && navigator.sendBeacon && navigator.sendBeacon(ReadingTracker.url, data)) {
+			ReadingTracker.acknowledge(entries);
+			return;
+		}
+		// Redirects are not followed: once the session has expired the server answers with a redirect to the login
+		// page, which must not count as the entries being recorded.
+		fetch(ReadingTracker.url, {method: "POST", body: data, credentials: "same-origin", keepalive: unloading,
+			redirect: "manual"})
+			.then(function (response) {
+				if (!response.ok || response.redirected || response.type === "opaqueredirect") {
+					return null;
+				}
+				return response.json();
+			})
+			.then(function (result) {
+				if (result && typeof result.recorded === "number") {
+					ReadingTracker.acknowledge(entries);
+				}
+			})
+			.catch(function () {
+				// The entries stay in unsent and go out with the next flush.
+			});
+	}
+};
@@ -0,0 +1,75 @@
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from . import views
+from .models import ClassRoom, ReadingMaterial
+from .query_budget import assert_max_queries
+
+# Every cache of the site in memory, so the tests neither read nor leave entries on disk.
+LOCAL_CACHES = {alias: {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': alias}
+                for alias in ('default', 'memberships', 'listings', 'sessions')}
+
+
+# These tests check that the classroom and material listings run the same number of queries for one classroom or
+# material as for many, within the query budget of their view. The caches are cleared before every request, so
+# the queries are those of a cold cache.
+@override_settings(CACHES=LOCAL_CACHES)
+class ListingQueryTests(TestCase):
+    MANY = 10
+
+    def setUp(self):
+        self.teacher = User.objects.create_user('teacher', password='password')
+        self.student = User.objects.create_user('student', password='password')
+        self.classrooms = []
+
+    def add_classroom(self):
+        number = len(self.classrooms) + 1
+        classroom = ClassRoom.objects.create(name='Class', section=number, teacher=self.teacher,
+                                             classCode='C%05d' % number)
+        classroom.students.add(self.student)
+        self.classrooms.append(classroom)
+        return classroom
+
+    def add_material(self, classroom):
+        number = ReadingMaterial.all_objects.count() + 1
+        # The name of a file that is never read, so no file is written.
+        return ReadingMaterial.objects.create(name='Material %d' % number, classroom=classroom,
+                                              uploader=self.teacher, readingFile='material-%d.pdf' % number)
+
+    def count_queries(self, user, url, view):
+        for cache in caches.all():
+            cache.clear()
+        self.client.force_login(user)
+        with assert_max_queries(view.query_budget) as counter:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return counter.count
+
+    def test_home_classroom(self):
+        self.add_material(self.add_classroom())
+        url = reverse('home_classroom')
+        one = self.count_queries(self.student, url, views.home_classroom)
+        for _ in range(self.MANY - 1):
+            self.add_material(self.add_classroom())
+        self.assertEqual(self.count_queries(self.student, url, views.home_classroom), one)
+        self.assertEqual(self.count_queries(self.teacher, url, views.home_classroom), one)
+
+    def test_view_created_reading_material(self):
+        classroom = self.add_classroom()
+        self.add_material(classroom)
+        url = reverse('viewCreatedReadingMaterial', args=[classroom.pk])
+        one = self.count_queries(self.teacher, url, views.viewCreatedReadingMaterial)
+        for _ in range(self.MANY - 1):
+            self.add_material(classroom)
+        self.assertEqual(self.count_queries(self.teacher, url, views.viewCreatedReadingMaterial), one)
+
+    def test_view_joined_reading_material(self):
+        classroom = self.add_classroom()
+        self.add_material(classroom)
+        url = reverse('viewJoinedReadingMaterial', args=[classroom.pk])
+        one = self.count_queries(self.student, url, views.viewJoinedReadingMaterial)
+        for _ in range(self.MANY - 1):
+            self.add_material(classroom)
+        self.assertEqual(self.count_queries(self.student, url, views.viewJoinedReadingMaterial), one)
@@ -0,0 +1,35 @@
+import hashlib
+
+from django.core.files.uploadhandler import MemoryFileUploadHandler, TemporaryFileUploadHandler
+
+
+# This class adds a SHA-256 digest of the content to the files made by an upload handler, computed chunk by chunk
+# while the upload streams in, so the content never has to be read again to find out whether it is already stored.
+# The digest is available as the sha256 attribute of the uploaded file (see StoredFile.store).
+class HashingUploadMixin:
+
+    def new_file(self, *args, **kwargs):
+        # Set up first: MemoryFileUploadHandler.new_file raises StopFutureHandlers when it takes the file.
+        self.hasher = hashlib.sha256()
+        super().new_file(*args, **kwargs)
+
+    def receive_data_chunk(self, raw_data, start):
+        data = super().receive_data_chunk(raw_data, start)
+        # Only hash the chunks this handler keeps; the others are passed on to the next handler.
+        if data is None:
+            self.hasher.update(raw_data)
+        return data
+
+    def file_complete(self, file_size):
+        file = super().file_complete(file_size)
+        if file is not None:
+            file.sha256 = self.hasher.hexdigest()
+        return file
+
+
+class HashingMemoryFileUploadHandler(HashingUploadMixin, MemoryFileUploadHandler):
+    pass
+
+
+class HashingTemporaryFileUploadHandler(HashingUploadMixin, TemporaryFileUploadHandler):
+    pass
@@ -10,6 +10,7 @@ urlpatterns = [
 
     path('create/class/', views.create_class, name='create_class'),
     path('join/class/', views.join_class, name='join_class'),
+    path('provision/', views.provision_classrooms, name='provision_classrooms'),
     path('view/createdclass/<int:classroom_pk>/', views.viewcreatedclassroom, name='viewcreatedclassroom'),
     path('view/joinedclass/<int:classroom_pk>/', views.viewjoinedclassroom, name='viewjoinedclassroom'),
     path('view/createdclass/<int:created_pk>/viewCreatedReadingMaterial/', views.viewCreatedReadingMaterial,
@@ -18,10 +19,15 @@ urlpatterns = [
          name='viewJoinedReadingMaterial'),
     path('viewpdf/<path:filename>/<int:material_id>/', views.viewPDF,
          name='viewPDF'),
+    path('material/<int:material_id>/pages/<slug:asset_key>/<int:page>.jpg', views.material_page,
+         name='material_page'),
     path('view/createdclass/<int:classroom_pk>/uploadReadingMaterial/', views.uploadReadingMaterial,
          name='uploadReadingMaterial'),
     path('view/createdclass/<int:classroom_pk>/deleteReadingMaterial/<int:readingMaterial_pk>/',
          views.deleteReadingMaterial, name='deleteReadingMaterial'),
+    path('view/createdclass/<int:classroom_pk>/delete/', views.delete_classroom, name='delete_classroom'),
+    path('view/createdclass/<int:classroom_pk>/uploads/', views.start_chunked_upload, name='start_chunked_upload'),
+    path('uploads/<uuid:upload_id>/', views.chunked_upload, name='chunked_upload'),
     # unit test till above urls
 
     # development purpose
@@ -29,8 +35,11 @@ urlpatterns = [
 
     path('view_reading_info/<int:readingMaterial_id>/', views.view_reading_info, name='view_reading_info'),
     path('push_reading_info/<int:readingMaterial_id>/', views.push_reading_info, name='push_reading_info'),
-
-
-
-
+    path('push_reading_batch/', views.push_reading_batch, name='push_reading_batch'),
+    path('reading_info_summary/<int:readingMaterial_id>/', views.reading_info_summary,
+         name='reading_info_summary'),
+    path('search/', views.search_reading_material, name='search_reading_material'),
+    path('view/createdclass/<int:classroom_pk>/analytics/', views.classroom_analytics, name='classroom_analytics'),
+    path('view/createdclass/<int:classroom_pk>/exportReadingInfo/', views.export_reading_info,
+         name='export_reading_info'),
 ]
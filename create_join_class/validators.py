@@ -16,4 +16,8 @@ def validate_image_extension(value):
     ext = os.path.splitext(value.name)[1]  # [0] returns path+filename
     valid_extensions = ['.jpg', '.png', '.jpeg']
     if not ext.lower() in valid_extensions:
-        raise ValidationError('Unsupported image extension. Please choose image with \'jpeg\', \'.jpg\' or \'.png\'extension')
\ No newline at end of file
+        raise ValidationError('Unsupported image extension. Please choose image with \'jpeg\', \'.jpg\' or \'.png\'extension')
+
+def validate_pdf_header(data):
+    if not data.startswith(b'%PDF-'):
+        raise ValidationError('The file is not a pdf. Please upload a pdf file.')
@@ -1,14 +1,34 @@
 import json
-import uuid
+import os
+import time
+from django.conf import settings
 from django.contrib import messages
 from django.contrib.auth import login, logout, authenticate
 from django.contrib.auth.decorators import login_required
+from django.contrib.auth.views import redirect_to_login
 from django.contrib.auth.forms import UserCreationForm, AuthenticationForm
+from django.core.exceptions import PermissionDenied, ValidationError
 from django.db import IntegrityError
-from django.http import JsonResponse
+from django.http import Http404, HttpResponse, HttpResponseBadRequest, JsonResponse, StreamingHttpResponse
 from django.shortcuts import render, redirect, get_object_or_404
+from django.urls import reverse
+from django.utils.crypto import constant_time_compare
 from .forms import CreateClassRoomForm, ReadingMaterialForm
 from .models import *
+from . import (analytics, chunked_uploads, deletion, exports, ingest, listing_cache, memberships, metrics,
+               page_assets, page_dwell, pdfjs, provisioning, rollups, search, servers)
+from .query_budget import query_budget
+from private_storage.models import PrivateFile
+from private_storage.storage import private_storage
+from private_storage.views import PrivateStorageView
+
+# The longest time a single reading time update may report, in seconds.
+MAX_SECONDS_PER_UPDATE = 3600
+# The most entries a batched reading time update may carry.
+MAX_ENTRIES_PER_BATCH = 100
+# The largest value of the integer columns the numbers of a batched update end up in (material ids, sequences and
+# seconds), the same on every database.
+MAX_INTEGER = 2 ** 31 - 1
 
 # This method is used to create class. It creates a class with the POST data retrieved from the user via form
 # and also generates a unique class code for other users to join.
@@ -21,7 +41,7 @@ def create_class(request):
             form_data = CreateClassRoomForm(request.POST)
             new_class = form_data.save(commit=False)
             new_class.teacher = request.user
-            new_class.classCode = uuid.uuid4().hex[:6].upper()
+            new_class.classCode = provisioning.allocate_codes(1)[0]
             new_class.save()
             return redirect('home_classroom')
         except ValueError:
@@ -29,19 +49,45 @@ def create_class(request):
                           {'form': CreateClassRoomForm, 'error': 'Bad data passed in. Try again!'})
 
 
+# This method lets staff users create classrooms and enroll students in bulk. The roster is sent as the request
+# body with a text/csv or application/json content type, or as the roster file of a form, and its format can be
+# given with the format query parameter (see provisioning.parse_roster for the columns). Users that do not exist
+# are skipped and reported back, unless create_users=1 is passed.
+@login_required
+def provision_classrooms(request):
+    if not request.user.is_staff:
+        return JsonResponse({'error': 'Only staff users can provision classrooms.'}, status=403)
+    if request.method != 'POST':
+        return JsonResponse({'error': 'Rosters can only be sent with POST.'}, status=405)
+    roster_format = request.GET.get('format')
+    try:
+        if request.content_type in ('text/csv', 'application/json'):
+            data = request.body.decode('utf-8-sig')
+            roster_format = roster_format or request.content_type.split('/')[1]
+        else:
+            roster = request.FILES['roster']
+            data = roster.read().decode('utf-8-sig')
+            roster_format = roster_format or roster.name.rsplit('.', 1)[-1].lower()
+        classes = provisioning.parse_roster(data, roster_format)
+    except (KeyError, UnicodeDecodeError):
+        return JsonResponse({'error': 'Bad data passed in.'}, status=400)
+    except ValidationError as error:
+        return JsonResponse({'error': error.messages[0]}, status=400)
+    return JsonResponse(provisioning.provision(classes, create_missing=request.GET.get('create_users') == '1'))
+
+
 # This method is used to upload reading material by the teacher of the class. The teacher
 # can only upload pdf files as reading material. If upload is successful, the teacher
 # is redirected to the created classroom html. Else the teacher is prompted to upload the file again.
 @login_required
 def uploadReadingMaterial(request, classroom_pk): 
+    if memberships.created_classroom(request.user.id, classroom_pk) is None:
+        return render(request, "create_join_class/uploadReadingMaterial.html",
+                      {'error': 'You don\'t have upload permissions to this classroom!'})
     if request.method == 'GET':
-        try:
-            classroom = ClassRoom.objects.get(teacher=request.user, pk=classroom_pk)
-        except ClassRoom.DoesNotExist:
-            return render(request, "create_join_class/uploadReadingMaterial.html",
-                          {'error': 'You don\'t have upload permissions to this classroom!'})
         form = ReadingMaterialForm()
-        return render(request, "create_join_class/uploadReadingMaterial.html", {'form': form})
+        return render(request, "create_join_class/uploadReadingMaterial.html",
+                      {'form': form, 'classroom_pk': classroom_pk})
     else:
         form = ReadingMaterialForm(request.POST, request.FILES)
         if form.is_valid():
@@ -52,39 +98,157 @@ def uploadReadingMaterial(request, classroom_pk):
             messages.success(request, 'File Upload Successful')
             return redirect('viewCreatedReadingMaterial', classroom_pk)
         else:
-            return render(request, "create_join_class/uploadReadingMaterial.html", {'form': form})
+            return render(request, "create_join_class/uploadReadingMaterial.html",
+                          {'form': form, 'classroom_pk': classroom_pk})
+
+
+# This method starts a chunked upload of a reading material, for large files that may take several attempts to
+# upload. The teacher of the class posts the name of the reading material along with the name and size of the
+# file, and gets back the id of the upload and the largest chunk it accepts.
+@login_required
+def start_chunked_upload(request, classroom_pk):
+    if request.method != 'POST':
+        return JsonResponse({'error': 'Uploads can only be started with POST.'}, status=405)
+    classroom = get_object_or_404(ClassRoom, teacher=request.user, pk=classroom_pk)
+    try:
+        upload = chunked_uploads.start(classroom, request.user, request.POST.get('name', '').strip(),
+                                       request.POST['filename'], int(request.POST['size']))
+    except (KeyError, ValueError):
+        return JsonResponse({'error': 'Bad data passed in.'}, status=400)
+    except ValidationError as error:
+        return JsonResponse({'error': error.messages[0]}, status=400)
+    return JsonResponse({'upload_id': str(upload.id), 'chunk_size': settings.UPLOAD_CHUNK_SIZE, 'received': 0})
+
+
+# This method receives one chunk of a chunked upload as the raw request body, with its position in the file as
+# the offset query parameter. A GET returns how many bytes were received, so an interrupted upload can continue
+# from there. The reading material is created when the last chunk is in; chunks sent while it is being created get
+# a 202 with a Retry-After header, and an empty chunk at the end of the file then asks for the material again.
+@login_required
+def chunked_upload(request, upload_id):
+    if request.method == 'GET':
+        upload = get_object_or_404(UploadSession, pk=upload_id, uploader=request.user)
+        return JsonResponse({'received': upload.received, 'size': upload.size,
+                             'chunk_size': settings.UPLOAD_CHUNK_SIZE})
+    if request.method != 'POST':
+        return JsonResponse({'error': 'Chunks can only be sent with POST.'}, status=405)
+    try:
+        offset = int(request.GET['offset'])
+        length = int(request.META.get('CONTENT_LENGTH') or 0)
+        upload = chunked_uploads.write_chunk(upload_id, request.user, request, offset, length)
+    except (KeyError, ValueError):
+        return JsonResponse({'error': 'Bad data passed in.'}, status=400)
+    except UploadSession.DoesNotExist:
+        return JsonResponse({'error': 'No upload found with that id!'}, status=404)
+    except chunked_uploads.OffsetMismatch as mismatch:
+        return JsonResponse({'error': str(mismatch), 'received': mismatch.received}, status=409)
+    except chunked_uploads.Completing as completing:
+        response = JsonResponse({'error': str(completing), 'completing': True}, status=202)
+        response['Retry-After'] = completing.retry_after
+        return response
+    except ValidationError as error:
+        return JsonResponse({'error': error.messages[0]}, status=400)
+
+    if upload.received < upload.size:
+        return JsonResponse({'received': upload.received, 'size': upload.size})
+    if upload.material_id is None:
+        material = chunked_uploads.complete(upload)
+        messages.success(request, 'File Upload Successful')
+    else:
+        # The last chunk was sent again: the material was already created.
+        material = upload.material
+    return JsonResponse({'received': upload.size, 'size': upload.size, 'material_id': material.pk,
+                         'redirect': reverse('viewCreatedReadingMaterial', args=[material.classroom_id])})
 
 
 # This method is used to delete any reading material uploaded by the teacher of the class. The teacher
-# can only delete pdf files.
+# can only delete pdf files. The material is hidden straight away and removed by a background job (see deletion).
 @login_required
 def deleteReadingMaterial(request, classroom_pk, readingMaterial_pk):
     if request.method == "POST":
-        readingmaterial = ReadingMaterial.objects.get(pk=readingMaterial_pk)
-        readingmaterial.delete()
+        if memberships.created_classroom(request.user.id, classroom_pk) is None:
+            raise Http404('No classroom found.')
+        readingmaterial = get_object_or_404(ReadingMaterial, pk=readingMaterial_pk, classroom_id=classroom_pk)
+        deletion.delete_material(readingmaterial)
         return redirect('viewCreatedReadingMaterial', classroom_pk)
 
 
+# This method is used to delete a classroom created by the teacher, with all its reading materials. The classroom
+# is hidden straight away and removed by a background job (see deletion).
+@login_required
+def delete_classroom(request, classroom_pk):
+    if request.method != "POST":
+        return redirect('viewcreatedclassroom', classroom_pk)
+    if memberships.created_classroom(request.user.id, classroom_pk) is None:
+        raise Http404('No classroom found.')
+    deletion.delete_classroom(get_object_or_404(ClassRoom, pk=classroom_pk))
+    messages.success(request, 'Classroom deleted')
+    return redirect('home_classroom')
+
+
 # This method is used to view the created reading materials by the teacher.
-# It shows all the reading materials created by the teacher for a particular class.
+# It shows all the reading materials created by the teacher for a particular class. The list of materials is
+# cached under the version of the classroom (see listing_cache), and unchanged pages are answered with a 304.
 @login_required 
+@query_budget(3)
 def viewCreatedReadingMaterial(request, created_pk):
-    materialTeacher = ReadingMaterial.objects.filter(classroom_id=created_pk, uploader=request.user)
-    return render(request, "create_join_class/viewCreatedReadingMaterial.html", {'materialTeacher': materialTeacher})
+    versions = listing_cache.versions([created_pk])
+    materialTeacher = (ReadingMaterial.objects.filter(classroom_id=created_pk, uploader=request.user)
+                       .select_related('classroom'))
+    return listing_cache.conditional_page(request, versions, lambda: render(
+        request, "create_join_class/viewCreatedReadingMaterial.html",
+        {'materialTeacher': materialTeacher, 'classroom_pk': created_pk, 'version': versions[created_pk],
+         'fragment_timeout': listing_cache.FRAGMENT_TIMEOUT, 'fragment_cache': listing_cache.CACHE_ALIAS}))
 
 # This method is used to view the reading materials as a student.
-# It shows all the reading materials uploaded by the teacher for a particular class.
+# It shows all the reading materials uploaded by the teacher for a particular class. The list of materials is
+# the same for all students of the class, and is cached under the version of the classroom.
 @login_required 
+@query_budget(5)
 def viewJoinedReadingMaterial(request, joined_pk):
-    materialStudent = ReadingMaterial.objects.filter(classroom_id=joined_pk, classroom__students__in=[request.user.id])
-    return render(request, "create_join_class/viewJoinedReadingMaterial.html", {'materialStudent': materialStudent})
+    # Membership is checked against the cached classrooms of the student, so the materials are read by
+    # classroom alone.
+    if memberships.joined_classroom(request.user.id, joined_pk) is None:
+        return render(request, "create_join_class/viewJoinedReadingMaterial.html",
+                      {'materialStudent': ReadingMaterial.objects.none()})
+    versions = listing_cache.versions([joined_pk])
+    materialStudent = ReadingMaterial.objects.filter(classroom_id=joined_pk).select_related('classroom')
+    return listing_cache.conditional_page(request, versions, lambda: render(
+        request, "create_join_class/viewJoinedReadingMaterial.html",
+        {'materialStudent': materialStudent, 'classroom_pk': joined_pk, 'version': versions[joined_pk],
+         'fragment_timeout': listing_cache.FRAGMENT_TIMEOUT, 'fragment_cache': listing_cache.CACHE_ALIAS}))
 
 # This method is used to show pdf files to the students and returns and a html page where the pdf file is
 # embedded.
 
 @login_required
 def viewPDF(request, filename, material_id):
-    return render(request, "create_join_class/viewPDF.html", {'filename': filename, 'material_id': material_id,'username': request.user.username})
+    # Materials whose pages are rendered are shown a page at a time (see page_assets).
+    material = ReadingMaterial.objects.filter(pk=material_id).select_related('blob').first()
+    asset_key = page_assets.key(material) if material is not None else None
+    pages = page_assets.manifest(asset_key) if asset_key is not None else None
+    return render(request, "create_join_class/viewPDF.html", {
+        'filename': filename, 'material_id': material_id, 'username': request.user.username,
+        'asset_key': asset_key, 'pages': [(number, width, height) for number, (width, height) in
+                                          enumerate(pages or [], 1)],
+        'pdfjs': pdfjs.vendored(), 'pdfjs_script': pdfjs.SCRIPT, 'pdfjs_worker': pdfjs.WORKER})
+
+
+# This method serves one rendered page of a reading material to the teacher and the students of its classroom,
+# once the private_storage permission check passes for the file of the material too. Pages are only found under
+# the current key of the material, so pages of a replaced file are not served.
+@login_required
+def material_page(request, material_id, asset_key, page):
+    material = get_object_or_404(ReadingMaterial.objects.select_related('blob'), pk=material_id)
+    if (memberships.created_classroom(request.user.id, material.classroom_id) is None
+            and memberships.joined_classroom(request.user.id, material.classroom_id) is None):
+        raise Http404('No reading material found.')
+    if not PrivateStorageView.can_access_file(PrivateFile(request, private_storage, material.readingFile.name)):
+        raise PermissionDenied(PrivateStorageView.permission_denied_message)
+    path = page_assets.page_path(asset_key, page)
+    if asset_key != page_assets.key(material) or not os.path.exists(path):
+        raise Http404('No such page.')
+    return servers.serve_page(request, path, '"%s-%d"' % (asset_key, page))
 # This method is for any user to create an account first before doing anything else.
 # It redirects the user to homepage if account is created successfully. Else it prompts the
 # user to re-enter his credentials.
@@ -135,28 +299,18 @@ def index(request):
             return redirect('home_classroom')
 
 
-create_join_class/models.py
-# This class is for all classrooms that are going to be created. Each classroom has a name, section, code,
-# one teacher and zero to many students.
-class ClassRoom(models.Model):
-    name = models.CharField(max_length=100)
-    section = models.IntegerField()
-    classCode = models.CharField(max_length=6, null=True, blank=True, unique=True)
-    teacher = models.ForeignKey(User, on_delete=models.CASCADE, related_name='teacher_of_the_class')
-    students = models.ManyToManyField(User, blank=True, related_name='student_of_the_class')
-
-    def __str__(self):
-        return self.name + '.' + str(self.section) + ' ID:' + str(self.id)
-
-
 # This method is the homepage where the user can see his/her created and joined classes.
 # It returns the homepage.
 @login_required
+@query_budget(4)
 def home_classroom(request):
-    created_classes = ClassRoom.objects.filter(teacher=request.user)
-    joined_classes = ClassRoom.objects.filter(students__in=[request.user.id])
-    return render(request, 'create_join_class/home_classroom.html',
-                  {'user': request.user, 'created_classes': created_classes, 'joined_classes': joined_classes})
+    classrooms = memberships.get(request.user.id)
+    created_classes = classrooms['created']
+    joined_classes = classrooms['joined']
+    versions = listing_cache.versions([classroom['id'] for classroom in created_classes + joined_classes])
+    return listing_cache.conditional_page(request, versions, lambda: render(
+        request, 'create_join_class/home_classroom.html',
+        {'user': request.user, 'created_classes': created_classes, 'joined_classes': joined_classes}))
 
 
 
@@ -189,14 +343,199 @@ def join_class(request):
 # This method is used to show the created classrooms by a user.
 # It returns a html page with links to all created classrooms.
 @login_required
+@query_budget(5)
 def viewcreatedclassroom(request, classroom_pk):
-    classroom = get_object_or_404(ClassRoom, teacher=request.user, pk=classroom_pk)
-    return render(request, "create_join_class/viewcreatedclassroom.html", {'classroom': classroom})
+    classroom = memberships.created_classroom(request.user.id, classroom_pk)
+    if classroom is None:
+        raise Http404('No classroom found.')
+    students = User.objects.filter(student_of_the_class=classroom_pk).order_by('username')
+    return render(request, "create_join_class/viewcreatedclassroom.html",
+                  {'classroom': classroom, 'students': students})
 
 
 # This method is used to show the joined classrooms by a user.
 # It returns a html page with links to all joined classrooms.
 @login_required
+@query_budget(4)
 def viewjoinedclassroom(request, classroom_pk):
-    classroom = get_object_or_404(ClassRoom, students__in=[request.user.id], pk=classroom_pk)
+    classroom = memberships.joined_classroom(request.user.id, classroom_pk)
+    if classroom is None:
+        raise Http404('No classroom found.')
     return render(request, "create_join_class/viewjoinedclassroom.html", {'classroom': classroom})
+
+
+# This method returns the logged in user, or None. It runs in a database thread, since loading the user from
+# the session needs the database.
+def _authenticated_user(request):
+    return request.user if request.user.is_authenticated else None
+
+
+# The reading time updates and the reading info polling below are async views. While they wait for the database,
+# which they only reach through the bounded executor of ingest, they hold no worker thread, so one ASGI process
+# can serve many readers at once. The time is queued in the write-behind buffer and written in the background.
+
+# This method is used by the pdf viewer of a student to send the time spent on a reading material since its
+# previous update. The time is appended as a reading event instead of rewriting the reading info of the material.
+async def push_reading_info(request, readingMaterial_id):
+    user = await ingest.run_db(_authenticated_user, request)
+    if user is None:
+        return redirect_to_login(request.get_full_path())
+    if request.method != 'POST':
+        return JsonResponse({'error': 'Reading info can only be pushed with POST.'}, status=405)
+    try:
+        seconds = int(request.POST['seconds'])
+    except (KeyError, ValueError):
+        return JsonResponse({'error': 'Bad data passed in.'}, status=400)
+    joined = ReadingMaterial.objects.filter(pk=readingMaterial_id, classroom__students=user)
+    if not await ingest.run_db(joined.exists):
+        return JsonResponse({'error': 'You did not join the classroom of this material!'}, status=403)
+    seconds = min(seconds, MAX_SECONDS_PER_UPDATE)
+    if seconds > 0:
+        ingest.record(readingMaterial_id, user.id, seconds, request.POST.get('session', '')[:32])
+    return JsonResponse({'recorded': max(seconds, 0)})
+
+
+# This method is used by the pdf viewer to send the reading time of several materials in one request. The POST
+# data holds the viewer session and the entries as a JSON array of [material_id, delta_seconds, client_seq],
+# optionally followed by a list of [page, seconds] pairs with the time each page was visible.
+# Permissions for all the materials are checked with one query and the entries are committed together.
+# Entries for materials of classrooms the student did not join are reported back as rejected.
+async def push_reading_batch(request):
+    user = await ingest.run_db(_authenticated_user, request)
+    if user is None:
+        return redirect_to_login(request.get_full_path())
+    if request.method != 'POST':
+        return JsonResponse({'error': 'Reading info can only be pushed with POST.'}, status=405)
+    try:
+        entries = json.loads(request.POST['entries'])
+        if len(entries) > MAX_ENTRIES_PER_BATCH:
+            return JsonResponse({'error': 'Too many entries in one batch.'}, status=400)
+        entries = [_parse_batch_entry(entry) for entry in entries]
+    except (KeyError, ValueError, TypeError, IndexError, OverflowError):
+        return JsonResponse({'error': 'Bad data passed in.'}, status=400)
+
+    material_ids = {entry[0] for entry in entries}
+    joined = ReadingMaterial.objects.filter(pk__in=material_ids, classroom__students=user).values_list('pk',
+                                                                                                      flat=True)
+    allowed = set(await ingest.run_db(list, joined))
+    accepted = [(material_id, min(seconds, MAX_SECONDS_PER_UPDATE), sequence, pages)
+                for material_id, seconds, sequence, pages in entries
+                if material_id in allowed and seconds > 0 and sequence >= 0]
+    ingest.record_many(accepted, user.id, request.POST.get('session', '')[:32])
+    return JsonResponse({'recorded': len(accepted), 'rejected': sorted(material_ids - allowed)})
+
+
+def _parse_batch_entry(entry):
+    material_id, seconds, sequence = _integer(entry[0]), _integer(entry[1]), _integer(entry[2])
+    pages = None
+    if len(entry) > 3:
+        pages = [[_integer(page), min(_integer(page_seconds), MAX_SECONDS_PER_UPDATE)]
+                 for page, page_seconds in entry[3]]
+        if any(page < 1 or page > page_dwell.MAX_PAGES or page_seconds < 0 for page, page_seconds in pages):
+            raise ValueError('Page out of range')
+    return material_id, seconds, sequence, pages
+
+
+# Larger numbers would only fail in the database, with a server error instead of a 400.
+def _integer(value):
+    value = int(value)
+    if abs(value) > MAX_INTEGER:
+        raise ValueError('Number out of range')
+    return value
+
+
+# This method returns the reading time of a reading material per student and per day as JSON, for the reading
+# info page of the teacher to poll.
+async def reading_info_summary(request, readingMaterial_id):
+    user = await ingest.run_db(_authenticated_user, request)
+    if user is None:
+        return redirect_to_login(request.get_full_path())
+    summary = await ingest.run_db(_reading_summary, user, readingMaterial_id)
+    if summary is None:
+        return JsonResponse({'error': 'No reading material found.'}, status=404)
+    return JsonResponse(summary)
+
+
+def _reading_summary(user, material_id):
+    if not ReadingMaterial.objects.filter(pk=material_id, classroom__teacher=user).exists():
+        return None
+    return {'students': rollups.material_totals(material_id),
+            'days': [{'day': day.day.isoformat(), 'seconds': day.seconds}
+                     for day in rollups.material_days(material_id)]}
+
+
+# This method is used to show the teacher of the class how long each student has read a reading material.
+@login_required
+@query_budget(6)
+def view_reading_info(request, readingMaterial_id):
+    material = get_object_or_404(ReadingMaterial, pk=readingMaterial_id, classroom__teacher=request.user)
+    reading_info = rollups.material_totals(material.pk)
+    reading_days = rollups.material_days(material.pk)
+    reading_pages = page_dwell.heatmap_rows(material)
+    return render(request, 'create_join_class/view_reading_info.html',
+                  {'material': material, 'reading_info': reading_info, 'reading_days': reading_days,
+                   'reading_pages': reading_pages})
+
+
+# This method shows the teacher of a class how its students engage with all its reading materials: how many
+# opened each one, the spread of their reading times, who has not opened anything and the reading time per day.
+# The statistics are cached until reading time is recorded or the class changes (see analytics).
+@login_required
+@query_budget(8)
+def classroom_analytics(request, classroom_pk):
+    classroom = memberships.created_classroom(request.user.id, classroom_pk)
+    if classroom is None:
+        raise Http404('No classroom found.')
+    return render(request, 'create_join_class/classroom_analytics.html',
+                  {'classroom': classroom, 'stats': analytics.classroom_stats(classroom['id']),
+                   'percentiles': analytics.PERCENTILES, 'trend_window': analytics.TREND_WINDOW})
+
+
+# This method lets the teacher of a class download the reading events of all its reading materials as CSV or
+# NDJSON. The query string can hold format, start and end dates (YYYY-MM-DD) and one or more material ids.
+# The file is streamed while it is read from the database, so it is never built in memory.
+@login_required
+def export_reading_info(request, classroom_pk):
+    classroom = get_object_or_404(ClassRoom, teacher=request.user, pk=classroom_pk)
+    export_format = request.GET.get('format', 'csv')
+    if export_format not in exports.FORMATS:
+        return HttpResponseBadRequest('Unsupported export format.')
+    try:
+        start = exports.parse_day(request.GET.get('start'))
+        end = exports.parse_day(request.GET.get('end'))
+        material_ids = [int(material_id) for material_id in request.GET.getlist('material')]
+    except ValueError:
+        return HttpResponseBadRequest('Bad data passed in.')
+
+    rows = exports.reading_rows(classroom.pk, start, end, material_ids)
+    response = StreamingHttpResponse(exports.export_lines(export_format, rows),
+                                     content_type=exports.FORMATS[export_format])
+    response['Content-Disposition'] = 'attachment; filename="classroom-%d-reading-info.%s"' % (classroom.pk,
+                                                                                               export_format)
+    return response
+
+
+# This method searches the text of the reading materials in the classrooms of the user, or in the classroom
+# given in the query string, and returns the hits as JSON, best first, with page numbers and snippets.
+@login_required
+@query_budget(6)
+def search_reading_material(request):
+    try:
+        classroom_pk = int(request.GET['classroom']) if request.GET.get('classroom') else None
+    except ValueError:
+        return HttpResponseBadRequest('Bad data passed in.')
+    query = request.GET.get('q', '').strip()[:200]
+    start = time.perf_counter()
+    results = search.search(request.user.id, query, classroom_pk)
+    return JsonResponse({'query': query, 'results': results,
+                         'took_ms': round((time.perf_counter() - start) * 1000, 1)})
+
+
+# This method serves the request metrics of the site in the Prometheus text format. It is for the Prometheus server,
+# which sends the METRICS_TOKEN setting as a bearer token, and for staff users.
+def request_metrics(request):
+    token = getattr(settings, 'METRICS_TOKEN', None)
+    authorization = request.META.get('HTTP_AUTHORIZATION', '')
+    if not (token and constant_time_compare(authorization, 'Bearer ' + token)) and not request.user.is_staff:
+        raise PermissionDenied
+    return HttpResponse(metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
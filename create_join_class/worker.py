@@ -0,0 +1,13 @@
+import django
+
+
+# The entry points of the run_jobs worker processes. Worker processes are started without Django set up, so this
+# module must not import any models until init() has run.
+
+def init():
+    django.setup()
+
+
+def run(job_id):
+    from . import jobs
+    return jobs.run(job_id)
@@ -3,9 +3,13 @@
 import os
 import sys
 
+from Reading_Room import roles
+
 
 def main():
     os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'Reading_Room.settings')
+    # Only the apps the command needs are loaded (see Reading_Room/roles.py).
+    os.environ.setdefault(roles.ENV, roles.for_command(sys.argv))
     try:
         from django.core.management import execute_from_command_line
     except ImportError as exc: